@@ -1,28 +1,63 @@
-from flask import Flask, request
+import os
+from alembic import command
+from flask import Flask, request, current_app
 from flask_cors import CORS
 from models import db
-from config import DevelopmentConfig
+from config import get_config
 from sec import datastore
 from flask_security import Security
 from initial_data import create_initial_data
 from flask_migrate import Migrate
 # from api_routes import api
 from redis_cache import cache, redis_cache
+from celery_utils import make_celery
+from availability import rebuild_availability
+from spot_pool import rebuild_spot_pool
+from expiry import reconcile_schedule
+import query_metrics
 
-def create_app():
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+
+def upgrade_schema():
+    """Apply pending migrations; each one is idempotent, so this is safe right after create_all"""
+    config = current_app.extensions['migrate'].migrate.get_config()
+    # alembic.ini's logging setup is meant for `flask db`, not for a running app
+    config.attributes['configure_logger'] = False
+    command.upgrade(config, 'head')
+
+def run_startup_tasks():
+    """Create and migrate tables, add initial data, then reconcile availability counters, free-spot pools and the expiry schedule"""
+    # db.drop_all()  # Commented out to prevent data loss on restart
+    db.create_all()
+    # create_all adds missing tables but not new columns or indexes on existing ones
+    upgrade_schema()
+    
+    # Create initial data (idempotent, safe to run)
+    create_initial_data()
+    
+    rebuild_availability()
+    db.session.commit()
+    rebuild_spot_pool()
+    reconcile_schedule()
+
+def create_app(config_class=None):
     app = Flask(__name__)
-    app.config.from_object(DevelopmentConfig)
+    app.config.from_object(config_class or get_config())
 
-    @app.before_request
-    def log_request_info():
-        print(f"DEBUG Headers: {request.headers}")
-        print(f"DEBUG Cookies: {request.cookies}")
+    if app.config.get('DEBUG_REQUEST_LOGGING'):
+        @app.before_request
+        def log_request_info():
+            app.logger.debug(f"Headers: {request.headers}")
+            app.logger.debug(f"Cookies: {request.cookies}")
     
     # Initialize extensions
-    migrate = Migrate(app, db)
+    migrate = Migrate(app, db, directory=MIGRATIONS_DIR)
     cache.init_app(app)
     redis_cache.init_app(app)
     
+    # Celery client, used by routes to enqueue jobs and by celery_worker
+    app.extensions['celery'] = make_celery(app)
+    
     # Initialize Mail
     from flask_mail import Mail
     mail = Mail(app)
@@ -36,21 +71,19 @@ def create_app():
          resources={r"/api/v1/*": {"origins": ["http://localhost:5173", "http://127.0.0.1:5173"]}},
          supports_credentials=True,
          allow_headers=["Content-Type", "Authorization", "Authentication-Token"],
-         expose_headers=["Content-Range", "X-Total-Count"])
+         expose_headers=["Content-Range", "X-Total-Count", "Server-Timing"])
     
     with app.app_context():
         # Initialize database
         db.init_app(app)
+        query_metrics.init_app(app, db.engine)
         
         # Initialize Flask-Security
         security = Security(app, datastore)
         
-        # Create database tables
-        # db.drop_all()  # Commented out to prevent data loss on restart
-        db.create_all()
-        
-        # Create initial data (idempotent, safe to run)
-        create_initial_data()
+        # Off in gunicorn workers, which would otherwise all run these at once; the master runs `flask startup`
+        if app.config.get('RUN_STARTUP_TASKS', True):
+            run_startup_tasks()
         
         # Register modular blueprints
         from routes import auth_bp, parking_bp, reservation_bp, admin_bp, analytics_bp
@@ -70,6 +103,20 @@ def create_app():
         # Analytics Routes (/api/v1 - mixed admin and user routes)
         app.register_blueprint(analytics_bp, url_prefix='/api/v1')
 
+    @app.cli.command('rebuild-availability')
+    def rebuild_availability_command():
+        """Rebuild per-lot availability counters, free-spot pools and the expiry schedule from the source tables"""
+        rebuild_availability()
+        db.session.commit()
+        rebuild_spot_pool()
+        reconcile_schedule()
+        print("Availability counters, spot pools and expiry schedule rebuilt")
+    
+    @app.cli.command('startup')
+    def startup_command():
+        """Create tables and initial data and rebuild counters, pools and schedule (run once before starting workers)"""
+        run_startup_tasks()
+        print("Startup tasks complete")
     
     return app
 
@@ -80,4 +127,4 @@ def index():
     return {'message': 'Vehicle Parking API', 'status': 'running'}
 
 if __name__ == "__main__":
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    app.run(debug=app.config.get('DEBUG', False), host='0.0.0.0', port=5000)
\ No newline at end of file
@@ -0,0 +1,125 @@
+from sqlalchemy import func, case, and_, event
+from models import db, Parking_lot, ParkingSpot, LotAvailability
+from queries import active_reservation_on
+import availability_stream
+
+# Spot states tracked by the per-lot counters
+FREE = 'free'
+RESERVED = 'reserved'
+OCCUPIED = 'occupied'
+
+_COLUMNS = {
+    FREE: LotAvailability.free_spots,
+    RESERVED: LotAvailability.reserved_spots,
+    OCCUPIED: LotAvailability.occupied_spots,
+}
+
+def spot_state(spot):
+    """Return the counter bucket a spot currently belongs to"""
+    if spot.is_occupied:
+        return OCCUPIED
+    has_active_reservation = db.session.query(active_reservation_on(spot.id)).scalar()
+    return RESERVED if has_active_reservation else FREE
+
+def move_spot(lot_id, from_state, to_state):
+    """
+    Move one spot between counter buckets.
+    Issued as an in-place UPDATE so it commits (or rolls back) with the caller's transaction.
+    """
+    if from_state == to_state:
+        return
+    adjust_availability(lot_id, **{from_state: -1, to_state: 1})
+
+def adjust_availability(lot_id, free=0, reserved=0, occupied=0):
+    """Apply deltas to a lot's counters without reading them first"""
+    deltas = {FREE: free, RESERVED: reserved, OCCUPIED: occupied}
+    values = {_COLUMNS[state]: _COLUMNS[state] + delta for state, delta in deltas.items() if delta}
+    if not values:
+        return
+    updated = LotAvailability.query.filter_by(lot_id=lot_id).update(values, synchronize_session=False)
+    if not updated:
+        # Counter row missing (e.g. lot created before counters existed)
+        rebuild_availability(lot_id)
+        return
+    
+    # Resulting counts, read inside the transaction that holds the row lock
+    row = db.session.query(*_COLUMNS.values()).filter(LotAvailability.lot_id == lot_id).one()
+    # A rebuild earlier in the transaction records the lot with change=None
+    change = _pending_changes().get(lot_id, {}).get('change') or {}
+    record_counts(lot_id, dict(zip(_COLUMNS, row)),
+                  change={state: change.get(state, 0) + delta for state, delta in deltas.items()})
+
+def rebuild_availability(lot_id=None):
+    """
+    Recompute counters from ParkingSpot/Reservation with one grouped query.
+    Rebuilds every lot when lot_id is None. Does not commit.
+    """
+    has_active_reservation = active_reservation_on(ParkingSpot.id)
+    is_occupied = func.coalesce(ParkingSpot.is_occupied, False) == True
+
+    query = db.session.query(
+        ParkingSpot.lot_id,
+        func.count(ParkingSpot.id),
+        func.sum(case((is_occupied, 1), else_=0)),
+        func.sum(case((and_(~is_occupied, has_active_reservation), 1), else_=0))
+    ).group_by(ParkingSpot.lot_id)
+    lots_query = db.session.query(Parking_lot.id)
+    existing_query = LotAvailability.query
+
+    if lot_id is not None:
+        query = query.filter(ParkingSpot.lot_id == lot_id)
+        lots_query = lots_query.filter(Parking_lot.id == lot_id)
+        existing_query = existing_query.filter_by(lot_id=lot_id)
+
+    counts = {row[0]: row[1:] for row in query.all()}
+    existing = {row.lot_id: row for row in existing_query.all()}
+
+    for (current_lot_id,) in lots_query.all():
+        total, occupied, reserved = counts.get(current_lot_id, (0, 0, 0))
+        occupied = int(occupied or 0)
+        reserved = int(reserved or 0)
+
+        row = existing.get(current_lot_id)
+        if not row:
+            row = LotAvailability(lot_id=current_lot_id)
+            db.session.add(row)
+        row.free_spots = total - occupied - reserved
+        row.reserved_spots = reserved
+        row.occupied_spots = occupied
+        record_counts(current_lot_id, {FREE: row.free_spots, RESERVED: row.reserved_spots, OCCUPIED: row.occupied_spots})
+
+    db.session.flush()
+
+def _pending_changes():
+    return db.session.info.setdefault('availability_changes', {})
+
+def record_counts(lot_id, counts, change=None):
+    """
+    Queue a lot's counters (and the change that led to them, if known)
+    for publishing when the transaction commits. counts=None announces a deleted lot.
+    """
+    _pending_changes()[lot_id] = {'counts': counts, 'change': change}
+
+@event.listens_for(db.session, 'after_commit')
+def _publish_committed_changes(session):
+    """Push counter changes to availability stream subscribers once they are durable"""
+    pending = session.info.pop('availability_changes', None)
+    if pending:
+        availability_stream.publish(pending)
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def _discard_rolled_back_changes(session, previous_transaction):
+    if not previous_transaction.nested:
+        session.info.pop('availability_changes', None)
+
+def get_availability_map(lot_ids=None):
+    """Return {lot_id: LotAvailability} in a single query"""
+    query = LotAvailability.query
+    if lot_ids is not None:
+        query = query.filter(LotAvailability.lot_id.in_(lot_ids))
+    return {row.lot_id: row for row in query.all()}
+
+def get_available_spots(lot_id):
+    """O(1) read of a lot's free spot count"""
+    row = db.session.get(LotAvailability, lot_id)
+    return row.free_spots if row else 0
@@ -0,0 +1,139 @@
+import json
+import logging
+import os
+import queue
+import threading
+from redis_cache import redis_cache
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per client before it is considered too slow and resynced with a snapshot
+SUBSCRIBER_QUEUE_SIZE = 100
+# SSE comment sent when idle, keeping proxies from closing the connection
+KEEPALIVE_SECONDS = 15
+
+_STATE_FIELDS = {'free': 'available_spots', 'reserved': 'reserved_spots', 'occupied': 'occupied_spots'}
+
+def _channel():
+    return f"{redis_cache.key_prefix}availability"
+
+def _as_fields(values):
+    return {_STATE_FIELDS[state]: value for state, value in values.items()}
+
+def lot_event(lot_id, counts, change=None):
+    """
+    One lot's counters after a change. Counts are absolute so clients never drift;
+    `change` carries the delta when the counters were adjusted rather than rebuilt.
+    """
+    if counts is None:
+        return {'lot_id': lot_id, 'removed': True}
+    event = dict(lot_id=lot_id, **_as_fields(counts))
+    if change:
+        event['change'] = _as_fields(change)
+    return event
+
+def publish(changes):
+    """
+    Publish committed counter changes for every web process to fan out.
+    changes: {lot_id: {'counts': {state: value}, 'change': {state: delta} or None}}
+    """
+    events = [lot_event(lot_id, entry['counts'], entry['change']) for lot_id, entry in changes.items()]
+    if not events or not redis_cache.is_available():
+        return False
+    try:
+        redis_cache.redis_client.publish(_channel(), json.dumps(events))
+        return True
+    except Exception as e:
+        redis_cache.record_failure(e)
+        logger.error(f"Error publishing availability changes: {e}")
+        return False
+
+class Subscriber:
+    """One SSE client: a bounded queue filled by the process-wide listener thread"""
+    def __init__(self):
+        self.events = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.needs_snapshot = False
+
+    def push(self, event):
+        try:
+            self.events.put_nowait(event)
+        except queue.Full:
+            # Drop what is buffered; the stream sends a fresh snapshot instead
+            self.needs_snapshot = True
+            with self.events.mutex:
+                self.events.queue.clear()
+
+class Broadcaster:
+    """
+    Fans availability events out to every SSE client of this process
+    from a single Redis subscription, whatever the number of clients.
+    """
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def subscribe(self, limit=None):
+        """A new Subscriber, or None if `limit` subscribers are already open in this process"""
+        subscriber = Subscriber()
+        with self._lock:
+            if limit is not None and len(self._subscribers) >= limit:
+                return None
+            self._subscribers.add(subscriber)
+        self.ensure_listener()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def is_listening(self):
+        return bool(self._thread and self._thread.is_alive() and self._pid == os.getpid())
+
+    def ensure_listener(self):
+        """
+        Start the listener thread if it is not running in this process
+        (threads do not survive forking worker servers). Returns whether it is running.
+        """
+        with self._lock:
+            if self.is_listening():
+                return True
+            if not redis_cache.is_available():
+                return False
+            try:
+                pubsub = redis_cache.redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(**{_channel(): self._on_message})
+                self._thread = pubsub.run_in_thread(sleep_time=1.0, daemon=True, exception_handler=self._on_error)
+                self._pid = os.getpid()
+                # Anything published while no listener was running was missed
+                for subscriber in self._subscribers:
+                    subscriber.needs_snapshot = True
+                return True
+            except Exception as e:
+                redis_cache.record_failure(e)
+                logger.error(f"Could not start availability listener: {e}")
+                return False
+
+    def _on_message(self, message):
+        try:
+            events = json.loads(message['data'])
+        except ValueError:
+            logger.error("Bad availability message")
+            return
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            for event in events:
+                subscriber.push(event)
+
+    def _on_error(self, error, pubsub, thread):
+        # Events may have been missed: resync every client; the next subscribe() restarts the listener
+        logger.error(f"Availability listener stopped: {error}")
+        redis_cache.record_failure(error)
+        thread.stop()
+        with self._lock:
+            for subscriber in self._subscribers:
+                subscriber.needs_snapshot = True
+
+broadcaster = Broadcaster()
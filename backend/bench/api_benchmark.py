@@ -0,0 +1,272 @@
+"""
+In-process load benchmark for the reservation API.
+
+    pip install fakeredis
+    cd backend && python bench/api_benchmark.py --lots 10 --spots 200 --users 100 --threads 8 --duration 30
+
+Seeds N lots x M spots x K users into a throwaway SQLite database, serves Redis
+from fakeredis, then drives concurrent reserve/occupy/release/cancel traffic and
+reads of /parking-lots, /reservations and /admin/analytics through the Flask test
+client. Reports per endpoint: throughput, p50/p95/p99 latency, 409 (lock/conflict)
+rate, error rate and SQL queries per request. --json writes the same numbers to a
+file so runs can be diffed in review.
+
+Numbers are for comparing revisions on the same machine; they include no network
+or WSGI server overhead (see bench/locustfile.py for that).
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+PASSWORD = 'bench-password'
+
+# Weighted traffic mix: (weight, action name)
+MIX = [
+    (40, 'browse_lots'),
+    (20, 'my_reservations'),
+    (3, 'admin_analytics'),
+    (25, 'book_occupy_release'),
+    (12, 'book_cancel'),
+]
+
+def use_fakeredis():
+    """Point every Redis client the app creates at one in-memory fakeredis server"""
+    try:
+        import fakeredis
+    except ImportError:
+        sys.exit("fakeredis is required: pip install fakeredis")
+    import redis
+    server = fakeredis.FakeServer()
+    redis.BlockingConnectionPool.from_url = classmethod(
+        lambda cls, url, **kwargs: fakeredis.FakeRedis(
+            server=server, decode_responses=kwargs.get('decode_responses', False)).connection_pool)
+
+def create_bench_app(db_path, engine):
+    os.environ['DATABASE_URL'] = f"sqlite:///{db_path}"
+    os.environ['RESERVATION_ENGINE'] = engine
+    os.environ.setdefault('APP_ENV', 'development')
+    use_fakeredis()
+    # create_app prints progress while creating initial data
+    with contextlib.redirect_stdout(io.StringIO()):
+        from app import app
+    app.logger.disabled = True
+    return app
+
+def seed(app, lots, spots, users):
+    from sqlalchemy import insert
+    from flask_security import hash_password
+    from models import db, User, Role, Parking_lot
+    from lot_spots import add_spots
+    from availability import rebuild_availability
+    from spot_pool import rebuild_spot_pool
+    from sec import datastore
+
+    with app.app_context():
+        password = hash_password(PASSWORD)
+        first_user = (db.session.query(db.func.max(User.id)).scalar() or 0) + 1
+        db.session.execute(insert(User), [{
+            'email': f"bench{i}@example.com", 'name': f"Bench User {i}", 'password': password,
+            'active': True, 'fs_uniquifier': uuid.uuid4().hex
+        } for i in range(users)])
+        user_role = Role.query.filter_by(name='user').first()
+        emails = [f"bench{i}@example.com" for i in range(users)]
+        if user_role:
+            for user in User.query.filter(User.id >= first_user).all():
+                datastore.add_role_to_user(user, user_role)
+
+        for i in range(lots):
+            lot = Parking_lot(name=f"Bench Lot {i}", location=f"Zone {i % 5}", capacity=spots, price_per_hour=20.0 + i)
+            db.session.add(lot)
+            db.session.flush()
+            add_spots(lot.id, (f"A{n:03d}" for n in range(1, spots + 1)))
+
+        rebuild_availability()
+        db.session.commit()
+        rebuild_spot_pool()
+        lot_ids = [lot_id for (lot_id,) in db.session.query(Parking_lot.id).filter(Parking_lot.name.like('Bench Lot %')).all()]
+    return emails, lot_ids
+
+class QueryCounter:
+    """Counts SQL statements per thread"""
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.local = threading.local()
+        event.listen(engine, 'before_cursor_execute', self._count)
+
+    def _count(self, *args, **kwargs):
+        self.local.count = getattr(self.local, 'count', 0) + 1
+
+    def reset(self):
+        self.local.count = 0
+
+    def value(self):
+        return getattr(self.local, 'count', 0)
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = defaultdict(list)   # endpoint -> [(latency_ms, status, queries)]
+
+    def add(self, endpoint, latency_ms, status, queries):
+        with self.lock:
+            self.samples[endpoint].append((latency_ms, status, queries))
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+class VirtualUser:
+    """One logged-in test client; each call is timed and recorded under a normalized endpoint name"""
+    def __init__(self, app, email, recorder, counter):
+        self.client = app.test_client()
+        self.email = email
+        self.recorder = recorder
+        self.counter = counter
+
+    def call(self, method, url, endpoint, **kwargs):
+        self.counter.reset()
+        started = time.perf_counter()
+        response = getattr(self.client, method)(url, **kwargs)
+        self.recorder.add(endpoint, (time.perf_counter() - started) * 1000, response.status_code, self.counter.value())
+        return response
+
+    def login(self, password):
+        return self.client.post('/api/v1/auth/login', json={'email': self.email, 'password': password}).status_code == 200
+
+    def browse_lots(self, lot_ids):
+        self.call('get', '/api/v1/parking-lots', 'GET /parking-lots')
+
+    def my_reservations(self, lot_ids):
+        self.call('get', '/api/v1/reservations?limit=20', 'GET /reservations')
+
+    def admin_analytics(self, lot_ids):
+        self.call('get', '/api/v1/admin/analytics', 'GET /admin/analytics')
+
+    def _book(self, lot_ids):
+        response = self.call('post', '/api/v1/reservations', 'POST /reservations', json={
+            'lot_id': random.choice(lot_ids),
+            'vehicle_number': f"BN{random.randint(1000, 9999)}",
+            'duration_hours': random.choice([1, 2, 4])
+        })
+        return response.get_json()['reservation']['id'] if response.status_code == 201 else None
+
+    def book_occupy_release(self, lot_ids):
+        reservation_id = self._book(lot_ids)
+        if reservation_id:
+            self.call('put', f'/api/v1/reservations/{reservation_id}/occupy', 'PUT /reservations/<id>/occupy')
+            self.call('put', f'/api/v1/reservations/{reservation_id}/release', 'PUT /reservations/<id>/release')
+
+    def book_cancel(self, lot_ids):
+        reservation_id = self._book(lot_ids)
+        if reservation_id:
+            self.call('post', f'/api/v1/reservations/{reservation_id}/cancel', 'POST /reservations/<id>/cancel')
+
+def run(app, emails, lot_ids, threads, duration, admin_email, admin_password):
+    from models import db
+    with app.app_context():
+        counter = QueryCounter(db.engine)
+    recorder = Recorder()
+    weights, actions = zip(*MIX)
+    ready = threading.Barrier(threads + 1)
+    deadline = [0.0]
+
+    def worker(index):
+        users = [VirtualUser(app, email, recorder, counter) for email in emails[index::threads]]
+        users = [user for user in users if user.login(PASSWORD)]
+        admin = VirtualUser(app, admin_email, recorder, counter)
+        admin = admin if admin.login(admin_password) else None
+        ready.wait()
+        while time.perf_counter() < deadline[0] and users:
+            action = random.choices(actions, weights)[0]
+            if action == 'admin_analytics':
+                if admin:
+                    admin.admin_analytics(lot_ids)
+                continue
+            getattr(random.choice(users), action)(lot_ids)
+
+    pool = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(threads)]
+    for thread in pool:
+        thread.start()
+    ready.wait()
+    started = time.perf_counter()
+    deadline[0] = started + duration
+    for thread in pool:
+        thread.join()
+    return recorder, time.perf_counter() - started
+
+def summarize(recorder, elapsed):
+    results = {}
+    for endpoint, samples in sorted(recorder.samples.items()):
+        latencies = sorted(sample[0] for sample in samples)
+        statuses = [sample[1] for sample in samples]
+        results[endpoint] = {
+            'requests': len(samples),
+            'rps': round(len(samples) / elapsed, 2),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'conflict_409_rate': round(statuses.count(409) / len(samples), 4),
+            'error_rate': round(sum(status >= 500 for status in statuses) / len(samples), 4),
+            'queries_per_request': round(sum(sample[2] for sample in samples) / len(samples), 2),
+        }
+    return results
+
+def print_report(results, elapsed, args):
+    total = sum(row['requests'] for row in results.values())
+    print(f"\n{args.lots} lots x {args.spots} spots x {args.users} users, {args.threads} threads, "
+          f"engine={args.engine}, {elapsed:.1f}s, {total} requests ({total / elapsed:.1f} req/s)\n")
+    print(f"{'endpoint':<34}{'reqs':>7}{'req/s':>8}{'p50':>8}{'p95':>8}{'p99':>8}{'409%':>7}{'5xx%':>7}{'SQL/req':>9}")
+    for endpoint, row in results.items():
+        print(f"{endpoint:<34}{row['requests']:>7}{row['rps']:>8.1f}{row['p50_ms']:>8.1f}{row['p95_ms']:>8.1f}"
+              f"{row['p99_ms']:>8.1f}{row['conflict_409_rate'] * 100:>7.1f}{row['error_rate'] * 100:>7.1f}"
+              f"{row['queries_per_request']:>9.1f}")
+    print("\nLatencies in ms.")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--lots', type=int, default=10)
+    parser.add_argument('--spots', type=int, default=200)
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=20, help='seconds of traffic')
+    parser.add_argument('--engine', choices=['lock', 'optimistic'], default='lock', help='RESERVATION_ENGINE')
+    parser.add_argument('--seed', type=int, default=1, help='random seed for the traffic mix')
+    parser.add_argument('--json', help='also write results to this file')
+    parser.add_argument('--db', default=os.path.join(tempfile.gettempdir(), 'api_benchmark.db'))
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    if os.path.exists(args.db):
+        os.remove(args.db)
+
+    app = create_bench_app(args.db, args.engine)
+    print(f"Seeding {args.lots} lots x {args.spots} spots and {args.users} users...")
+    emails, lot_ids = seed(app, args.lots, args.spots, args.users)
+    print(f"Running {args.duration:.0f}s of traffic on {args.threads} threads (logins excluded)...")
+    recorder, elapsed = run(app, emails, lot_ids, args.threads, args.duration, 'admin@parking.com', 'admin123')
+
+    results = summarize(recorder, elapsed)
+    print_report(results, elapsed, args)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'config': vars(args), 'elapsed_s': round(elapsed, 2), 'endpoints': results}, f, indent=2)
+        print(f"Results written to {args.json}")
+
+    os.remove(args.db)
+
+if __name__ == '__main__':
+    main()
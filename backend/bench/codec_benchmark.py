@@ -0,0 +1,91 @@
+"""
+Compare cache codecs on a synthetic admin dashboard payload (per-lot spot arrays).
+
+    cd backend && python bench/codec_benchmark.py [--lots 20] [--spots 250] [--rounds 50]
+
+Reports stored size and mean encode/decode time per codec. msgpack and lz4
+variants are included only when those packages are installed.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import cache_codecs
+
+def dashboard_payload(lots, spots_per_lot):
+    now = datetime(2026, 1, 1, 9, 0)
+    parking_lots = []
+    for lot_id in range(1, lots + 1):
+        spots = [{
+            'id': lot_id * 10000 + n,
+            'spot_number': f"P{n:03d}",
+            'is_occupied': n % 3 == 0,
+            'is_reserved': n % 5 == 0,
+            'updated_at': now + timedelta(minutes=n)
+        } for n in range(1, spots_per_lot + 1)]
+        parking_lots.append({
+            'id': lot_id,
+            'name': f"Parking Lot {lot_id}",
+            'location': f"Sector {lot_id}",
+            'capacity': spots_per_lot,
+            'price_per_hour': 40.0 + lot_id,
+            'occupied_spots': sum(spot['is_occupied'] for spot in spots),
+            'available_spots': sum(not spot['is_occupied'] and not spot['is_reserved'] for spot in spots),
+            'occupancy_rate': 33.3,
+            'spots': spots
+        })
+    return {'summary': {'total_parking_lots': lots, 'generated_at': now}, 'parking_lots': parking_lots}
+
+class JsonCodec:
+    name = 'json (current)'
+    def dumps(self, value):
+        return json.dumps(value, default=str).encode()
+
+def codecs_under_test():
+    codecs = [JsonCodec()]
+    specs = ['pickle', 'pickle+zlib']
+    if cache_codecs.msgpack:
+        specs += ['msgpack', 'msgpack+zlib']
+    if cache_codecs.lz4:
+        specs += ['pickle+lz4'] + (['msgpack+lz4'] if cache_codecs.msgpack else [])
+    codecs.extend(cache_codecs.parse_codec(spec, compress_min_bytes=0) for spec in specs)
+    return codecs
+
+def decode(data):
+    # Payloads here were just encoded by this script
+    if cache_codecs.is_binary(data):
+        return cache_codecs.loads(data, allow_pickle=True)
+    return json.loads(data)
+
+def timed(fn, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        result = fn()
+    return (time.perf_counter() - started) / rounds * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--lots', type=int, default=20)
+    parser.add_argument('--spots', type=int, default=250)
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+
+    payload = dashboard_payload(args.lots, args.spots)
+    print(f"Dashboard payload: {args.lots} lots x {args.spots} spots, {args.rounds} rounds\n")
+    print(f"{'codec':<16}{'bytes':>12}{'ratio':>8}{'encode ms':>12}{'decode ms':>12}  datetimes kept")
+
+    baseline = None
+    for codec in codecs_under_test():
+        encode_ms, data = timed(lambda: codec.dumps(payload), args.rounds)
+        decode_ms, decoded = timed(lambda: decode(data), args.rounds)
+        baseline = baseline or len(data)
+        typed = isinstance(decoded['summary']['generated_at'], datetime)
+        print(f"{codec.name:<16}{len(data):>12,}{len(data) / baseline:>8.2f}{encode_ms:>12.2f}{decode_ms:>12.2f}  {typed}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+Load test for the production serving profile (see README, "Production Serving").
+
+    pip install locust
+    locust -f bench/locustfile.py --host http://localhost:5000 --headless -u 200 -r 20 -t 2m
+
+Simulated users log in once, then mostly browse lot availability, check their
+reservations and occasionally book and release a spot. Set LOAD_TEST_EMAIL /
+LOAD_TEST_PASSWORD to use an account other than the seeded test user.
+"""
+import os
+import random
+from locust import HttpUser, task, between
+
+EMAIL = os.environ.get('LOAD_TEST_EMAIL', 'user@parking.com')
+PASSWORD = os.environ.get('LOAD_TEST_PASSWORD', 'password123')
+
+class ParkingUser(HttpUser):
+    wait_time = between(0.5, 2)
+
+    def on_start(self):
+        self.client.post('/api/v1/auth/login', json={'email': EMAIL, 'password': PASSWORD})
+        lots = self.client.get('/api/v1/parking-lots').json().get('parking_lots', [])
+        self.lot_ids = [lot['id'] for lot in lots]
+
+    @task(10)
+    def browse_lots(self):
+        self.client.get('/api/v1/parking-lots')
+
+    @task(3)
+    def lot_details(self):
+        if self.lot_ids:
+            self.client.get(f'/api/v1/parking-lots/{random.choice(self.lot_ids)}', name='/api/v1/parking-lots/[id]')
+
+    @task(3)
+    def my_reservations(self):
+        self.client.get('/api/v1/reservations?limit=20')
+
+    @task(1)
+    def book_and_release(self):
+        if not self.lot_ids:
+            return
+        with self.client.post('/api/v1/reservations', catch_response=True, json={
+            'lot_id': random.choice(self.lot_ids),
+            'vehicle_number': f"LT{random.randint(1000, 9999)}",
+            'duration_hours': 1
+        }) as response:
+            # 400/409: already holding a reservation in that lot, or lot busy/full
+            if response.status_code in (400, 409):
+                response.success()
+                return
+        if response.status_code == 201:
+            reservation_id = response.json()['reservation']['id']
+            self.client.put(f'/api/v1/reservations/{reservation_id}/occupy', name='/api/v1/reservations/[id]/occupy')
+            self.client.put(f'/api/v1/reservations/{reservation_id}/release', name='/api/v1/reservations/[id]/release')
@@ -0,0 +1,93 @@
+"""
+Time creating and shrinking a parking lot's spots: per-object ORM loop vs bulk insert / set-based DELETE.
+
+    cd backend && python bench/spot_creation_benchmark.py [--capacities 100,500,2000,5000] [--db /tmp/spots.db]
+
+Uses a throwaway SQLite file (not the app database). Each row is the mean of --rounds runs.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from models import db, Parking_lot, ParkingSpot
+from lot_spots import add_spots, remove_free_spots
+
+def make_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{path}"
+    db.init_app(app)
+    return app
+
+def new_lot(capacity):
+    lot = Parking_lot(name=f"Bench {time.perf_counter_ns()}", location='Bench', capacity=capacity, price_per_hour=10.0)
+    db.session.add(lot)
+    db.session.flush()
+    return lot
+
+def create_per_object(capacity):
+    lot = new_lot(capacity)
+    for i in range(1, capacity + 1):
+        db.session.add(ParkingSpot(lot_id=lot.id, spot_number=f"A{i:03d}"))
+    db.session.commit()
+    return lot.id
+
+def create_bulk(capacity):
+    lot = new_lot(capacity)
+    add_spots(lot.id, (f"A{i:03d}" for i in range(1, capacity + 1)))
+    db.session.commit()
+    return lot.id
+
+def shrink_per_object(lot_id, count):
+    spots = ParkingSpot.query.filter_by(lot_id=lot_id, is_occupied=False)\
+        .order_by(ParkingSpot.id.desc()).limit(count).all()
+    for spot in spots:
+        db.session.delete(spot)
+    db.session.commit()
+
+def shrink_bulk(lot_id, count):
+    remove_free_spots(lot_id, count)
+    db.session.commit()
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return (time.perf_counter() - started) * 1000, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--capacities', default='100,500,2000,5000')
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--db', default=os.path.join(tempfile.gettempdir(), 'spot_creation_benchmark.db'))
+    args = parser.parse_args()
+
+    if os.path.exists(args.db):
+        os.remove(args.db)
+    app = make_app(args.db)
+
+    print(f"{'capacity':>9}{'create loop ms':>16}{'create bulk ms':>16}{'speedup':>9}"
+          f"{'halve loop ms':>15}{'halve bulk ms':>15}{'speedup':>9}")
+    with app.app_context():
+        db.create_all()
+        for capacity in (int(c) for c in args.capacities.split(',')):
+            totals = [0.0, 0.0, 0.0, 0.0]
+            for _ in range(args.rounds):
+                elapsed, loop_lot = timed(create_per_object, capacity)
+                totals[0] += elapsed
+                elapsed, bulk_lot = timed(create_bulk, capacity)
+                totals[1] += elapsed
+                totals[2] += timed(shrink_per_object, loop_lot, capacity // 2)[0]
+                totals[3] += timed(shrink_bulk, bulk_lot, capacity // 2)[0]
+                db.session.expunge_all()
+            loop_create, bulk_create, loop_shrink, bulk_shrink = (t / args.rounds for t in totals)
+            print(f"{capacity:>9}{loop_create:>16.1f}{bulk_create:>16.1f}{loop_create / bulk_create:>8.1f}x"
+                  f"{loop_shrink:>15.1f}{bulk_shrink:>15.1f}{loop_shrink / bulk_shrink:>8.1f}x")
+
+    os.remove(args.db)
+
+if __name__ == '__main__':
+    main()
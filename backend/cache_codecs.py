@@ -0,0 +1,97 @@
+import pickle
+import zlib
+from datetime import date, datetime
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import lz4.frame
+except ImportError:
+    lz4 = None
+
+# Binary entries start with MAGIC, a codec id and a compression id.
+# JSON entries (the default) are stored as plain text and never start with MAGIC.
+MAGIC = b'\x00'
+
+def _msgpack_default(value):
+    if isinstance(value, datetime):
+        return msgpack.ExtType(1, value.isoformat().encode())
+    if isinstance(value, date):
+        return msgpack.ExtType(2, value.isoformat().encode())
+    return str(value)
+
+def _msgpack_ext_hook(code, data):
+    if code == 1:
+        return datetime.fromisoformat(data.decode())
+    if code == 2:
+        return date.fromisoformat(data.decode())
+    return msgpack.ExtType(code, data)
+
+SERIALIZERS = {
+    'pickle': (b'p',
+               lambda value: pickle.dumps(value, protocol=5),
+               pickle.loads),
+    'msgpack': (b'm',
+                lambda value: msgpack.packb(value, default=_msgpack_default, use_bin_type=True),
+                lambda data: msgpack.unpackb(data, ext_hook=_msgpack_ext_hook, raw=False, strict_map_key=False)),
+}
+
+COMPRESSORS = {
+    'none': (b'-', None, None),
+    'zlib': (b'z', lambda data: zlib.compress(data, 6), zlib.decompress),
+    'lz4': (b'l', lambda data: lz4.frame.compress(data), lambda data: lz4.frame.decompress(data)),
+}
+
+_SERIALIZER_IDS = {spec[0]: spec[2] for spec in SERIALIZERS.values()}
+_COMPRESSOR_IDS = {spec[0]: spec[2] for spec in COMPRESSORS.values()}
+
+class Codec:
+    """
+    Serializer plus optional compression for one cache namespace.
+    Payloads smaller than compress_min_bytes are stored uncompressed.
+    """
+    def __init__(self, serializer='pickle', compressor='none', compress_min_bytes=1024):
+        if serializer not in SERIALIZERS:
+            raise ValueError(f"Unknown cache serializer: {serializer}")
+        if compressor not in COMPRESSORS:
+            raise ValueError(f"Unknown cache compressor: {compressor}")
+        if serializer == 'msgpack' and msgpack is None:
+            raise ValueError("msgpack codec requested but msgpack is not installed")
+        if compressor == 'lz4' and lz4 is None:
+            raise ValueError("lz4 compression requested but lz4 is not installed")
+        self.serializer = serializer
+        self.serializer_id, self._dumps, _ = SERIALIZERS[serializer]
+        self.compressor_id, self._compress, _ = COMPRESSORS[compressor]
+        self.compress_min_bytes = compress_min_bytes
+        self.name = serializer if compressor == 'none' else f"{serializer}+{compressor}"
+
+    def dumps(self, value):
+        data = self._dumps(value)
+        if self._compress and len(data) >= self.compress_min_bytes:
+            return MAGIC + self.serializer_id + self.compressor_id + self._compress(data)
+        return MAGIC + self.serializer_id + b'-' + data
+
+def parse_codec(spec, compress_min_bytes=1024):
+    """Build a Codec from a spec such as 'pickle', 'msgpack+zlib' or 'pickle+lz4'"""
+    serializer, _, compressor = spec.partition('+')
+    return Codec(serializer, compressor or 'none', compress_min_bytes)
+
+def is_binary(data):
+    return data[:1] == MAGIC
+
+def loads(data, allow_pickle=False):
+    """
+    Decode a binary entry written by any Codec.
+    Pickle payloads run code when loaded, so they are refused unless allow_pickle is set
+    (the caller's namespace is configured for pickle); anyone who can write to Redis could plant one.
+    """
+    if data[1:2] == SERIALIZERS['pickle'][0] and not allow_pickle:
+        raise ValueError("Refusing pickle payload in a namespace not configured for pickle")
+    decompress = _COMPRESSOR_IDS[data[2:3]]
+    payload = data[3:]
+    if decompress:
+        payload = decompress(payload)
+    return _SERIALIZER_IDS[data[1:2]](payload)
@@ -1,8 +1,29 @@
+from celery.schedules import crontab
 from app import create_app
-from celery_utils import make_celery
 
 app = create_app()
-celery = make_celery(app)
+celery = app.extensions['celery']
+
+# Periodic tasks (run with `celery -A celery_worker.celery beat`)
+# Old-style key: the Flask config passes CELERY_* settings, and Celery refuses to mix styles
+celery.conf.CELERYBEAT_SCHEDULE = {
+    'refresh-analytics-rollups': {
+        'task': 'tasks.refresh_analytics_rollups',
+        'schedule': 600.0,  # every 10 minutes
+    },
+    'check-reservation-expiry': {
+        'task': 'tasks.check_reservation_expiry',
+        'schedule': 60.0,  # every minute; only due items are touched
+    },
+    'reconcile-expiry-schedule': {
+        'task': 'tasks.reconcile_expiry_schedule',
+        'schedule': 3600.0,  # hourly safety net for items lost to a Redis outage
+    },
+    'send-monthly-reports': {
+        'task': 'tasks.send_monthly_reports',
+        'schedule': crontab(minute=0, hour=6, day_of_month=1),  # last month's reports, resumable
+    },
+}
 
 # Ensure tasks are registered
 import tasks
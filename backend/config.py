@@ -10,17 +10,71 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///app.db'
     SECURITY_PASSWORD_SALT = os.environ.get('SECURITY_PASSWORD_SALT') or 'dev-password-salt-fixed'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Connections per process; gunicorn.conf.py sets DB_POOL_SIZE to match the worker's threads
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.environ.get('DB_POOL_SIZE') or 5),
+        'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW') or 5),
+        'pool_timeout': 10,
+        'pool_pre_ping': True,
+    }
+    
+    # Log every request's headers and cookies (noisy, and leaks session cookies into logs)
+    DEBUG_REQUEST_LOGGING = os.environ.get('DEBUG_REQUEST_LOGGING', '').lower() in ('1', 'true', 'yes')
+    
+    # Per-request SQL instrumentation (query_metrics.py)
+    SERVER_TIMING_HEADER = True  # Server-Timing: db;dur=..., app;dur=...
+    SQL_QUERY_LOG_THRESHOLD = int(os.environ.get('SQL_QUERY_LOG_THRESHOLD') or 25)  # Warn above this many queries; 0 disables
+    # Serve /metrics (unauthenticated, so off unless the port is only reachable by the scraper)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '').lower() in ('1', 'true', 'yes')
+    
+    # Open availability streams (SSE) per process; past this /parking-lots/stream returns 503
+    STREAM_MAX_SUBSCRIBERS = int(os.environ.get('STREAM_MAX_SUBSCRIBERS') or 100)
+    
+    # Create tables and initial data and rebuild counters/pools/schedule in create_app. gunicorn.conf.py
+    # turns this off for workers and runs `flask startup` once before any worker starts
+    RUN_STARTUP_TASKS = os.environ.get('RUN_STARTUP_TASKS', 'true').lower() in ('1', 'true', 'yes')
     
     # Redis Configuration
     REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0'
     CACHE_TYPE = 'redis'
     CACHE_REDIS_URL = REDIS_URL
     CACHE_DEFAULT_TIMEOUT = 300  # 5 minutes default
+    CACHE_LOCAL_MAX_ENTRIES = 256  # In-process cache tier size per worker
+    # Serialization per cache namespace ('pickle', 'msgpack', optionally '+zlib' or '+lz4'); others use JSON
+    CACHE_CODECS = {'admin_dashboard': 'pickle+zlib'}
+    CACHE_COMPRESS_MIN_BYTES = 1024  # Smaller payloads are stored uncompressed
+    
+    # Redis connection pool (per process); callers wait up to REDIS_POOL_TIMEOUT for a free connection
+    REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS') or 50)
+    REDIS_POOL_TIMEOUT = 2
+    REDIS_SOCKET_TIMEOUT = 1.0
+    REDIS_SOCKET_CONNECT_TIMEOUT = 1.0
+    # Backoff between background health probes while Redis is unreachable (seconds)
+    REDIS_RETRY_BACKOFF_MIN = 0.5
+    REDIS_RETRY_BACKOFF_MAX = 30
+    
+    # Reservation engine: 'lock' (per-lot Redis lock) or 'optimistic' (conditional UPDATE, retry on conflict)
+    RESERVATION_ENGINE = os.environ.get('RESERVATION_ENGINE') or 'lock'
+    RESERVATION_OPTIMISTIC_RETRIES = 5
+    
+    # Reservation expiry (expiry.py): warn this long before end_time, expire no-shows this long after it
+    EXPIRY_WARNING_MINUTES = 15
+    EXPIRY_NO_SHOW_GRACE_MINUTES = 0
+    EXPIRY_BATCH_SIZE = 500
     
     # Celery Configuration
     CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL') or 'redis://localhost:6379/1'
     CELERY_RESULT_BACKEND = os.environ.get('CELERY_RESULT_BACKEND') or 'redis://localhost:6379/1'
     
+    # Background report artifacts (written by the Celery worker, served by the API)
+    REPORT_ARTIFACT_DIR = os.environ.get('REPORT_ARTIFACT_DIR') or os.path.join(basedir, 'instance', 'reports')
+    REPORT_JOB_TTL = 24 * 3600  # How long job metadata is kept (seconds)
+    REPORT_JOB_DEDUPE_TTL = 300  # Identical requests reuse a job while its worker refreshes this (seconds)
+    
+    # Monthly report emails (monthly_reports.py): users per aggregate query and SMTP connection
+    MONTHLY_REPORT_CHUNK_SIZE = 500
+    MONTHLY_REPORT_LOCK_TTL = 600  # Refreshed after every chunk (seconds)
+    
     # Flask-Mail Configuration (Dev: Console)
     MAIL_SERVER = 'smtp.gmail.com'
     MAIL_PORT = 587
@@ -99,6 +153,7 @@ class Config:
 
 class ProductionConfig(Config):
     DEBUG = False
+    DEBUG_REQUEST_LOGGING = False
     # Override for production - use strong secrets
     SECURITY_EMAIL_VALIDATOR_ARGS = {"check_deliverability": True}
 
@@ -109,4 +164,17 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///test.db'
     DEBUG = True
-    WTF_CSRF_ENABLED = False
\ No newline at end of file
+    WTF_CSRF_ENABLED = False
+
+config_by_name = {
+    'development': DevelopmentConfig,
+    'production': ProductionConfig,
+    'testing': TestingConfig,
+}
+
+def get_config():
+    """Config class selected by APP_ENV (development, production or testing; default development)"""
+    env = (os.environ.get('APP_ENV') or 'development').lower()
+    if env not in config_by_name:
+        raise ValueError(f"Unknown APP_ENV '{env}', expected one of: {', '.join(config_by_name)}")
+    return config_by_name[env]
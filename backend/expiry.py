@@ -0,0 +1,217 @@
+import logging
+from datetime import timedelta
+from flask import current_app
+from sqlalchemy import update
+from models import db, User, ParkingSpot, Reservation
+from availability import move_spot, RESERVED, FREE
+from spot_pool import return_spot
+from redis_cache import redis_cache, CacheConfig, user_tag
+from utils import get_ist_now, IST
+
+logger = logging.getLogger(__name__)
+
+# Sorted sets: member = reservation id, score = epoch seconds at which the item is due
+WARN_KEY = "expiry:warn"        # end_time - EXPIRY_WARNING_MINUTES
+NO_SHOW_KEY = "expiry:no_show"  # end_time + EXPIRY_NO_SHOW_GRACE_MINUTES, while not occupied
+
+def _epoch(naive_ist):
+    # Reservation times are stored as naive IST
+    return naive_ist.replace(tzinfo=IST).timestamp()
+
+def _now():
+    return get_ist_now().replace(tzinfo=None)
+
+def _warning_lead():
+    return timedelta(minutes=current_app.config.get('EXPIRY_WARNING_MINUTES', 15))
+
+def _no_show_grace():
+    return timedelta(minutes=current_app.config.get('EXPIRY_NO_SHOW_GRACE_MINUTES', 0))
+
+def schedule_reservation(reservation):
+    """(Re)schedule a reservation's warning and no-show expiry; call after commit on create and extend"""
+    if not redis_cache.is_available():
+        return False
+    try:
+        pipe = redis_cache.redis_client.pipeline(transaction=True)
+        pipe.zadd(WARN_KEY, {str(reservation.id): _epoch(reservation.end_time - _warning_lead())})
+        if reservation.occupied_at is None:
+            pipe.zadd(NO_SHOW_KEY, {str(reservation.id): _epoch(reservation.end_time + _no_show_grace())})
+        pipe.execute()
+        return True
+    except Exception as e:
+        redis_cache.record_failure(e)
+        logger.error(f"Error scheduling reservation expiry: {e}")
+        return False
+
+def unschedule_reservation(reservation_id, warning=True):
+    """Drop a reservation's pending items (occupied: no-show only; released or cancelled: both)"""
+    if not redis_cache.is_available():
+        return False
+    try:
+        pipe = redis_cache.redis_client.pipeline(transaction=False)
+        pipe.zrem(NO_SHOW_KEY, str(reservation_id))
+        if warning:
+            pipe.zrem(WARN_KEY, str(reservation_id))
+        pipe.execute()
+        return True
+    except Exception as e:
+        redis_cache.record_failure(e)
+        logger.error(f"Error unscheduling reservation expiry: {e}")
+        return False
+
+def reconcile_schedule():
+    """
+    Re-add active reservations to the schedule (after a Redis outage, flush or worker crash).
+    Only adds: items already claimed stay claimed, and warnings whose time has passed are not re-sent.
+    """
+    if not redis_cache.is_available():
+        return False
+
+    now = _now()
+    lead = _warning_lead()
+    warn, no_show = {}, {}
+    for reservation_id, end_time, occupied_at in db.session.query(
+        Reservation.id, Reservation.end_time, Reservation.occupied_at
+    ).filter(Reservation.status == 'active').all():
+        if end_time - lead > now:
+            warn[str(reservation_id)] = _epoch(end_time - lead)
+        if occupied_at is None:
+            no_show[str(reservation_id)] = _epoch(end_time + _no_show_grace())
+
+    try:
+        pipe = redis_cache.redis_client.pipeline(transaction=False)
+        if warn:
+            pipe.zadd(WARN_KEY, warn)
+        if no_show:
+            pipe.zadd(NO_SHOW_KEY, no_show)
+        pipe.execute()
+        return True
+    except Exception as e:
+        redis_cache.record_failure(e)
+        logger.error(f"Error reconciling expiry schedule: {e}")
+        return False
+
+def _claim(key, now, batch_size):
+    """
+    Take up to batch_size members due by `now` as {reservation_id: score}. Each is removed with its
+    own ZREM and only the caller whose ZREM removed it keeps it, so concurrent schedulers never share an item.
+    """
+    client = redis_cache.redis_client
+    candidates = client.zrangebyscore(key, '-inf', _epoch(now), start=0, num=batch_size, withscores=True)
+    if not candidates:
+        return {}
+    pipe = client.pipeline(transaction=False)
+    for member, _ in candidates:
+        pipe.zrem(key, member)
+    return {int(member): score for (member, score), removed in zip(candidates, pipe.execute()) if removed}
+
+def _unclaim(key, claimed):
+    """Put claimed members back with their original scores, so the next run retries a batch whose handler failed"""
+    try:
+        redis_cache.redis_client.zadd(key, {str(reservation_id): score for reservation_id, score in claimed.items()})
+    except Exception as e:
+        redis_cache.record_failure(e)
+        logger.error(f"Error returning {len(claimed)} claimed expiry items to {key}: {e}")
+
+def send_warnings(reservation_ids, now):
+    """Notify the owners of still-active reservations that end soon (one query for the batch)"""
+    rows = db.session.query(Reservation.id, Reservation.end_time, User.email).join(
+        User, Reservation.user_id == User.id
+    ).filter(
+        Reservation.id.in_(reservation_ids),
+        Reservation.status == 'active',
+        Reservation.end_time > now
+    ).all()
+    for reservation_id, end_time, email in rows:
+        # Here we would send an email or push notification
+        logger.info(f"Notify user {email} -> reservation {reservation_id} expires at {end_time}")
+    return len(rows)
+
+def expire_no_shows(reservation_ids, now):
+    """
+    Expire reservations whose end time passed without the vehicle arriving.
+    Each row is flipped with a conditional UPDATE, so an item claimed twice (or raced by
+    occupy/cancel/extend) is applied at most once. Returns the number expired.
+    """
+    cutoff = now - _no_show_grace()
+    candidates = db.session.query(Reservation.id, Reservation.user_id, Reservation.spot_id, ParkingSpot.lot_id).join(
+        ParkingSpot, Reservation.spot_id == ParkingSpot.id
+    ).filter(
+        Reservation.id.in_(reservation_ids),
+        Reservation.status == 'active',
+        Reservation.occupied_at.is_(None),
+        Reservation.end_time <= cutoff
+    ).all()
+
+    expired = []
+    for reservation_id, user_id, spot_id, lot_id in candidates:
+        result = db.session.execute(
+            update(Reservation).where(
+                Reservation.id == reservation_id,
+                Reservation.status == 'active',
+                Reservation.occupied_at.is_(None),
+                Reservation.end_time <= cutoff
+            ).values(status='expired'),
+            execution_options={'synchronize_session': False}
+        )
+        if result.rowcount == 1:
+            move_spot(lot_id, RESERVED, FREE)
+            expired.append((user_id, spot_id, lot_id))
+    db.session.commit()
+
+    for user_id, spot_id, lot_id in expired:
+        return_spot(lot_id, spot_id)
+    if expired:
+        redis_cache.invalidate_tags(CacheConfig.LOTS_TAG, CacheConfig.ANALYTICS_TAG,
+                                    *{user_tag(user_id) for user_id, _, _ in expired})
+    return len(expired)
+
+def due_no_shows(cutoff, batch_size):
+    """Ids of unoccupied active reservations that ended by `cutoff`, walking the partial index on active end_time"""
+    return db.session.query(Reservation.id).filter(
+        Reservation.status == 'active',
+        Reservation.end_time <= cutoff,
+        Reservation.occupied_at.is_(None)
+    ).order_by(Reservation.end_time).limit(batch_size)
+
+def _due_no_shows_from_db(now, batch_size):
+    """Fallback while Redis is down: sweep the table instead of the schedule"""
+    return [reservation_id for (reservation_id,) in due_no_shows(now - _no_show_grace(), batch_size).all()]
+
+def process_due(now=None, batch_size=None):
+    """
+    Pop due warnings and no-shows in batches and handle each once.
+    Work is proportional to the number of due items, not to the number of active reservations.
+    If a handler raises, its batch is put back in the schedule before the error propagates.
+    """
+    now = now or _now()
+    batch_size = batch_size or current_app.config.get('EXPIRY_BATCH_SIZE', 500)
+    result = {'warned': 0, 'expired': 0}
+
+    if not redis_cache.is_available():
+        # Warnings need the schedule for exactly-once delivery; no-shows are safe to sweep from the DB
+        while True:
+            due = _due_no_shows_from_db(now, batch_size)
+            expired = expire_no_shows(due, now) if due else 0
+            result['expired'] += expired
+            if len(due) < batch_size or not expired:
+                return result
+
+    for key, handle, counter in ((WARN_KEY, send_warnings, 'warned'), (NO_SHOW_KEY, expire_no_shows, 'expired')):
+        while True:
+            try:
+                due = _claim(key, now, batch_size)
+            except Exception as e:
+                redis_cache.record_failure(e)
+                logger.error(f"Error claiming due expiry items: {e}")
+                return result
+            if due:
+                try:
+                    result[counter] += handle(list(due), now)
+                except Exception:
+                    db.session.rollback()
+                    _unclaim(key, due)
+                    raise
+            if len(due) < batch_size:
+                break
+    return result
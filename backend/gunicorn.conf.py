@@ -0,0 +1,68 @@
+"""
+Production serving profile:  cd backend && APP_ENV=production gunicorn -c gunicorn.conf.py app:app
+
+GUNICORN_WORKER_CLASS  gevent (default) or gthread. Every open availability stream (SSE)
+                       holds a gthread thread, so gthread only suits deployments without
+                       many browser tabs open; each worker caps its open streams either way.
+STREAM_MAX_SUBSCRIBERS open streams per worker before /parking-lots/stream answers 503
+                       (default half the worker's threads or connections)
+WEB_CONCURRENCY        worker processes (default 2 x CPUs + 1)
+GUNICORN_THREADS       threads per gthread worker (default 4)
+GUNICORN_CONNECTIONS   concurrent greenlets per gevent worker (default 200)
+"""
+import multiprocessing
+import os
+import subprocess
+import sys
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gevent')
+workers = int(os.environ.get('WEB_CONCURRENCY') or multiprocessing.cpu_count() * 2 + 1)
+threads = int(os.environ.get('GUNICORN_THREADS') or 4)
+worker_connections = int(os.environ.get('GUNICORN_CONNECTIONS') or 200)
+
+# One DB connection per thread that can run a request; gevent requests share a
+# bounded pool (most time is spent waiting on Redis and the client, not the DB)
+if worker_class == 'gevent':
+    os.environ.setdefault('DB_POOL_SIZE', '10')
+    os.environ.setdefault('DB_MAX_OVERFLOW', '10')
+else:
+    os.environ.setdefault('DB_POOL_SIZE', str(threads))
+    os.environ.setdefault('DB_MAX_OVERFLOW', '0')
+
+# Long-lived streams may take at most half of a worker's request slots; the rest stay free for the API
+os.environ.setdefault('STREAM_MAX_SUBSCRIBERS',
+                      str(max(1, (worker_connections if worker_class == 'gevent' else threads) // 2)))
+
+# Load the app once in the master and fork.
+# gevent must monkey-patch before the app is imported, so it loads per worker instead.
+preload_app = worker_class != 'gevent'
+
+# create_app skips the schema/initial data/counter rebuild in the master and every worker;
+# when_ready runs them once instead
+os.environ['RUN_STARTUP_TASKS'] = 'false'
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+# Recycle workers periodically to bound memory growth
+max_requests = 2000
+max_requests_jitter = 200
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+def when_ready(server):
+    # Runs in the master before any worker is spawned. A separate process, so the master never
+    # imports the app ahead of gevent's monkey-patching; a failure stops gunicorn from starting.
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'startup'], check=True,
+                   cwd=os.path.dirname(os.path.abspath(__file__)))
+
+def post_fork(server, worker):
+    # Connections opened in the master during preload must not be shared with children
+    if preload_app:
+        from app import app
+        from models import db
+        with app.app_context():
+            db.engine.dispose(close=False)
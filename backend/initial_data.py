@@ -1,4 +1,5 @@
-from models import db, User, Role, Parking_lot, ParkingSpot
+from models import db, User, Role, Parking_lot
+from lot_spots import add_spots
 from flask_security import hash_password
 from sec import datastore
 
@@ -57,14 +58,8 @@ def create_initial_data():
             db.session.add(lot)
             db.session.flush()  # Get the ID
             
-            # Create parking spots for each lot
-            for i in range(1, lot_data['capacity'] + 1):
-                spot = ParkingSpot(
-                    lot_id=lot.id,
-                    spot_number=f"{chr(65 + (i-1)//50)}-{(i-1)%50 + 1:02d}",  # A-01, A-02, etc.
-                    is_occupied=False
-                )
-                db.session.add(spot)
+            # Create parking spots for each lot: A-01 .. A-50, B-01, ...
+            add_spots(lot.id, (f"{chr(65 + (i-1)//50)}-{(i-1)%50 + 1:02d}" for i in range(1, lot_data['capacity'] + 1)))
             
             print(f"Created parking lot: {lot.name} with {lot_data['capacity']} spots")
     
@@ -0,0 +1,45 @@
+from sqlalchemy import insert, delete, select, exists
+from models import db, ParkingSpot, Reservation
+from queries import active_reservation_on
+from utils import get_ist_now
+
+def add_spots(lot_id, spot_numbers):
+    """Insert spots for a lot with one executemany instead of one ORM object per spot. Does not commit."""
+    now = get_ist_now()
+    rows = [{'lot_id': lot_id, 'spot_number': spot_number, 'is_occupied': False, 'created_at': now}
+            for spot_number in spot_numbers]
+    if rows:
+        db.session.execute(insert(ParkingSpot), rows)
+    return len(rows)
+
+def remove_free_spots(lot_id, count):
+    """
+    Delete a lot's `count` highest-id spots that are unoccupied and have never been reserved,
+    as a single DELETE. Spots with any reservation, past or active, are kept so their history
+    still resolves. Returns the number deleted (less than count if not enough qualify). Does not commit.
+    """
+    free_ids = select(ParkingSpot.id).where(
+        ParkingSpot.lot_id == lot_id,
+        ParkingSpot.is_occupied == False,
+        ~exists().where(Reservation.spot_id == ParkingSpot.id)
+    ).order_by(ParkingSpot.id.desc()).limit(count)
+
+    result = db.session.execute(
+        delete(ParkingSpot).where(ParkingSpot.id.in_(free_ids.scalar_subquery())),
+        execution_options={'synchronize_session': False}
+    )
+    return result.rowcount
+
+def spot_states(lot_id=None, limit=None, offset=0):
+    """
+    (id, lot_id, spot_number, is_occupied, is_reserved) rows ordered by lot and spot id, in one query.
+    is_reserved is an EXISTS over the spot's active reservations. lot_id=None covers every lot.
+    """
+    is_reserved = active_reservation_on(ParkingSpot.id)
+    query = select(ParkingSpot.id, ParkingSpot.lot_id, ParkingSpot.spot_number, ParkingSpot.is_occupied,
+                   is_reserved.label('is_reserved')).order_by(ParkingSpot.lot_id, ParkingSpot.id)
+    if lot_id is not None:
+        query = query.where(ParkingSpot.lot_id == lot_id)
+    if limit is not None:
+        query = query.limit(limit).offset(offset)
+    return db.session.execute(query).all()
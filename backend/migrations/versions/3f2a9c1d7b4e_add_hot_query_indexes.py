@@ -0,0 +1,39 @@
+"""add indexes for hot reservation and spot queries
+
+Revision ID: 3f2a9c1d7b4e
+Revises: 
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f2a9c1d7b4e'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+ACTIVE = sa.text("status = 'active'")
+
+# db.create_all() creates these on fresh databases, so every index is created only if missing
+INDEXES = [
+    ('ix_parking_spot_lot_occupied', 'parking_spot', ['lot_id', 'is_occupied'], {}),
+    ('ix_reservation_user_created', 'reservation', ['user_id', 'created_at'], {}),
+    ('ix_reservation_user_status', 'reservation', ['user_id', 'status'], {}),
+    ('ix_reservation_spot_status', 'reservation', ['spot_id', 'status'], {}),
+    ('ix_reservation_status_created', 'reservation', ['status', 'created_at'], {}),
+    ('ix_reservation_created_at', 'reservation', ['created_at'], {}),
+    ('ix_reservation_active_end_time', 'reservation', ['end_time'], {'sqlite_where': ACTIVE, 'postgresql_where': ACTIVE}),
+]
+
+
+def upgrade():
+    for name, table, columns, options in INDEXES:
+        op.create_index(name, table, columns, unique=False, if_not_exists=True, **options)
+
+
+def downgrade():
+    for name, table, _, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,36 @@
+"""add version columns for optimistic booking claims
+
+Revision ID: 8c41d2e7a9f3
+Revises: 3f2a9c1d7b4e
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8c41d2e7a9f3'
+down_revision = '3f2a9c1d7b4e'
+branch_labels = None
+depends_on = None
+
+COLUMNS = [
+    ('parking_spot', 'version'),
+    ('user', 'booking_version'),
+]
+
+
+def upgrade():
+    existing = sa.inspect(op.get_bind())
+    for table, column in COLUMNS:
+        # db.create_all() already adds them on fresh databases
+        if column not in {c['name'] for c in existing.get_columns(table)}:
+            with op.batch_alter_table(table) as batch_op:
+                batch_op.add_column(sa.Column(column, sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    for table, column in reversed(COLUMNS):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column(column)
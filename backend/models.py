@@ -17,6 +17,8 @@ class User(db.Model, fsqla.FsUserMixin):
     # Additional fields beyond the Flask-Security standard ones
     name = db.Column(db.String(80), nullable=False)
     username = db.Column(db.String(80), unique=True, nullable=True)
+    # Bumped by every optimistic booking (compare-and-set), so one user's concurrent bookings serialize
+    booking_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Add relationship to reservations
     reservations = db.relationship('Reservation', backref='user', lazy=True)
@@ -33,16 +35,33 @@ class Parking_lot(db.Model):
     # Relationship to parking spots
     spots = db.relationship('ParkingSpot', backref='parking_lot', lazy=True, cascade='all, delete-orphan')
     
+    # Materialized availability counters (see availability.py)
+    availability = db.relationship('LotAvailability', backref='parking_lot', uselist=False, lazy=True, cascade='all, delete-orphan')
+    
+class LotAvailability(db.Model):
+    # One row per lot; kept in step with spots/reservations in the same transaction
+    lot_id = db.Column(db.Integer, db.ForeignKey('parking_lot.id'), primary_key=True)
+    free_spots = db.Column(db.Integer, nullable=False, default=0)       # Not occupied, no active reservation
+    reserved_spots = db.Column(db.Integer, nullable=False, default=0)   # Active reservation, not yet occupied
+    occupied_spots = db.Column(db.Integer, nullable=False, default=0)   # Vehicle currently parked
+    updated_at = db.Column(db.DateTime, default=get_ist_now, onupdate=get_ist_now)
+    
 class ParkingSpot(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     lot_id = db.Column(db.Integer, db.ForeignKey('parking_lot.id'), nullable=False)
     spot_number = db.Column(db.String(20), nullable=False)
     is_occupied = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=get_ist_now)
+    # Bumped by every optimistic claim (compare-and-set), so only one concurrent booker can win a spot
+    version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Relationship to reservations
     reservations = db.relationship('Reservation', backref='parking_spot', lazy=True)
     
+    __table_args__ = (
+        db.Index('ix_parking_spot_lot_occupied', 'lot_id', 'is_occupied'),   # Free/occupied spots of a lot
+    )
+    
 class Reservation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -50,7 +69,7 @@ class Reservation(db.Model):
     start_time = db.Column(db.DateTime, nullable=False)
     end_time = db.Column(db.DateTime, nullable=False)
     created_at = db.Column(db.DateTime, default=get_ist_now)
-    status = db.Column(db.String(20), default='active')  # active, completed, cancelled
+    status = db.Column(db.String(20), default='active')  # active, completed, cancelled, expired (no-show)
     
     # Cost and duration tracking
     reserved_duration_hours = db.Column(db.Float, nullable=True)  # Originally reserved duration
@@ -66,5 +85,48 @@ class Reservation(db.Model):
     # Vehicle details
     vehicle_number = db.Column(db.String(20), nullable=True)      # Vehicle registration number
 
+    # Indexes for the hot query shapes (migrations/versions/3f2a9c1d7b4e_add_hot_query_indexes.py)
+    __table_args__ = (
+        db.Index('ix_reservation_user_created', 'user_id', 'created_at'),      # A user's reservations, newest first
+        db.Index('ix_reservation_user_status', 'user_id', 'status'),           # A user's active reservations
+        db.Index('ix_reservation_spot_status', 'spot_id', 'status'),           # Active reservation on a spot
+        db.Index('ix_reservation_status_created', 'status', 'created_at'),     # Listings/counts by status
+        db.Index('ix_reservation_created_at', 'created_at'),                   # Analytics windows, admin listings
+        db.Index('ix_reservation_active_end_time', 'end_time',                 # Expiry scan (active only)
+                 sqlite_where=db.text("status = 'active'"), postgresql_where=db.text("status = 'active'")),
+    )
+    
     
-    
\ No newline at end of file
+class DailyLotStats(db.Model):
+    # Analytics rollup: one row per lot per day of Reservation.created_at (see rollups.py)
+    day = db.Column(db.Date, primary_key=True)
+    lot_id = db.Column(db.Integer, primary_key=True)
+    bookings = db.Column(db.Integer, nullable=False, default=0)             # Active + completed
+    active_bookings = db.Column(db.Integer, nullable=False, default=0)      # Still active when rolled up
+    completed_bookings = db.Column(db.Integer, nullable=False, default=0)
+    cancellations = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0.0)
+    hours = db.Column(db.Float, nullable=False, default=0.0)
+    distinct_users = db.Column(db.Integer, nullable=False, default=0)
+
+class HourlyLotStats(db.Model):
+    # Analytics rollup: bookings per lot per day per start hour
+    day = db.Column(db.Date, primary_key=True)
+    lot_id = db.Column(db.Integer, primary_key=True)
+    hour = db.Column(db.Integer, primary_key=True)
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+
+class RollupCheckpoint(db.Model):
+    # High-water mark of incremental jobs (last fully processed day)
+    name = db.Column(db.String(50), primary_key=True)
+    last_day = db.Column(db.Date, nullable=True)
+    updated_at = db.Column(db.DateTime, default=get_ist_now, onupdate=get_ist_now)
+
+class MonthlyReportRun(db.Model):
+    # Progress of one month's report fan-out (see monthly_reports.py); resumed after a crash
+    period = db.Column(db.String(7), primary_key=True)                   # 'YYYY-MM'
+    last_user_id = db.Column(db.Integer, nullable=False, default=0)      # Every user up to this id is done
+    sent = db.Column(db.Integer, nullable=False, default=0)
+    failed = db.Column(db.Integer, nullable=False, default=0)            # Recipients refused by the SMTP server
+    completed_at = db.Column(db.DateTime, nullable=True)
+    updated_at = db.Column(db.DateTime, default=get_ist_now, onupdate=get_ist_now)
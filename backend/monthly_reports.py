@@ -0,0 +1,187 @@
+import logging
+import smtplib
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from flask_mail import Message
+from jinja2 import Environment
+from sqlalchemy import func
+from models import db, User, Reservation, MonthlyReportRun
+from rollups import revenue_expr
+from redis_cache import redis_cache
+from utils import get_ist_now
+
+logger = logging.getLogger(__name__)
+
+LOCK_KEY = "monthly_report:lock:{period}"
+SUBJECT = "Your Monthly Parking Report"
+
+# Compiled once per process; each message only renders it
+REPORT_TEMPLATE = Environment(autoescape=True).from_string("""\
+<h1>Monthly Parking Report</h1>
+<p>Hello {{ name }},</p>
+<p>Here is your summary for {{ month }}:</p>
+<ul>
+    <li>Total Reservations: {{ reservations }}</li>
+    <li>Total Spent: ${{ '%.2f' % spent }}</li>
+    <li>Total Hours: {{ '%.2f' % hours }}</li>
+</ul>
+<p>Thank you for using Vehicle Parking App!</p>
+""")
+
+def previous_period(today=None):
+    """'YYYY-MM' of the month before `today` (IST)"""
+    first_of_month = (today or get_ist_now().date()).replace(day=1)
+    return (first_of_month - timedelta(days=1)).strftime('%Y-%m')
+
+def period_window(period):
+    """[start, end) of a 'YYYY-MM' period as naive IST datetimes, matching Reservation.created_at"""
+    start = datetime.strptime(period, '%Y-%m')
+    return start, (start + timedelta(days=32)).replace(day=1)
+
+def chunk_totals(user_ids, start, end):
+    """{user_id: (reservations, spent, hours)} for a chunk of users, from one grouped query"""
+    rows = db.session.query(
+        Reservation.user_id,
+        func.count(Reservation.id),
+        func.coalesce(func.sum(revenue_expr), 0),
+        func.coalesce(func.sum(func.coalesce(Reservation.actual_duration_hours, 0)), 0)
+    ).filter(
+        Reservation.user_id.in_(user_ids),
+        Reservation.created_at >= start,
+        Reservation.created_at < end
+    ).group_by(Reservation.user_id).all()
+    return {user_id: (count, spent, hours) for user_id, count, spent, hours in rows}
+
+def build_message(name, email, month, totals, sender):
+    reservations, spent, hours = totals
+    return Message(subject=SUBJECT, recipients=[email], sender=sender,
+                   html=REPORT_TEMPLATE.render(name=name or email, month=month, reservations=reservations,
+                                               spent=spent, hours=hours))
+
+def _send_chunk(connection, users, totals, month, sender, tally):
+    """
+    Send one chunk over an open connection, updating tally (last_user_id, sent, failed) after
+    each message. Recipients the server refuses are logged and skipped.
+    """
+    for user_id, name, email in users:
+        try:
+            connection.send(build_message(name, email, month, totals.get(user_id, (0, 0, 0)), sender))
+            tally['sent'] += 1
+        except smtplib.SMTPRecipientsRefused as e:
+            tally['failed'] += 1
+            logger.warning(f"Monthly report to {email} refused: {e}")
+        tally['last_user_id'] = user_id
+
+def _acquire_lock(period, token):
+    # One fan-out per period at a time; without Redis we rely on beat firing once
+    if not redis_cache.is_available():
+        return True
+    try:
+        return bool(redis_cache.redis_client.set(LOCK_KEY.format(period=period), token, nx=True,
+                                                 ex=current_app.config.get('MONTHLY_REPORT_LOCK_TTL', 600)))
+    except Exception as e:
+        redis_cache.record_failure(e)
+        logger.error(f"Error acquiring monthly report lock: {e}")
+        return True
+
+def _refresh_lock(period, token):
+    if not redis_cache.is_available():
+        return
+    try:
+        key = LOCK_KEY.format(period=period)
+        if redis_cache.redis_client.get(key) == token:
+            redis_cache.redis_client.expire(key, current_app.config.get('MONTHLY_REPORT_LOCK_TTL', 600))
+    except Exception as e:
+        redis_cache.record_failure(e)
+        logger.error(f"Error refreshing monthly report lock: {e}")
+
+def _release_lock(period, token):
+    if not redis_cache.is_available():
+        return
+    try:
+        key = LOCK_KEY.format(period=period)
+        if redis_cache.redis_client.get(key) == token:
+            redis_cache.redis_client.delete(key)
+    except Exception as e:
+        redis_cache.record_failure(e)
+        logger.error(f"Error releasing monthly report lock: {e}")
+
+def _summary(run):
+    return {'period': run.period, 'sent': run.sent, 'failed': run.failed, 'last_user_id': run.last_user_id,
+            'completed': run.completed_at is not None}
+
+def send_monthly_reports(period=None, chunk_size=None, progress=None):
+    """
+    Email every active user their totals for `period` ('YYYY-MM', default last month).
+    Users are walked by id in chunks: one grouped query and one SMTP connection per chunk.
+    The last user sent is checkpointed in MonthlyReportRun, so a rerun after a crash resumes
+    where it stopped and a rerun after completion sends nothing. progress(sent) is called per chunk.
+    """
+    period = period or previous_period()
+    start, end = period_window(period)
+    month = start.strftime('%B %Y')
+    chunk_size = chunk_size or current_app.config.get('MONTHLY_REPORT_CHUNK_SIZE', 500)
+    sender = current_app.config['MAIL_DEFAULT_SENDER']
+    mail = current_app.extensions['mail']
+
+    token = str(uuid.uuid4())
+    if not _acquire_lock(period, token):
+        logger.info(f"Monthly reports for {period} already running, skipping")
+        return {'period': period, 'skipped': 'already running'}
+
+    try:
+        run = db.session.get(MonthlyReportRun, period)
+        if run is None:
+            run = MonthlyReportRun(period=period, last_user_id=0, sent=0, failed=0)
+            db.session.add(run)
+            db.session.commit()
+        if run.completed_at:
+            return _summary(run)
+
+        while True:
+            users = db.session.query(User.id, User.name, User.email).filter(
+                User.active.is_(True),
+                User.id > run.last_user_id
+            ).order_by(User.id).limit(chunk_size).all()
+            if not users:
+                break
+
+            totals = chunk_totals([user_id for user_id, _, _ in users], start, end)
+            tally = {'last_user_id': run.last_user_id, 'sent': 0, 'failed': 0}
+            try:
+                with mail.connect() as connection:
+                    _send_chunk(connection, users, totals, month, sender, tally)
+            finally:
+                # Checkpoint what was actually sent, even if the connection dropped mid-chunk
+                if tally['last_user_id'] != run.last_user_id:
+                    run.last_user_id = tally['last_user_id']
+                    run.sent += tally['sent']
+                    run.failed += tally['failed']
+                    db.session.commit()
+
+            _refresh_lock(period, token)
+            if progress:
+                progress(run.sent)
+            if len(users) < chunk_size:
+                break
+
+        run.completed_at = get_ist_now()
+        db.session.commit()
+        logger.info(f"Monthly reports for {period}: {run.sent} sent, {run.failed} refused")
+        return _summary(run)
+    finally:
+        _release_lock(period, token)
+
+def send_user_report(user_id, period=None):
+    """One user's report for `period` (default last month), outside the fan-out checkpoint"""
+    period = period or previous_period()
+    start, end = period_window(period)
+    user = db.session.query(User.id, User.name, User.email).filter(User.id == user_id).first()
+    if not user:
+        return False
+    message = build_message(user.name, user.email, start.strftime('%B %Y'),
+                            chunk_totals([user.id], start, end).get(user.id, (0, 0, 0)),
+                            current_app.config['MAIL_DEFAULT_SENDER'])
+    current_app.extensions['mail'].send(message)
+    return True
@@ -0,0 +1,103 @@
+import base64
+import json
+from datetime import datetime
+from sqlalchemy import and_, or_, func, text
+from models import Reservation
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+# ?count= modes for listings; 'approximate' is the planner estimate on PostgreSQL
+# and a count capped at APPROXIMATE_COUNT_CAP rows elsewhere
+COUNT_MODES = ('exact', 'approximate', 'none')
+APPROXIMATE_COUNT_CAP = 10000
+
+# Newest-first sort of every reservation listing; id breaks created_at ties
+RESERVATION_KEYSET = (Reservation.created_at, Reservation.id)
+
+def encode_cursor(*values):
+    """Opaque, URL-safe cursor for the sort values of the last row on a page"""
+    payload = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values],
+                         separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor, *parsers):
+    """
+    Inverse of encode_cursor; each parser converts one value back (e.g. datetime.fromisoformat, int).
+    Raises ValueError for tampered or mismatched cursors.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as e:
+        raise ValueError('Invalid cursor') from e
+    if not isinstance(values, list) or len(values) != len(parsers):
+        raise ValueError('Invalid cursor')
+    try:
+        return [parser(value) for parser, value in zip(parsers, values)]
+    except (ValueError, TypeError) as e:
+        raise ValueError('Invalid cursor') from e
+
+def keyset_after(columns, values, descending=False):
+    """
+    WHERE clause selecting rows strictly after `values` in ORDER BY columns (all ASC or all DESC),
+    expanded as (a > x) OR (a = x AND b > y) so it works on every backend and can use an index.
+    """
+    clauses = []
+    for i, (column, value) in enumerate(zip(columns, values)):
+        beyond = column < value if descending else column > value
+        clauses.append(and_(*[c == v for c, v in zip(columns[:i], values[:i])], beyond))
+    return or_(*clauses)
+
+def page_limit(requested, default=DEFAULT_LIMIT):
+    """Clamp a ?limit= value to 1..MAX_LIMIT"""
+    return max(1, min(requested or default, MAX_LIMIT))
+
+def keyset_order(query, columns, after=None, descending=True):
+    """`query` ordered by `columns`, restricted to rows after the `after` values when given"""
+    if after is not None:
+        query = query.filter(keyset_after(columns, after, descending))
+    return query.order_by(*[column.desc() if descending else column.asc() for column in columns])
+
+def keyset_page(query, columns, limit, cursor=None, parsers=(), row_values=None, descending=True, offset=0):
+    """
+    One page of `query` ordered by `columns`, the last of which must be unique.
+    Returns (rows, next_cursor); next_cursor is None on the last page. row_values(row) gives the
+    column values of a row for the cursor. Without a cursor, a legacy `offset` is still honoured.
+    """
+    query = keyset_order(query, columns, decode_cursor(cursor, *parsers) if cursor else None, descending)
+    if offset and not cursor:
+        query = query.offset(offset)
+    rows = query.limit(limit + 1).all()
+    next_cursor = encode_cursor(*row_values(rows[limit - 1])) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+def reservation_page(query, limit, cursor=None, offset=0, reservation=lambda row: row):
+    """Newest-first keyset page of a Reservation query on (created_at, id); `reservation` picks it out of a row"""
+    return keyset_page(query, RESERVATION_KEYSET, limit, cursor,
+                       parsers=(datetime.fromisoformat, int),
+                       row_values=lambda row: (reservation(row).created_at, reservation(row).id),
+                       offset=offset)
+
+def count_rows(query, mode='exact'):
+    """Row count of `query` for a listing's ?count= mode (None for 'none')"""
+    if mode == 'none':
+        return None
+    query = query.order_by(None)
+    if mode == 'approximate':
+        session = query.session
+        bind = session.get_bind()
+        if bind.dialect.name == 'postgresql':
+            sql = query.statement.compile(bind, compile_kwargs={'literal_binds': True})
+            plan = session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]['Plan']['Plan Rows'])
+        return session.query(func.count()).select_from(query.limit(APPROXIMATE_COUNT_CAP).subquery()).scalar()
+    return query.count()
+
+def count_mode(requested, cursor):
+    """?count= value, defaulting to an exact count on the first page and none after it"""
+    mode = (requested or ('none' if cursor else 'exact')).lower()
+    if mode not in COUNT_MODES:
+        raise ValueError(f"count must be one of: {', '.join(COUNT_MODES)}")
+    return mode
@@ -0,0 +1,69 @@
+"""
+Builders for the hot reservation and parking spot queries.
+The routes and tasks build these shapes here rather than inline, and tests/test_query_plans.py
+runs EXPLAIN QUERY PLAN on the same builders, so an unindexed shape fails the suite.
+"""
+from sqlalchemy import func, case, exists
+from models import db, User, Parking_lot, ParkingSpot, Reservation
+from rollups import COUNTED_STATUSES
+
+def active_reservation_on(spot_id):
+    """EXISTS over the active reservations of a spot (an id, or ParkingSpot.id to correlate)"""
+    return exists().where(Reservation.spot_id == spot_id, Reservation.status == 'active')
+
+def user_reservations(user_id):
+    """A user's reservations (GET /reservations, /reservations/history)"""
+    return Reservation.query.filter_by(user_id=user_id)
+
+def active_reservation_in_lot(user_id, lot_id):
+    """The user's active reservation in a lot, if any (one booking per lot)"""
+    return Reservation.query.filter_by(user_id=user_id, status='active').join(ParkingSpot).filter_by(lot_id=lot_id)
+
+def free_spots_in_lot(lot_id):
+    """Unoccupied spots of a lot with no active reservation (allocation fallback when the pool is out of sync)"""
+    return ParkingSpot.query.filter_by(lot_id=lot_id, is_occupied=False).filter(~active_reservation_on(ParkingSpot.id))
+
+def reservation_details():
+    """(Reservation, ParkingSpot, Parking_lot, User) rows for the admin listings"""
+    return db.session.query(Reservation, ParkingSpot, Parking_lot, User).join(
+        ParkingSpot, Reservation.spot_id == ParkingSpot.id
+    ).join(
+        Parking_lot, ParkingSpot.lot_id == Parking_lot.id
+    ).join(
+        User, Reservation.user_id == User.id
+    )
+
+def users_with_totals(*filters):
+    """
+    (User, total_reservations, active_reservations) rows, with the totals from one grouped subquery
+    instead of two COUNTs per user. Returns the query and {sort name: column} for the admin listing.
+    """
+    stats = db.session.query(
+        Reservation.user_id.label('user_id'),
+        func.count(Reservation.id).label('total'),
+        func.sum(case((Reservation.status == 'active', 1), else_=0)).label('active')
+    ).group_by(Reservation.user_id).subquery()
+    total_reservations = func.coalesce(stats.c.total, 0)
+    active_reservations = func.coalesce(stats.c.active, 0)
+
+    query = db.session.query(User, total_reservations, active_reservations).outerjoin(
+        stats, stats.c.user_id == User.id
+    ).filter(*filters)
+    sort_columns = {
+        'id': User.id, 'name': User.name, 'email': User.email,
+        'total_reservations': total_reservations, 'active_reservations': active_reservations
+    }
+    return query, sort_columns
+
+def active_users(start, end=None):
+    """Count of distinct users with a counted booking created in [start, end)"""
+    query = db.session.query(func.count(func.distinct(Reservation.user_id))).filter(
+        Reservation.created_at >= start, Reservation.status.in_(COUNTED_STATUSES)
+    )
+    if end is not None:
+        query = query.filter(Reservation.created_at < end)
+    return query
+
+def reservation_status_counts():
+    """(status, count) rows over every reservation (admin dashboard)"""
+    return db.session.query(Reservation.status, func.count(Reservation.id)).group_by(Reservation.status)
@@ -0,0 +1,151 @@
+import os
+import threading
+import time
+from collections import defaultdict
+from flask import g, request, current_app, has_request_context, Response
+from sqlalchemy import event
+
+# Upper bounds (seconds) of the request duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# The request's RequestQueries lives in the WSGI environ rather than g: streamed bodies
+# (stream_with_context) run under a fresh app context, but keep the same environ
+ENVIRON_KEY = 'query_metrics.sql'
+
+class RequestQueries:
+    """SQL statements executed while serving one request"""
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.slowest = 0.0
+        self.slowest_statement = None
+
+    def record(self, statement, duration):
+        self.count += 1
+        self.total += duration
+        if duration > self.slowest:
+            self.slowest = duration
+            self.slowest_statement = statement
+
+class Metrics:
+    """Per-process request and SQL counters, rendered in the Prometheus text format"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = defaultdict(int)            # (method, endpoint, status) -> count
+        self.duration_sum = defaultdict(float)      # (method, endpoint) -> seconds
+        self.duration_buckets = defaultdict(lambda: [0] * (len(DURATION_BUCKETS) + 1))
+        self.queries = defaultdict(int)             # (method, endpoint) -> statements
+        self.query_time = defaultdict(float)        # (method, endpoint) -> seconds
+
+    def observe(self, method, endpoint, status, duration, queries):
+        key = (method, endpoint)
+        bucket = next((i for i, bound in enumerate(DURATION_BUCKETS) if duration <= bound), len(DURATION_BUCKETS))
+        with self.lock:
+            self.requests[(method, endpoint, status)] += 1
+            self.duration_sum[key] += duration
+            self.duration_buckets[key][bucket] += 1
+            self.queries[key] += queries.count
+            self.query_time[key] += queries.total
+
+    def render(self, cache_stats=None):
+        lines = []
+        with self.lock:
+            lines += ['# HELP http_requests_total Requests served by this process',
+                      '# TYPE http_requests_total counter']
+            for (method, endpoint, status), count in sorted(self.requests.items()):
+                lines.append(f'http_requests_total{{method="{method}",endpoint="{endpoint}",status="{status}"}} {count}')
+
+            lines += ['# HELP http_request_duration_seconds Request latency',
+                      '# TYPE http_request_duration_seconds histogram']
+            for (method, endpoint), buckets in sorted(self.duration_buckets.items()):
+                labels = f'method="{method}",endpoint="{endpoint}"'
+                cumulative = 0
+                for bound, count in zip(DURATION_BUCKETS + ('+Inf',), buckets):
+                    cumulative += count
+                    lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'http_request_duration_seconds_sum{{{labels}}} {self.duration_sum[(method, endpoint)]:.6f}')
+                lines.append(f'http_request_duration_seconds_count{{{labels}}} {cumulative}')
+
+            lines += ['# HELP db_queries_total SQL statements executed while serving requests',
+                      '# TYPE db_queries_total counter']
+            for (method, endpoint), count in sorted(self.queries.items()):
+                lines.append(f'db_queries_total{{method="{method}",endpoint="{endpoint}"}} {count}')
+
+            lines += ['# HELP db_query_duration_seconds_total Time spent in SQL statements while serving requests',
+                      '# TYPE db_query_duration_seconds_total counter']
+            for (method, endpoint), seconds in sorted(self.query_time.items()):
+                lines.append(f'db_query_duration_seconds_total{{method="{method}",endpoint="{endpoint}"}} {seconds:.6f}')
+
+        if cache_stats:
+            lines += ['# HELP cache_lookups_total Cache lookups by outcome',
+                      '# TYPE cache_lookups_total counter']
+            for outcome in ('local_hits', 'redis_hits', 'misses', 'stale_hits', 'coalesced_waits', 'early_refreshes'):
+                if outcome in cache_stats:
+                    lines.append(f'cache_lookups_total{{outcome="{outcome}"}} {cache_stats[outcome]}')
+            lines += ['# HELP cache_local_entries Entries in the in-process cache tier',
+                      '# TYPE cache_local_entries gauge',
+                      f"cache_local_entries {cache_stats.get('local_entries', 0)}"]
+        return '\n'.join(lines) + '\n'
+
+metrics = Metrics()
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info['query_start'] = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info.pop('query_start', time.perf_counter())
+    queries = request.environ.get(ENVIRON_KEY) if has_request_context() else None
+    if queries is not None:
+        queries.record(statement, duration)
+
+def _endpoint_label():
+    # Route template, not the raw path, so /reservations/1 and /reservations/2 share a series
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+def init_app(app, engine):
+    """Count and time SQL per request; add a Server-Timing header and serve /metrics"""
+    event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+    event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_request_metrics():
+        request.environ[ENVIRON_KEY] = RequestQueries()
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def finish_request_metrics(response):
+        queries = request.environ.get(ENVIRON_KEY)
+        if queries is None:
+            return response
+        started = g.request_started
+        method, endpoint = request.method, _endpoint_label()
+        logger = current_app.logger
+        threshold = current_app.config.get('SQL_QUERY_LOG_THRESHOLD')
+
+        if current_app.config.get('SERVER_TIMING_HEADER'):
+            # Headers are sent before a streamed body runs, so these cover the view only
+            duration = time.perf_counter() - started
+            response.headers.add('Server-Timing', f'db;dur={queries.total * 1000:.1f};desc="{queries.count} queries"')
+            response.headers.add('Server-Timing', f'app;dur={duration * 1000:.1f}')
+
+        @response.call_on_close
+        def record_request_metrics():
+            # Once the body has been sent, so SQL run by streamed responses (CSV export, SSE) counts
+            duration = time.perf_counter() - started
+            if threshold and queries.count > threshold:
+                logger.warning(
+                    f"{method} {endpoint} ran {queries.count} queries ({queries.total * 1000:.1f}ms in DB); "
+                    f"slowest {queries.slowest * 1000:.1f}ms: {' '.join((queries.slowest_statement or '').split())[:300]}")
+            if endpoint != '/metrics':
+                metrics.observe(method, endpoint, response.status_code, duration, queries)
+
+        return response
+
+    if app.config.get('METRICS_ENABLED'):
+        @app.route('/metrics')
+        def prometheus_metrics():
+            """Prometheus text format; counters are per worker process"""
+            from redis_cache import redis_cache
+            return Response(metrics.render(redis_cache.get_stats()),
+                            mimetype='text/plain; version=0.0.4',
+                            headers={'X-Worker-Pid': str(os.getpid())})
@@ -1,17 +1,101 @@
 import redis
 import json
 import logging
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
 from datetime import datetime, timedelta
 from functools import wraps
-from flask import current_app, request
+from flask import current_app, request, Response
 import hashlib
+import cache_codecs
 
 # Setup logging
 logger = logging.getLogger(__name__)
 
+_MISSING = object()
+
+class LocalCache:
+    """
+    Bounded in-process LRU with per-entry TTL, used as the first tier in front of Redis.
+    Values are shared between callers and must not be mutated.
+    """
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # key -> (expires_at, value, tags)
+        self._tags = {}                 # tag -> set of keys
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISSING
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                return _MISSING
+            self._entries.move_to_end(key)
+            return entry[1]
+    
+    def set(self, key, value, timeout, tags=()):
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + timeout, value, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+    
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+    
+    def invalidate_tags(self, tags):
+        with self._lock:
+            for tag in tags:
+                for key in self._tags.pop(tag, ()):
+                    self._remove(key)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry:
+            for tag in entry[2]:
+                keys = self._tags.get(tag)
+                if keys:
+                    keys.discard(key)
+                    if not keys:
+                        del self._tags[tag]
+
 class RedisCache:
     def __init__(self, app=None):
         self.redis_client = None
+        self.binary_client = None
+        self.key_prefix = 'vehicle_parking:'
+        self.codecs = {}
+        self.local = LocalCache()
+        self.stats = {'local_hits': 0, 'redis_hits': 0, 'misses': 0,
+                      'coalesced_waits': 0, 'stale_hits': 0, 'early_refreshes': 0}
+        self._listener = None
+        self._listener_pid = None
+        # Circuit breaker: closed (healthy) until a connection error, then probed in the background
+        self._healthy = False
+        self._health_lock = threading.Lock()
+        self._probe_thread = None
+        self._probe_pid = None
+        self.backoff_min = 0.5
+        self.backoff_max = 30
         if app:
             self.init_app(app)
     
@@ -19,90 +103,329 @@ class RedisCache:
         """Initialize Redis cache with Flask app"""
         try:
             redis_url = app.config.get('REDIS_URL', 'redis://localhost:6379/0')
-            self.redis_client = redis.from_url(redis_url, decode_responses=True)
+            pool_options = dict(
+                max_connections=app.config.get('REDIS_MAX_CONNECTIONS', 50),
+                timeout=app.config.get('REDIS_POOL_TIMEOUT', 2),
+                socket_timeout=app.config.get('REDIS_SOCKET_TIMEOUT', 1.0),
+                socket_connect_timeout=app.config.get('REDIS_SOCKET_CONNECT_TIMEOUT', 1.0)
+            )
+            self.redis_client = redis.Redis(connection_pool=redis.BlockingConnectionPool.from_url(
+                redis_url, decode_responses=True, **pool_options))
+            # Cached entries are read as bytes, since binary codecs are not valid UTF-8
+            self.binary_client = redis.Redis(connection_pool=redis.BlockingConnectionPool.from_url(
+                redis_url, decode_responses=False, **pool_options))
+            compress_min_bytes = app.config.get('CACHE_COMPRESS_MIN_BYTES', 1024)
+            self.codecs = {namespace: cache_codecs.parse_codec(spec, compress_min_bytes)
+                           for namespace, spec in app.config.get('CACHE_CODECS', {}).items()}
             self.key_prefix = app.config.get('CACHE_KEY_PREFIX', 'vehicle_parking:')
-            
-            # Test connection
-            self.redis_client.ping()
+            self.local = LocalCache(app.config.get('CACHE_LOCAL_MAX_ENTRIES', 256))
+            self.backoff_min = app.config.get('REDIS_RETRY_BACKOFF_MIN', 0.5)
+            self.backoff_max = app.config.get('REDIS_RETRY_BACKOFF_MAX', 30)
             
             # Register with Flask extensions
             if not hasattr(app, 'extensions'):
                 app.extensions = {}
             app.extensions['redis_cache'] = self
-            
-            app.logger.info("Redis cache initialized successfully")
-            
         except Exception as e:
             app.logger.error(f"Failed to initialize Redis cache: {e}")
             # Set to None so we can fall back gracefully
             self.redis_client = None
+            return
+        
+        # Test connection; if Redis is down, keep the client and let the probe reconnect
+        try:
+            self.redis_client.ping()
+            self._healthy = True
+            app.logger.info("Redis cache initialized successfully")
+        except Exception as e:
+            app.logger.error(f"Redis unavailable at startup, retrying in background: {e}")
+            self.record_failure(e)
     
     def is_available(self):
-        """Check if Redis is available"""
+        """
+        Check if Redis is available without a round trip.
+        Returns False immediately while the breaker is open.
+        """
         if not self.redis_client:
             return False
-        try:
-            self.redis_client.ping()
+        if self._healthy:
             return True
-        except:
-            return False
+        self._ensure_probe()
+        return False
     
-    def get(self, key):
-        """Get value from cache"""
+    def record_failure(self, error):
+        """
+        Open the breaker after a connection-level error.
+        Command errors (wrong type, WATCH conflicts, ...) leave it closed.
+        """
+        if not isinstance(error, (redis.ConnectionError, redis.TimeoutError)):
+            return
+        if self._healthy:
+            logger.error(f"Redis marked unhealthy: {error}")
+        self._healthy = False
+        self.local.clear()
+        self._ensure_probe()
+    
+    def _ensure_probe(self):
+        # Started lazily and per process, since threads do not survive forking worker servers
+        with self._health_lock:
+            if self._probe_thread and self._probe_thread.is_alive() and self._probe_pid == os.getpid():
+                return
+            self._probe_thread = threading.Thread(target=self._probe, name='redis-health-probe', daemon=True)
+            self._probe_pid = os.getpid()
+            self._probe_thread.start()
+    
+    def _probe(self):
+        """PING with exponential backoff until Redis answers, then close the breaker"""
+        delay = self.backoff_min
+        while not self._healthy:
+            time.sleep(delay)
+            try:
+                self.redis_client.ping()
+                self._healthy = True
+                logger.info("Redis connection restored")
+            except Exception:
+                delay = min(delay * 2, self.backoff_max)
+    
+    def get(self, key, local_timeout=None):
+        """
+        Get value from cache.
+        With local_timeout, the in-process tier is checked first and filled on a Redis hit.
+        """
+        full_key = self._get_cache_key(key)
+        if local_timeout and self._local_tier_ready():
+            value = self.local.get(full_key)
+            if value is not _MISSING:
+                self.stats['local_hits'] += 1
+                return value
+        
         if not self.is_available():
             return None
         
         try:
-            value = self.redis_client.get(key)
+            value = self.binary_client.get(full_key)
             if value:
-                return json.loads(value)
+                self.stats['redis_hits'] += 1
+                value = self._decode(key, value)
+                if local_timeout and self._local_tier_ready():
+                    self.local.set(full_key, value, local_timeout)
+                return value
+            self.stats['misses'] += 1
             return None
         except Exception as e:
+            self.record_failure(e)
             logger.error(f"Error getting from cache: {str(e)}")
             return None
     
-    def set(self, key, value, timeout=300):
-        """Set value in cache with timeout (default 5 minutes)"""
+    def set(self, key, value, timeout=300, tags=None, local_timeout=None, stale_timeout=None):
+        """
+        Set value in cache with timeout (default 5 minutes).
+        The key is registered in each tag's set so invalidate_tags() can find it without scanning.
+        With local_timeout, the value is also kept in the in-process tier for that long.
+        With stale_timeout, an untagged copy is kept for get_stale() after the entry expires or is invalidated.
+        """
         if not self.is_available():
             return False
         
+        full_key = self._get_cache_key(key)
+        if local_timeout and self._local_tier_ready():
+            self.local.set(full_key, value, min(timeout, local_timeout), tags or ())
+        
         try:
-            serialized_value = json.dumps(value, default=str)
-            return self.redis_client.setex(key, timeout, serialized_value)
+            serialized_value = self._encode(key, value)
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.setex(full_key, timeout, serialized_value)
+            if stale_timeout:
+                pipe.setex(f"{full_key}:stale", stale_timeout, serialized_value)
+            for tag in tags or ():
+                tag_key = self._tag_key(tag)
+                pipe.sadd(tag_key, full_key)
+                pipe.expire(tag_key, max(timeout, CacheConfig.TAG_TIMEOUT))
+            return pipe.execute()[0]
         except Exception as e:
+            self.record_failure(e)
             logger.error(f"Error setting cache: {str(e)}")
             return False
     
+    def _encode(self, key, value):
+        """Serialize with the codec configured for the key's namespace (the part before the first ':'), else JSON"""
+        codec = self.codecs.get(key.split(':', 1)[0])
+        if codec:
+            return codec.dumps(value)
+        return json.dumps(value, default=str)
+    
+    def _decode(self, key, data):
+        """Inverse of _encode; binary entries are only unpickled in namespaces configured for pickle"""
+        if cache_codecs.is_binary(data):
+            codec = self.codecs.get(key.split(':', 1)[0])
+            return cache_codecs.loads(data, allow_pickle=codec is not None and codec.serializer == 'pickle')
+        return json.loads(data)
+    
+    def get_stale(self, key):
+        """Last value written with stale_timeout, even if the entry itself is gone"""
+        if not self.is_available():
+            return None
+        try:
+            value = self.binary_client.get(f"{self._get_cache_key(key)}:stale")
+            return self._decode(key, value) if value else None
+        except Exception as e:
+            self.record_failure(e)
+            logger.error(f"Error getting stale value from cache: {str(e)}")
+            return None
+    
+    def _tag_key(self, tag):
+        return self._get_cache_key(f"tag:{tag}")
+    
+    def invalidate_tags(self, *tags):
+        """
+        Delete every entry registered under the given tags.
+        Cost grows with the number of tagged keys, not with the size of the keyspace.
+        """
+        if not tags:
+            return 0
+        self.local.invalidate_tags(tags)
+        if not self.is_available():
+            return 0
+        
+        try:
+            tag_keys = [self._tag_key(tag) for tag in tags]
+            pipe = self.redis_client.pipeline(transaction=False)
+            for tag_key in tag_keys:
+                pipe.smembers(tag_key)
+            members_per_tag = pipe.execute()
+            
+            pipe = self.redis_client.pipeline(transaction=False)
+            keys = set()
+            for tag_key, members in zip(tag_keys, members_per_tag):
+                if members:
+                    keys.update(members)
+                    # SREM only what we read: entries tagged meanwhile stay registered
+                    pipe.srem(tag_key, *members)
+            if keys:
+                pipe.unlink(*keys)
+            pipe.execute()
+            # Entries filled from a Redis hit carry no tags locally, so send the keys as well
+            self._publish_invalidation({'tags': list(tags), 'keys': list(keys)})
+            return len(keys)
+        except Exception as e:
+            self.record_failure(e)
+            logger.error(f"Error invalidating cache tags {tags}: {str(e)}")
+            return 0
+    
+    def _invalidation_channel(self):
+        return self._get_cache_key("invalidations")
+    
+    def _publish_invalidation(self, message):
+        """Tell every process to drop matching entries from its in-process tier"""
+        self.redis_client.publish(self._invalidation_channel(), json.dumps(message))
+    
+    def _on_invalidation(self, message):
+        try:
+            data = json.loads(message['data'])
+            if data.get('clear'):
+                self.local.clear()
+            for key in data.get('keys', ()):
+                self.local.delete(key)
+            if data.get('tags'):
+                self.local.invalidate_tags(data['tags'])
+        except Exception as e:
+            logger.error(f"Bad cache invalidation message: {e}")
+    
+    def _on_listener_error(self, error, pubsub, thread):
+        # Invalidations may have been missed: drop everything and let the next call restart the listener
+        logger.error(f"Cache invalidation listener stopped: {error}")
+        self.local.clear()
+        self.record_failure(error)
+        thread.stop()
+    
+    def _local_tier_ready(self):
+        """
+        The in-process tier is only used while this process is subscribed to invalidations.
+        The listener is (re)started lazily so it survives forking worker servers.
+        """
+        if self._listener and self._listener.is_alive() and self._listener_pid == os.getpid():
+            return True
+        if not self.is_available():
+            return False
+        try:
+            self.local.clear()
+            pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(**{self._invalidation_channel(): self._on_invalidation})
+            self._listener = pubsub.run_in_thread(sleep_time=1.0, daemon=True, exception_handler=self._on_listener_error)
+            self._listener_pid = os.getpid()
+            return True
+        except Exception as e:
+            self.record_failure(e)
+            logger.error(f"Could not start cache invalidation listener: {e}")
+            self._listener = None
+            return False
+    
+    def get_stats(self):
+        """Hit counts and rates per tier for this process"""
+        lookups = self.stats['local_hits'] + self.stats['redis_hits'] + self.stats['misses']
+        return dict(
+            self.stats,
+            local_entries=len(self.local),
+            local_hit_rate=round(self.stats['local_hits'] / lookups, 4) if lookups else 0,
+            redis_hit_rate=round(self.stats['redis_hits'] / lookups, 4) if lookups else 0
+        )
+    
+    def _scan_unlink(self, match, batch_size=500):
+        """Non-blocking pattern delete: incremental SCAN plus UNLINK in batches"""
+        deleted = 0
+        batch = []
+        for key in self.redis_client.scan_iter(match=match, count=batch_size):
+            batch.append(key)
+            if len(batch) >= batch_size:
+                deleted += self.redis_client.unlink(*batch)
+                batch = []
+        if batch:
+            deleted += self.redis_client.unlink(*batch)
+        return deleted
+    
     def _get_cache_key(self, key):
         """Generate cache key with prefix"""
         return f"{self.key_prefix}{key}"
     
     def exists(self, key):
         """Check if a key exists in cache"""
+        if not self.is_available():
+            return False
         try:
             cache_key = self._get_cache_key(key)
             return self.redis_client.exists(cache_key) > 0
         except Exception as e:
+            self.record_failure(e)
             current_app.logger.error(f"Cache exists error: {e}")
             return False
     
     def invalidate_pattern(self, pattern):
         """Delete all keys matching a pattern"""
+        if not self.is_available():
+            return
         try:
             pattern_key = self._get_cache_key(pattern)
-            keys = self.redis_client.keys(pattern_key)
-            if keys:
-                self.redis_client.delete(*keys)
-                current_app.logger.info(f"Invalidated {len(keys)} keys matching pattern: {pattern}")
+            self.local.clear()
+            self._publish_invalidation({'clear': True})
+            deleted = self._scan_unlink(pattern_key)
+            if deleted:
+                current_app.logger.info(f"Invalidated {deleted} keys matching pattern: {pattern}")
         except Exception as e:
+            self.record_failure(e)
             current_app.logger.error(f"Pattern invalidation error: {e}")
     
     def delete(self, key):
         """Delete a key from cache"""
+        self.local.delete(self._get_cache_key(key))
+        if not self.is_available():
+            return False
         try:
             full_key = self._get_cache_key(key)
+            self.local.delete(full_key)
+            self._publish_invalidation({'keys': [full_key]})
             return self.redis_client.delete(full_key)
         except Exception as e:
+            self.record_failure(e)
             print(f"Cache delete error: {e}")
             return False
     
@@ -112,11 +435,11 @@ class RedisCache:
             return False
         
         try:
-            keys = self.redis_client.keys(pattern)
-            if keys:
-                return self.redis_client.delete(*keys)
-            return 0
+            self.local.clear()
+            self._publish_invalidation({'clear': True})
+            return self._scan_unlink(self._get_cache_key(pattern))
         except Exception as e:
+            self.record_failure(e)
             logger.error(f"Error deleting pattern from cache: {str(e)}")
             return False
     
@@ -126,8 +449,11 @@ class RedisCache:
             return False
         
         try:
+            self.local.clear()
+            self._publish_invalidation({'clear': True})
             return self.redis_client.flushdb()
         except Exception as e:
+            self.record_failure(e)
             logger.error(f"Error flushing cache: {str(e)}")
             return False
 
@@ -148,20 +474,36 @@ class RedisCache:
         lock_key = f"lock:{lock_name}"
         end_time = datetime.now() + timedelta(seconds=acquire_timeout)
         
-        while datetime.now() < end_time:
-            if self.redis_client.setnx(lock_key, identifier):
-                self.redis_client.expire(lock_key, lock_timeout)
-                return identifier
-            
-            # Check if lock is expired but not deleted (deadlock prevention)
-            if self.redis_client.ttl(lock_key) == -1:
-                self.redis_client.expire(lock_key, lock_timeout)
+        try:
+            while datetime.now() < end_time:
+                if self.redis_client.setnx(lock_key, identifier):
+                    self.redis_client.expire(lock_key, lock_timeout)
+                    return identifier
                 
-            import time
-            time.sleep(0.1)
+                # Check if lock is expired but not deleted (deadlock prevention)
+                if self.redis_client.ttl(lock_key) == -1:
+                    self.redis_client.expire(lock_key, lock_timeout)
+                    
+                time.sleep(0.1)
+        except Exception as e:
+            self.record_failure(e)
+            logger.error(f"Error acquiring lock: {e}")
             
         return False
 
+    def try_lock(self, lock_name, lock_timeout=10):
+        """Take a lock without waiting. Returns an identifier, or False if it is held elsewhere."""
+        if not self.is_available():
+            return False
+        identifier = uuid.uuid4().hex
+        try:
+            if self.redis_client.set(f"lock:{lock_name}", identifier, nx=True, ex=lock_timeout):
+                return identifier
+        except Exception as e:
+            self.record_failure(e)
+            logger.error(f"Error acquiring lock: {e}")
+        return False
+
     def release_lock(self, lock_name, identifier):
         """Release a distributed lock"""
         if not self.is_available():
@@ -189,6 +531,7 @@ class RedisCache:
                     continue
                     
         except Exception as e:
+            self.record_failure(e)
             logger.error(f"Error releasing lock: {e}")
             
         return False
@@ -196,31 +539,126 @@ class RedisCache:
 # Global cache instance
 cache = RedisCache()
 
-def generate_cache_key(prefix, *args, **kwargs):
-    """Generate a unique cache key"""
-    # Include user context for user-specific caching
-    user_id = getattr(request, 'user_id', 'anonymous') if request else 'anonymous'
-    
-    # Create a hash of arguments for consistent key generation
-    key_data = f"{prefix}:{user_id}:{':'.join(map(str, args))}"
-    if kwargs:
-        sorted_kwargs = sorted(kwargs.items())
-        key_data += f":{':'.join(f'{k}={v}' for k, v in sorted_kwargs)}"
-    
-    # Hash the key if it's too long
-    if len(key_data) > 200:
-        key_hash = hashlib.md5(key_data.encode()).hexdigest()
-        return f"{prefix}:{key_hash}"
-    
-    return key_data
+def user_scope(user_id):
+    return f"user:{user_id}"
+
+def generate_cache_key(prefix, *args, scope=None, query=None, **kwargs):
+    """
+    Deterministic cache key, identical in every worker process.
+    
+    Layout: "<prefix>:<scope>:<digest>", where scope is "global" or "user:<id>"
+    and digest is a SHA-1 over the arguments and the normalized query string.
+    (Python's hash() is salted per process, so it must not be used for keys.)
+    """
+    payload = json.dumps({
+        'args': [str(arg) for arg in args],
+        'kwargs': {k: str(v) for k, v in sorted(kwargs.items())},
+        'query': sorted([k, str(v)] for k, v in (query or []))
+    }, sort_keys=True, separators=(',', ':'))
+    digest = hashlib.sha1(payload.encode()).hexdigest()
+    return f"{prefix}:{scope or 'global'}:{digest}"
+
+def _request_cache_context(per_user):
+    """Scope and normalized query args of the current request"""
+    from flask import has_request_context
+    if not has_request_context():
+        return 'global', None
+    
+    scope = 'global'
+    if per_user:
+        from flask_security import current_user
+        scope = user_scope(current_user.id) if current_user.is_authenticated else 'anonymous'
+    return scope, list(request.args.items(multi=True))
+
+def _cacheable(result):
+    # Error responses such as (jsonify(...), 500) are returned as-is, never cached
+    return not isinstance(result, (tuple, Response))
+
+def _refresh_early(entry, beta):
+    """
+    Probabilistic early expiration: the closer the entry is to expiry and the
+    slower it is to compute, the likelier one caller is to refresh it ahead of time.
+    """
+    remaining = entry['expires'] - time.time()
+    return entry['delta'] * beta * -math.log(1.0 - random.random()) >= remaining
+
+def _single_flight(cache_instance, cache_key, compute, timeout, entry_tags, local_timeout, early_refresh):
+    """
+    Serve cache_key so that only one caller at a time recomputes it.
+    Entries are stored as {'value', 'delta', 'expires'}; delta is how long the last computation took.
+    """
+    def fill():
+        started = time.time()
+        value = compute()
+        if not _cacheable(value):
+            return value
+        delta = time.time() - started
+        entry = {'value': value, 'delta': delta, 'expires': time.time() + timeout}
+        cache_instance.set(cache_key, entry, timeout, tags=entry_tags, local_timeout=local_timeout,
+                           stale_timeout=timeout + CacheConfig.STALE_TIMEOUT)
+        return value
+
+    def fill_under_lock():
+        lock_id = cache_instance.try_lock(lock_name, CacheConfig.SINGLE_FLIGHT_LOCK_TIMEOUT)
+        if not lock_id:
+            return _MISSING
+        try:
+            return fill()
+        finally:
+            cache_instance.release_lock(lock_name, lock_id)
+
+    lock_name = f"fill:{cache_key}"
+    entry = cache_instance.get(cache_key, local_timeout=local_timeout)
+    if entry is not None:
+        if early_refresh and _refresh_early(entry, early_refresh):
+            value = fill_under_lock()
+            if value is not _MISSING:
+                cache_instance.stats['early_refreshes'] += 1
+                return value
+        return entry['value']
+
+    if not cache_instance.is_available():
+        return compute()
+
+    value = fill_under_lock()
+    if value is not _MISSING:
+        return value
 
-def cached(timeout=300, key_prefix=None):
+    # Someone else is recomputing: serve the previous value if there is one, else wait for theirs
+    stale = cache_instance.get_stale(cache_key)
+    if stale is not None:
+        cache_instance.stats['stale_hits'] += 1
+        return stale['value']
+
+    cache_instance.stats['coalesced_waits'] += 1
+    deadline = time.monotonic() + CacheConfig.SINGLE_FLIGHT_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        if cache_instance.exists(cache_key):
+            entry = cache_instance.get(cache_key)
+            if entry is not None:
+                return entry['value']
+    return fill()
+
+def cached(timeout=300, key_prefix=None, tags=None, per_user=False, local_timeout=None,
+           single_flight=False, early_refresh=None):
     """
     Decorator for caching function results
     
     Args:
         timeout: Cache timeout in seconds (default: 5 minutes)
         key_prefix: Custom key prefix (default: function name)
+        tags: Invalidation tags for the entry, or a callable returning them
+              (evaluated per call, e.g. to tag by current user)
+        per_user: Keep a separate entry per authenticated user
+        local_timeout: Also keep the entry in the in-process tier for this many
+                       seconds (for small, hot entries)
+        single_flight: On a miss, let one caller recompute under a short Redis lock
+                       while the others serve the previous value or wait for the new one
+        early_refresh: With single_flight, refresh entries probabilistically before
+                       they expire; the value is the aggressiveness (1.0 is typical)
+    
+    Keys come from generate_cache_key and include the request's query string.
     """
     def decorator(func):
         @wraps(func)
@@ -239,17 +677,24 @@ def cached(timeout=300, key_prefix=None):
                 
                 # Generate cache key
                 func_name = key_prefix or func.__name__
-                args_str = str(args) + str(sorted(kwargs.items()))
-                cache_key = f"{func_name}:{hash(args_str)}"
+                scope, query = _request_cache_context(per_user)
+                cache_key = generate_cache_key(func_name, *args, scope=scope, query=query, **kwargs)
+                
+                entry_tags = tags() if callable(tags) else tags
+                if single_flight:
+                    return _single_flight(cache_instance, cache_key, lambda: func(*args, **kwargs),
+                                          timeout, entry_tags, local_timeout, early_refresh)
                 
                 # Try to get from cache
-                cached_result = cache_instance.get(cache_key)
+                cached_result = cache_instance.get(cache_key, local_timeout=local_timeout)
                 if cached_result is not None:
                     return cached_result
                 
                 # Execute function and cache result
                 result = func(*args, **kwargs)
-                cache_instance.set(cache_key, result, timeout)
+                if not _cacheable(result):
+                    return result
+                cache_instance.set(cache_key, result, timeout, tags=entry_tags, local_timeout=local_timeout)
                 return result
                 
             except Exception as e:
@@ -267,40 +712,32 @@ def invalidate_cache_pattern(pattern):
 
 def invalidate_parking_cache():
     """Invalidate all parking-related cache"""
-    patterns = [
-        "parking_lots:*",
-        "available_spots:*",
-        "parking_analytics:*",
-        "lot_details:*"
-    ]
-    
-    for pattern in patterns:
-        cache.delete_pattern(pattern)
-    
+    cache.invalidate_tags(CacheConfig.LOTS_TAG, CacheConfig.ANALYTICS_TAG)
     logger.info("Invalidated parking-related cache")
 
 def invalidate_user_cache(user_id):
     """Invalidate user-specific cache"""
-    patterns = [
-        f"user_data:{user_id}:*",
-        f"user_reservations:{user_id}:*",
-        f"user_analytics:{user_id}:*"
-    ]
-    
-    for pattern in patterns:
-        cache.delete_pattern(pattern)
-    
+    cache.invalidate_tags(user_tag(user_id))
     logger.info(f"Invalidated cache for user: {user_id}")
 
+def lot_tag(lot_id):
+    return f"lot:{lot_id}"
+
+def user_tag(user_id):
+    # Same string as the key scope, so a user's tag covers exactly their per-user entries
+    return user_scope(user_id)
+
 # Cache configuration constants
 class CacheConfig:
     # Cache timeouts (in seconds)
     PARKING_LOTS_TIMEOUT = 300        # 5 minutes
+    LOCAL_TIMEOUT = 30                # In-process tier; bounds staleness if an invalidation is missed
     AVAILABLE_SPOTS_TIMEOUT = 60      # 1 minute (frequent updates)
     USER_DATA_TIMEOUT = 600           # 10 minutes
     ANALYTICS_TIMEOUT = 1800          # 30 minutes
     RESERVATIONS_TIMEOUT = 120        # 2 minutes
     ADMIN_ANALYTICS_TIMEOUT = 900     # 15 minutes
+    ADMIN_DASHBOARD_TIMEOUT = 60      # 1 minute (user counts are not tag-invalidated)
     
     # Cache key prefixes
     PARKING_LOTS_KEY = "parking_lots"
@@ -309,7 +746,18 @@ class CacheConfig:
     USER_RESERVATIONS_KEY = "user_reservations"
     USER_ANALYTICS_KEY = "user_analytics"
     ADMIN_ANALYTICS_KEY = "admin_analytics"
+    ADMIN_DASHBOARD_KEY = "admin_dashboard"
     LOT_DETAILS_KEY = "lot_details"
+    
+    # Invalidation tags (see RedisCache.invalidate_tags, lot_tag, user_tag)
+    LOTS_TAG = "lots"                 # Anything derived from lot availability
+    ANALYTICS_TAG = "analytics"
+    TAG_TIMEOUT = 86400               # Tag sets outlive their longest-lived member
+    
+    # Single-flight recomputation (see cached(single_flight=True))
+    SINGLE_FLIGHT_LOCK_TIMEOUT = 10   # Upper bound on one recomputation
+    SINGLE_FLIGHT_WAIT = 2            # How long callers wait for another worker's result
+    STALE_TIMEOUT = 300               # How long a previous value may be served while recomputing
 
 # Global cache instances
 redis_cache = RedisCache()
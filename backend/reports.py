@@ -0,0 +1,138 @@
+import csv
+import gzip
+import os
+from io import StringIO
+from datetime import timedelta
+from sqlalchemy import func
+from models import db, Reservation, ParkingSpot, Parking_lot, User
+from rollups import daily_stats, revenue_expr, duration_hours_expr, COUNTED_STATUSES
+from utils import get_ist_now
+
+# Rows fetched per round trip while streaming a report
+REPORT_BATCH_SIZE = 1000
+# Flush CSV text to the client once this many characters are buffered
+CSV_FLUSH_CHARS = 64 * 1024
+
+def iter_csv(header, rows):
+    """Serialize rows to CSV text chunks without building the whole file in memory"""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CSV_FLUSH_CHARS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    yield buffer.getvalue()
+
+def revenue_report(days):
+    """Every booking in the window, one joined query read in batches"""
+    start_date = get_ist_now() - timedelta(days=days)
+    query = db.session.query(
+        Reservation.created_at, User.name, Parking_lot.name, ParkingSpot.spot_number,
+        duration_hours_expr, revenue_expr, Reservation.status
+    ).join(User, Reservation.user_id == User.id)\
+     .join(ParkingSpot, Reservation.spot_id == ParkingSpot.id)\
+     .join(Parking_lot, ParkingSpot.lot_id == Parking_lot.id)\
+     .filter(Reservation.created_at >= start_date, Reservation.status.in_(COUNTED_STATUSES))\
+     .yield_per(REPORT_BATCH_SIZE)
+
+    rows = ([created_at.strftime('%Y-%m-%d %H:%M'), user_name, lot_name, spot_number, duration, amount, status]
+            for created_at, user_name, lot_name, spot_number, duration, amount, status in query)
+    return (f'revenue-report-{days}days.csv',
+            ['Date', 'User', 'Parking Lot', 'Spot', 'Duration Hours', 'Amount', 'Status'],
+            rows)
+
+def occupancy_report(days):
+    """Per-lot active reservations and revenue over the window"""
+    end_date = get_ist_now()
+    lot_revenue = {}
+    for row in daily_stats(end_date - timedelta(days=days), end_date):
+        lot_revenue[row['lot_id']] = lot_revenue.get(row['lot_id'], 0) + row['revenue']
+
+    active_by_lot = dict(db.session.query(ParkingSpot.lot_id, func.count(Reservation.id))
+                         .join(ParkingSpot, Reservation.spot_id == ParkingSpot.id)
+                         .filter(Reservation.status == 'active')
+                         .group_by(ParkingSpot.lot_id).all())
+
+    lots = db.session.query(Parking_lot.id, Parking_lot.name, Parking_lot.capacity).all()
+    rows = ([lot.name, lot.capacity, active_by_lot.get(lot.id, 0),
+             f"{(active_by_lot.get(lot.id, 0)/lot.capacity*100) if lot.capacity else 0:.1f}",
+             round(lot_revenue.get(lot.id, 0), 2)]
+            for lot in lots)
+    return (f'occupancy-report-{days}days.csv',
+            ['Parking Lot', 'Total Capacity', 'Active Reservations', 'Occupancy %', 'Total Revenue'],
+            rows)
+
+def user_report(days):
+    """Every user with reservation totals from one grouped subquery"""
+    totals = db.session.query(
+        Reservation.user_id,
+        func.count(Reservation.id).label('total_reservations'),
+        func.sum(func.coalesce(Reservation.final_cost, Reservation.estimated_cost, 0)).label('total_spent')
+    ).group_by(Reservation.user_id).subquery()
+
+    query = db.session.query(
+        User.name, User.email, User.create_datetime,
+        func.coalesce(totals.c.total_reservations, 0),
+        func.coalesce(totals.c.total_spent, 0)
+    ).outerjoin(totals, totals.c.user_id == User.id)\
+     .order_by(User.id)\
+     .yield_per(REPORT_BATCH_SIZE)
+
+    rows = ([name, email, joined, total, round(spent, 2)] for name, email, joined, total, spent in query)
+    return (f'user-report-{days}days.csv',
+            ['User Name', 'Email', 'Join Date', 'Total Reservations', 'Total Spent'],
+            rows)
+
+def personal_report(user_id, days):
+    """One user's reservations in the window"""
+    start_date = get_ist_now() - timedelta(days=days)
+    query = db.session.query(Reservation.created_at, Parking_lot.name, Reservation.final_cost)\
+        .join(ParkingSpot, Reservation.spot_id == ParkingSpot.id)\
+        .join(Parking_lot, ParkingSpot.lot_id == Parking_lot.id)\
+        .filter(Reservation.user_id == user_id, Reservation.created_at >= start_date)\
+        .yield_per(REPORT_BATCH_SIZE)
+
+    return (f'personal-parking-report-{days}days.csv',
+            ['Date', 'Parking Lot', 'Amount'],
+            (list(row) for row in query))
+
+# Reports that can be generated in the background (see tasks.generate_report)
+REPORT_BUILDERS = {
+    'revenue': revenue_report,
+    'occupancy': occupancy_report,
+    'users': user_report,
+}
+
+def write_report_artifact(report_type, days, path, compress=False, progress=None):
+    """
+    Write a report to `path` (gzipped if compress), calling progress(rows_written)
+    after each flushed chunk. Written to a temp file and renamed so readers never see partial output.
+    Returns (download filename, rows written).
+    """
+    filename, header, rows = REPORT_BUILDERS[report_type](days)
+    written = [0]
+
+    def counted(source):
+        for row in source:
+            written[0] += 1
+            yield row
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    opener = gzip.open if compress else open
+    try:
+        with opener(tmp_path, 'wt', newline='', encoding='utf-8') as f:
+            for chunk in iter_csv(header, counted(rows)):
+                f.write(chunk)
+                if progress:
+                    progress(written[0])
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return (f"{filename}.gz" if compress else filename), written[0]
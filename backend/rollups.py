@@ -0,0 +1,197 @@
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import func, case, extract, insert
+from models import db, Reservation, ParkingSpot, DailyLotStats, HourlyLotStats, RollupCheckpoint
+from utils import get_ist_now
+
+CHECKPOINT_NAME = 'daily_lot_stats'
+
+# Statuses that count as bookings in analytics
+COUNTED_STATUSES = ['completed', 'active']
+
+# Per-reservation expressions mirroring the Python `a or b or 0` fallbacks
+revenue_expr = func.coalesce(Reservation.final_cost, 0)
+duration_hours_expr = func.coalesce(
+    func.nullif(Reservation.actual_duration_hours, 0),
+    func.nullif(Reservation.reserved_duration_hours, 0),
+    0
+)
+charged_cost_expr = func.coalesce(
+    func.nullif(Reservation.final_cost, 0),
+    func.nullif(Reservation.estimated_cost, 0),
+    0
+)
+
+def reservation_totals(query):
+    """Count, spend, hours and per-status counts over a Reservation query's rows, in one aggregate query"""
+    def by_status(status):
+        return func.coalesce(func.sum(case((Reservation.status == status, 1), else_=0)), 0)
+    
+    row = query.order_by(None).with_entities(
+        func.count(Reservation.id),
+        func.coalesce(func.sum(charged_cost_expr), 0),
+        func.coalesce(func.sum(duration_hours_expr), 0),
+        by_status('completed'),
+        by_status('active'),
+        by_status('cancelled')
+    ).one()
+    return dict(zip(('count', 'spent', 'hours', 'completed', 'active', 'cancelled'), row))
+
+def _as_date(value):
+    # SQLite returns date() as a string, other backends as a date
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
+def _naive(dt):
+    # Timestamps are stored as naive IST wall-clock times
+    return dt.replace(tzinfo=None) if dt.tzinfo else dt
+
+def _day_start(day):
+    return datetime.combine(day, time.min)
+
+def _aggregate_daily(start, end):
+    """Per-(day, lot) stats straight from Reservation for created_at in [start, end)"""
+    day = func.date(Reservation.created_at)
+    counted = Reservation.status.in_(COUNTED_STATUSES)
+    rows = db.session.query(
+        day,
+        ParkingSpot.lot_id,
+        func.sum(case((counted, 1), else_=0)),
+        func.sum(case((Reservation.status == 'active', 1), else_=0)),
+        func.sum(case((Reservation.status == 'completed', 1), else_=0)),
+        func.sum(case((Reservation.status == 'cancelled', 1), else_=0)),
+        func.coalesce(func.sum(case((counted, revenue_expr), else_=0)), 0),
+        func.coalesce(func.sum(case((counted, duration_hours_expr), else_=0)), 0),
+        func.count(func.distinct(case((counted, Reservation.user_id))))
+    ).join(ParkingSpot, Reservation.spot_id == ParkingSpot.id)\
+     .filter(Reservation.created_at >= start, Reservation.created_at < end)\
+     .group_by(day, ParkingSpot.lot_id).all()
+
+    return [{
+        'day': _as_date(row[0]), 'lot_id': row[1], 'bookings': row[2] or 0,
+        'active_bookings': row[3] or 0, 'completed_bookings': row[4] or 0,
+        'cancellations': row[5] or 0, 'revenue': float(row[6] or 0),
+        'hours': float(row[7] or 0), 'distinct_users': row[8] or 0
+    } for row in rows]
+
+def _aggregate_hourly(start, end):
+    """Per-(day, lot, start hour) booking counts straight from Reservation"""
+    day = func.date(Reservation.created_at)
+    hour = extract('hour', Reservation.start_time)
+    rows = db.session.query(
+        day, ParkingSpot.lot_id, hour, func.count(Reservation.id)
+    ).join(ParkingSpot, Reservation.spot_id == ParkingSpot.id)\
+     .filter(
+        Reservation.created_at >= start,
+        Reservation.created_at < end,
+        Reservation.status.in_(COUNTED_STATUSES),
+        Reservation.start_time.isnot(None)
+    ).group_by(day, ParkingSpot.lot_id, hour).all()
+
+    return [{'day': _as_date(d), 'lot_id': lot_id, 'hour': int(h), 'bookings': n} for d, lot_id, h, n in rows]
+
+def _roll_up(first_day, last_day):
+    """Replace rollup rows for days [first_day, last_day] with fresh aggregates"""
+    start, end = _day_start(first_day), _day_start(last_day + timedelta(days=1))
+
+    DailyLotStats.query.filter(DailyLotStats.day >= first_day, DailyLotStats.day <= last_day).delete(synchronize_session=False)
+    HourlyLotStats.query.filter(HourlyLotStats.day >= first_day, HourlyLotStats.day <= last_day).delete(synchronize_session=False)
+
+    daily = _aggregate_daily(start, end)
+    hourly = _aggregate_hourly(start, end)
+    if daily:
+        db.session.execute(insert(DailyLotStats), daily)
+    if hourly:
+        db.session.execute(insert(HourlyLotStats), hourly)
+    return len(daily)
+
+def get_checkpoint():
+    checkpoint = db.session.get(RollupCheckpoint, CHECKPOINT_NAME)
+    return checkpoint.last_day if checkpoint else None
+
+def refresh_rollups():
+    """
+    Incrementally fill the rollup tables up to yesterday.
+    New days are taken from the high-water mark; days that still had active
+    reservations at their last rollup are re-rolled, since those reservations
+    may have completed or been cancelled since.
+    """
+    last_full_day = get_ist_now().date() - timedelta(days=1)
+    checkpoint = db.session.get(RollupCheckpoint, CHECKPOINT_NAME)
+
+    if checkpoint and checkpoint.last_day:
+        first_day = checkpoint.last_day + timedelta(days=1)
+    else:
+        earliest = db.session.query(func.min(Reservation.created_at)).scalar()
+        first_day = earliest.date() if earliest else last_full_day + timedelta(days=1)
+
+    dirty_days = [day for (day,) in db.session.query(DailyLotStats.day).filter(
+        DailyLotStats.day < first_day,
+        DailyLotStats.active_bookings > 0
+    ).distinct().all()]
+
+    rows = 0
+    if first_day <= last_full_day:
+        rows += _roll_up(first_day, last_full_day)
+    for day in dirty_days:
+        rows += _roll_up(day, day)
+
+    if not checkpoint:
+        checkpoint = RollupCheckpoint(name=CHECKPOINT_NAME)
+        db.session.add(checkpoint)
+    if first_day <= last_full_day or checkpoint.last_day is None:
+        checkpoint.last_day = last_full_day
+
+    db.session.commit()
+    return {'rolled_up_through': last_full_day.isoformat(), 'rerolled_days': len(dirty_days), 'rows': rows}
+
+def _split_window(start, end):
+    """
+    Split [start, end) into a span of whole days covered by rollups
+    and the remaining ranges that must be aggregated live.
+    """
+    start, end = _naive(start), _naive(end)
+    checkpoint = get_checkpoint()
+
+    first_full_day = start.date() if start == _day_start(start.date()) else start.date() + timedelta(days=1)
+    last_full_day = end.date() - timedelta(days=1)
+    if checkpoint is not None:
+        last_full_day = min(last_full_day, checkpoint)
+
+    if checkpoint is None or first_full_day > last_full_day:
+        return None, [(start, end)]
+
+    live_ranges = []
+    if start < _day_start(first_full_day):
+        live_ranges.append((start, _day_start(first_full_day)))
+    if _day_start(last_full_day + timedelta(days=1)) < end:
+        live_ranges.append((_day_start(last_full_day + timedelta(days=1)), end))
+    return (first_full_day, last_full_day), live_ranges
+
+def daily_stats(start, end):
+    """Per-(day, lot) stats for created_at in [start, end): rollups for settled days, live for the rest"""
+    rollup_span, live_ranges = _split_window(start, end)
+    rows = []
+    if rollup_span:
+        rows.extend({
+            'day': r.day, 'lot_id': r.lot_id, 'bookings': r.bookings,
+            'active_bookings': r.active_bookings, 'completed_bookings': r.completed_bookings,
+            'cancellations': r.cancellations, 'revenue': r.revenue,
+            'hours': r.hours, 'distinct_users': r.distinct_users
+        } for r in DailyLotStats.query.filter(
+            DailyLotStats.day >= rollup_span[0], DailyLotStats.day <= rollup_span[1]
+        ).all())
+    for live_start, live_end in live_ranges:
+        rows.extend(_aggregate_daily(live_start, live_end))
+    return rows
+
+def hourly_stats(start, end):
+    """Per-(day, lot, hour) booking counts for created_at in [start, end)"""
+    rollup_span, live_ranges = _split_window(start, end)
+    rows = []
+    if rollup_span:
+        rows.extend({'day': r.day, 'lot_id': r.lot_id, 'hour': r.hour, 'bookings': r.bookings}
+                    for r in HourlyLotStats.query.filter(
+                        HourlyLotStats.day >= rollup_span[0], HourlyLotStats.day <= rollup_span[1]
+                    ).all())
+    for live_start, live_end in live_ranges:
+        rows.extend(_aggregate_hourly(live_start, live_end))
+    return rows
@@ -1,28 +1,73 @@
+import os
 from flask import Blueprint, request, jsonify, current_app
 from flask_security import roles_required, current_user
-from models import db, User, Role, Parking_lot, ParkingSpot, Reservation
+from sqlalchemy import func, case, or_
+from sqlalchemy.orm import selectinload
+from models import db, User, Role, Parking_lot, ParkingSpot, Reservation, LotAvailability
 from routes.parking import calculate_available_spots
+from availability import rebuild_availability, record_counts, get_availability_map, FREE, RESERVED, OCCUPIED
+from spot_pool import rebuild_spot_pool, drop_spot_pool
+from lot_spots import add_spots, remove_free_spots, spot_states
+from redis_cache import redis_cache, cached, invalidate_parking_cache, CacheConfig
+from pagination import encode_cursor, decode_cursor, keyset_order, page_limit, reservation_page, count_rows, count_mode
+from queries import reservation_details, users_with_totals, reservation_status_counts
+from rollups import reservation_totals
 
 admin_bp = Blueprint('admin', __name__)
 
 @admin_bp.route('/dashboard', methods=['GET'])
 @roles_required('admin')
+@cached(timeout=CacheConfig.ADMIN_DASHBOARD_TIMEOUT, key_prefix=CacheConfig.ADMIN_DASHBOARD_KEY, tags=[CacheConfig.LOTS_TAG])
 def admin_dashboard():
-    """Get admin dashboard data with all parking lot statuses"""
+    """
+    Get admin dashboard data with all parking lot statuses.
+    Per-lot counts come from the availability counters; ?include_spots=true adds each lot's spot grid.
+    """
     try:
-        lots = Parking_lot.query.all()
+        lots = Parking_lot.query.order_by(Parking_lot.id).all()
+        availability = get_availability_map()
+        
         total_spots = sum(lot.capacity for lot in lots)
-        occupied_spots = sum(len([spot for spot in lot.spots if spot.is_occupied]) for lot in lots)
-        reserved_spots = sum(len([spot for spot in lot.spots for res in spot.reservations if res.status == 'active' and not spot.is_occupied]) for lot in lots)
+        occupied_spots = sum(row.occupied_spots for row in availability.values())
+        reserved_spots = sum(row.reserved_spots for row in availability.values())
         available_spots = total_spots - occupied_spots - reserved_spots
         
-        total_users = User.query.count()
-        active_users = User.query.filter_by(active=True).count()
+        total_users, active_users = db.session.query(
+            func.count(User.id), func.coalesce(func.sum(case((User.active == True, 1), else_=0)), 0)
+        ).one()
         admin_users = User.query.join(User.roles).filter(Role.name == 'admin').count()
         
-        total_reservations = Reservation.query.count()
-        active_reservations = Reservation.query.filter_by(status='active').count()
-        completed_reservations = Reservation.query.filter_by(status='completed').count()
+        reservation_counts = dict(reservation_status_counts().all())
+        
+        spots_by_lot = None
+        if request.args.get('include_spots', '').lower() in ('1', 'true', 'yes'):
+            spots_by_lot = {}
+            for spot in spot_states():
+                spots_by_lot.setdefault(spot.lot_id, []).append({
+                    'id': spot.id,
+                    'spot_number': spot.spot_number,
+                    'is_occupied': spot.is_occupied,
+                    'is_reserved': spot.is_reserved
+                })
+        
+        parking_lots = []
+        for lot in lots:
+            counts = availability.get(lot.id)
+            lot_occupied = counts.occupied_spots if counts else 0
+            lot_data = {
+                'id': lot.id,
+                'name': lot.name,
+                'location': lot.location,
+                'capacity': lot.capacity,
+                'price_per_hour': lot.price_per_hour,
+                'occupied_spots': lot_occupied,
+                'reserved_spots': counts.reserved_spots if counts else 0,
+                'available_spots': counts.free_spots if counts else 0,
+                'occupancy_rate': (lot_occupied / lot.capacity * 100) if lot.capacity > 0 else 0
+            }
+            if spots_by_lot is not None:
+                lot_data['spots'] = spots_by_lot.get(lot.id, [])
+            parking_lots.append(lot_data)
         
         dashboard_data = {
             'summary': {
@@ -34,29 +79,14 @@ def admin_dashboard():
                 'total_users': total_users,
                 'active_users': active_users,
                 'admin_users': admin_users,
-                'total_reservations': total_reservations,
-                'active_reservations': active_reservations,
-                'completed_reservations': completed_reservations
+                'total_reservations': sum(reservation_counts.values()),
+                'active_reservations': reservation_counts.get('active', 0),
+                'completed_reservations': reservation_counts.get('completed', 0)
             },
-            'parking_lots': [{
-                'id': lot.id,
-                'name': lot.name,
-                'location': lot.location,
-                'capacity': lot.capacity,
-                'price_per_hour': lot.price_per_hour,
-                'occupied_spots': len([spot for spot in lot.spots if spot.is_occupied]),
-                'available_spots': calculate_available_spots(lot),
-                'occupancy_rate': (len([spot for spot in lot.spots if spot.is_occupied]) / lot.capacity * 100) if lot.capacity > 0 else 0,
-                'spots': [{
-                    'id': spot.id,
-                    'spot_number': spot.spot_number,
-                    'is_occupied': spot.is_occupied,
-                    'is_reserved': any(res.status == 'active' for res in spot.reservations)
-                } for spot in lot.spots]
-            } for lot in lots]
+            'parking_lots': parking_lots
         }
         
-        return jsonify(dashboard_data), 200
+        return dashboard_data
         
     except Exception as e:
         current_app.logger.error(f"Admin dashboard error: {str(e)}")
@@ -68,17 +98,22 @@ def get_admin_parking_lots():
     """Get all parking lots for admin management"""
     try:
         lots = Parking_lot.query.all()
+        availability = get_availability_map()
         
-        parking_lots_data = [{
-            'id': lot.id,
-            'name': lot.name,
-            'location': lot.location,
-            'capacity': lot.capacity,
-            'price_per_hour': lot.price_per_hour,
-            'occupied_spots': len([spot for spot in lot.spots if spot.is_occupied]),
-            'available_spots': calculate_available_spots(lot),
-            'occupancy_rate': (len([spot for spot in lot.spots if spot.is_occupied]) / lot.capacity * 100) if lot.capacity > 0 else 0
-        } for lot in lots]
+        parking_lots_data = []
+        for lot in lots:
+            counts = availability.get(lot.id)
+            lot_occupied = counts.occupied_spots if counts else 0
+            parking_lots_data.append({
+                'id': lot.id,
+                'name': lot.name,
+                'location': lot.location,
+                'capacity': lot.capacity,
+                'price_per_hour': lot.price_per_hour,
+                'occupied_spots': lot_occupied,
+                'available_spots': counts.free_spots if counts else 0,
+                'occupancy_rate': (lot_occupied / lot.capacity * 100) if lot.capacity > 0 else 0
+            })
         
         return jsonify({
             'parking_lots': parking_lots_data
@@ -116,11 +151,13 @@ def create_parking_lot():
         db.session.add(parking_lot)
         db.session.flush()
         
-        for i in range(1, capacity + 1):
-            spot = ParkingSpot(lot_id=parking_lot.id, spot_number=f"A{i:03d}")
-            db.session.add(spot)
+        add_spots(parking_lot.id, (f"A{i:03d}" for i in range(1, capacity + 1)))
         
+        db.session.add(LotAvailability(lot_id=parking_lot.id, free_spots=capacity))
+        record_counts(parking_lot.id, {FREE: capacity, RESERVED: 0, OCCUPIED: 0})
         db.session.commit()
+        rebuild_spot_pool(parking_lot.id)
+        invalidate_parking_cache()
         
         return jsonify({
             'message': 'Parking lot created successfully',
@@ -169,22 +206,21 @@ def update_parking_lot(lot_id):
             current_capacity = lot.capacity
             
             if new_capacity > current_capacity:
-                for i in range(current_capacity + 1, new_capacity + 1):
-                    spot = ParkingSpot(lot_id=lot.id, spot_number=f"A{i:03d}")
-                    db.session.add(spot)
+                add_spots(lot.id, (f"A{i:03d}" for i in range(current_capacity + 1, new_capacity + 1)))
             elif new_capacity < current_capacity:
-                spots_to_remove = ParkingSpot.query.filter_by(lot_id=lot.id)\
-                    .filter_by(is_occupied=False)\
-                    .order_by(ParkingSpot.id.desc())\
-                    .limit(current_capacity - new_capacity).all()
-                if len(spots_to_remove) < (current_capacity - new_capacity):
-                    return jsonify({'error': 'Cannot reduce capacity: some spots are occupied'}), 400
-                for spot in spots_to_remove: db.session.delete(spot)
+                if remove_free_spots(lot.id, current_capacity - new_capacity) < current_capacity - new_capacity:
+                    db.session.rollback()
+                    return jsonify({'error': 'Cannot reduce capacity: some spots are occupied, reserved or have reservation history'}), 400
             
             lot.capacity = new_capacity
+            rebuild_availability(lot.id)
         
         db.session.commit()
         
+        if 'capacity' in data:
+            rebuild_spot_pool(lot.id)
+        invalidate_parking_cache()
+        
         return jsonify({
             'message': 'Parking lot updated successfully',
             'parking_lot': {
@@ -211,7 +247,10 @@ def delete_parking_lot(lot_id):
         occupied_spots = [spot for spot in lot.spots if spot.is_occupied]
         if occupied_spots: return jsonify({'error': 'Cannot delete parking lot: some spots are occupied'}), 400
         db.session.delete(lot)
+        record_counts(lot_id, None)
         db.session.commit()
+        drop_spot_pool(lot_id)
+        invalidate_parking_cache()
         return jsonify({'message': 'Parking lot deleted successfully'}), 200
     except Exception as e:
         db.session.rollback()
@@ -221,9 +260,11 @@ def delete_parking_lot(lot_id):
 @admin_bp.route('/parking-lots/<int:lot_id>/spots', methods=['GET'])
 @roles_required('admin')
 def get_parking_lot_spots(lot_id):
-    """Get all spots for a specific parking lot"""
+    """Get spots for a specific parking lot; ?limit=&offset= pages through large lots"""
     try:
         lot = Parking_lot.query.get_or_404(lot_id)
+        limit = request.args.get('limit', type=int)
+        offset = request.args.get('offset', 0, type=int)
         return jsonify({
             'parking_lot': {
                 'id': lot.id, 'name': lot.name, 'location': lot.location, 
@@ -231,8 +272,9 @@ def get_parking_lot_spots(lot_id):
             },
             'spots': [{
                 'id': spot.id, 'spot_number': spot.spot_number, 
-                'is_occupied': spot.is_occupied, 'current_reservation': None
-            } for spot in lot.spots]
+                'is_occupied': spot.is_occupied, 'is_reserved': spot.is_reserved, 'current_reservation': None
+            } for spot in spot_states(lot_id, limit=limit, offset=offset)],
+            'total_count': ParkingSpot.query.filter_by(lot_id=lot_id).count() if limit is not None else None
         }), 200
     except Exception as e:
         current_app.logger.error(f"Get parking lot spots error: {str(e)}")
@@ -241,21 +283,71 @@ def get_parking_lot_spots(lot_id):
 @admin_bp.route('/users', methods=['GET'])
 @roles_required('admin')
 def get_all_users():
-    """Get all users for admin management"""
+    """
+    Users with reservation totals, one page at a time.
+    ?sort=id|name|email|total_reservations|active_reservations&order=asc|desc, filters ?q=, ?active=, ?role=,
+    ?limit= and ?cursor= (the previous page's next_cursor). Totals are returned with the first page only.
+    """
     try:
-        users = User.query.all()
-        users_data = []
-        for user in users:
-            reservations_count = Reservation.query.filter_by(user_id=user.id).count()
-            active_reservations = Reservation.query.filter_by(user_id=user.id, status='active').count()
-            users_data.append({
-                'id': user.id, 'name': user.name, 'email': user.email, 'username': user.username,
-                'active': user.active, 'confirmed_at': user.confirmed_at.isoformat() if user.confirmed_at else None,
-                'roles': [role.name for role in user.roles],
-                'total_reservations': reservations_count, 'active_reservations': active_reservations,
-                'created_at': user.fs_uniquifier
-            })
-        return jsonify({'users': users_data, 'total_count': len(users_data)}), 200
+        sort = request.args.get('sort', 'id')
+        descending = request.args.get('order', 'asc').lower() == 'desc'
+        limit = page_limit(request.args.get('limit', type=int))
+        cursor = request.args.get('cursor')
+        
+        filters = []
+        search = request.args.get('q', '').strip()
+        if search:
+            pattern = f"%{search}%"
+            filters.append(or_(User.name.ilike(pattern), User.email.ilike(pattern), User.username.ilike(pattern)))
+        if request.args.get('active') is not None:
+            filters.append(User.active == (request.args.get('active').lower() in ('1', 'true', 'yes')))
+        if request.args.get('role'):
+            filters.append(User.roles.any(Role.name == request.args.get('role')))
+        
+        query, sort_columns = users_with_totals(*filters)
+        if sort not in sort_columns:
+            return jsonify({'error': f"sort must be one of: {', '.join(sort_columns)}"}), 400
+        keys = [User.id] if sort == 'id' else [sort_columns[sort], User.id]
+        cursor_sort = f"{sort}:{'desc' if descending else 'asc'}"
+        
+        values = None
+        if cursor:
+            parsers = [int] if sort == 'id' else [str if sort in ('name', 'email') else int, int]
+            try:
+                token_sort, *values = decode_cursor(cursor, str, *parsers)
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+            if token_sort != cursor_sort:
+                return jsonify({'error': 'Cursor does not match the requested sort'}), 400
+        
+        rows = keyset_order(query, keys, values, descending).options(
+            selectinload(User.roles)
+        ).limit(limit + 1).all()
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        users_data = [{
+            'id': user.id, 'name': user.name, 'email': user.email, 'username': user.username,
+            'active': user.active, 'confirmed_at': user.confirmed_at.isoformat() if user.confirmed_at else None,
+            'roles': [role.name for role in user.roles],
+            'total_reservations': total, 'active_reservations': active,
+            'created_at': user.fs_uniquifier
+        } for user, total, active in rows]
+        
+        next_cursor = None
+        if has_more:
+            last_user, last_total, last_active = rows[-1]
+            sort_value = {'name': last_user.name, 'email': last_user.email,
+                          'total_reservations': last_total, 'active_reservations': last_active}.get(sort)
+            next_cursor = encode_cursor(cursor_sort, *([] if sort == 'id' else [sort_value]), last_user.id)
+        
+        response = {'users': users_data, 'next_cursor': next_cursor, 'has_more': has_more}
+        if not cursor:
+            total_count, active_count = db.session.query(
+                func.count(User.id), func.coalesce(func.sum(case((User.active == True, 1), else_=0)), 0)
+            ).filter(*filters).one()
+            response.update(total_count=total_count, active_count=active_count)
+        return jsonify(response), 200
     except Exception as e:
         current_app.logger.error(f"Get all users error: {str(e)}")
         return jsonify({'error': 'Failed to fetch users'}), 500
@@ -333,22 +425,21 @@ def get_all_reservations():
     try:
         status = request.args.get('status')
         user_id = request.args.get('user_id')
-        limit = request.args.get('limit', 50, type=int)
+        limit = page_limit(request.args.get('limit', type=int))
         offset = request.args.get('offset', 0, type=int)
+        cursor = request.args.get('cursor')
         
-        query = db.session.query(Reservation, ParkingSpot, Parking_lot, User).join(
-            ParkingSpot, Reservation.spot_id == ParkingSpot.id
-        ).join(
-            Parking_lot, ParkingSpot.lot_id == Parking_lot.id
-        ).join(
-            User, Reservation.user_id == User.id
-        )
+        query = reservation_details()
         
         if status: query = query.filter(Reservation.status == status)
         if user_id: query = query.filter(Reservation.user_id == user_id)
         
-        total_count = query.count()
-        reservations = query.order_by(Reservation.created_at.desc()).offset(offset).limit(limit).all()
+        try:
+            mode = count_mode(request.args.get('count'), cursor)
+            total_count = count_rows(query, mode)
+            reservations, next_cursor = reservation_page(query, limit, cursor, offset, reservation=lambda row: row[0])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         reservations_data = []
         for res, spot, lot, user in reservations:
@@ -361,8 +452,8 @@ def get_all_reservations():
                 'parking_spot': {'id': spot.id, 'spot_number': spot.spot_number}
             })
         return jsonify({
-            'reservations': reservations_data, 'total_count': total_count,
-            'limit': limit, 'offset': offset
+            'reservations': reservations_data, 'total_count': total_count, 'count_mode': mode,
+            'limit': limit, 'offset': offset, 'next_cursor': next_cursor
         }), 200
     except Exception as e:
         current_app.logger.error(f"Get all reservations error: {str(e)}")
@@ -372,25 +463,18 @@ def get_all_reservations():
 @roles_required('admin')
 def get_admin_parking_history():
     """Get comprehensive parking history with cost analysis for admin"""
-    # ... Implementation is identical to previous monolithic file ...
-    # Simplified for brevity in this response but would be full logic
     try:
         # Get query parameters
         user_id = request.args.get('user_id')
         status = request.args.get('status')
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
-        limit = request.args.get('limit', 100, type=int)
+        limit = page_limit(request.args.get('limit', type=int), default=100)
         offset = request.args.get('offset', 0, type=int)
+        cursor = request.args.get('cursor')
         
         # Build query with joins
-        query = db.session.query(Reservation, ParkingSpot, Parking_lot, User).join(
-            ParkingSpot, Reservation.spot_id == ParkingSpot.id
-        ).join(
-            Parking_lot, ParkingSpot.lot_id == Parking_lot.id
-        ).join(
-            User, Reservation.user_id == User.id
-        )
+        query = reservation_details()
         
         # Apply filters
         if user_id:
@@ -406,19 +490,19 @@ def get_admin_parking_history():
             end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
             query = query.filter(Reservation.created_at <= end_dt)
         
-        # Get total count and summary statistics
-        total_count = query.count()
-        all_reservations = query.all()
-        
-        # Calculate system-wide statistics
-        total_revenue = sum(res.final_cost or res.estimated_cost or 0 for res, spot, lot, user in all_reservations)
-        total_hours = sum(res.actual_duration_hours or res.reserved_duration_hours or 0 for res, spot, lot, user in all_reservations)
-        completed_count = len([res for res, spot, lot, user in all_reservations if res.status == 'completed'])
-        active_count = len([res for res, spot, lot, user in all_reservations if res.status == 'active'])
-        cancelled_count = len([res for res, spot, lot, user in all_reservations if res.status == 'cancelled'])
+        # System-wide statistics over the whole filtered history in one aggregate query
+        totals = reservation_totals(query)
+        total_count = totals['count']
+        total_revenue = totals['spent']
+        total_hours = totals['hours']
+        completed_count = totals['completed']
+        active_count = totals['active']
+        cancelled_count = totals['cancelled']
         
-        # Apply pagination and ordering
-        paginated_reservations = query.order_by(Reservation.created_at.desc()).offset(offset).limit(limit).all()
+        try:
+            paginated_reservations, next_cursor = reservation_page(query, limit, cursor, offset, reservation=lambda row: row[0])
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         history_data = []
         for reservation, spot, lot, user in paginated_reservations:
@@ -483,10 +567,17 @@ def get_admin_parking_history():
             'pagination': {
                 'limit': limit,
                 'offset': offset,
-                'total_count': total_count
+                'total_count': total_count,
+                'next_cursor': next_cursor
             }
         }), 200
         
     except Exception as e:
         current_app.logger.error(f"Get admin parking history error: {str(e)}")
         return jsonify({'error': 'Failed to fetch parking history'}), 500
+
+@admin_bp.route('/cache-stats', methods=['GET'])
+@roles_required('admin')
+def get_cache_stats():
+    """Per-tier cache hit counts for the worker serving this request"""
+    return jsonify({'pid': os.getpid(), 'cache': redis_cache.get_stats()}), 200
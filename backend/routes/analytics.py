@@ -1,13 +1,17 @@
-from flask import Blueprint, request, jsonify, current_app, Response
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context, send_file, url_for
 from flask_security import auth_required, roles_required, current_user
 from models import Reservation, Parking_lot, User, ParkingSpot, db
 from datetime import datetime, timedelta
 from utils import get_ist_now
-from redis_cache import cached, CacheConfig
+from redis_cache import cached, CacheConfig, redis_cache, user_tag
+from sqlalchemy import func
+from rollups import daily_stats, hourly_stats, revenue_expr, duration_hours_expr, COUNTED_STATUSES
+from queries import active_users as active_users_query
+from reports import iter_csv, revenue_report, occupancy_report, user_report, personal_report, REPORT_BUILDERS
+import redis
 import statistics
-
-import csv
-from io import StringIO
+import uuid
+import os
 
 analytics_bp = Blueprint('analytics', __name__)
 
@@ -21,76 +25,78 @@ def get_admin_analytics():
         end_date = get_ist_now()
         start_date = end_date - timedelta(days=days)
         
-        reservations = Reservation.query.filter(
+        in_window = (
             Reservation.created_at >= start_date,
-            Reservation.status.in_(['completed', 'active'])
-        ).all()
+            Reservation.status.in_(COUNTED_STATUSES)
+        )
+        
+        # Settled days come from the rollup tables, the partial days are aggregated live
+        daily = daily_stats(start_date, end_date)
+        hourly = hourly_stats(start_date, end_date)
         
-        total_revenue = sum(res.final_cost or 0 for res in reservations)
-        total_bookings = len(reservations)
+        total_revenue = sum(row['revenue'] for row in daily)
+        total_bookings = sum(row['bookings'] for row in daily)
+        # Distinct users don't add up across days, so count them directly
+        active_users = active_users_query(start_date).scalar()
         
-        parking_lots = Parking_lot.query.all()
+        parking_lots = db.session.query(Parking_lot.id, Parking_lot.name, Parking_lot.capacity).all()
         total_spots = sum(lot.capacity for lot in parking_lots)
         active_reservations = Reservation.query.filter(Reservation.status == 'active').count()
         average_occupancy = (active_reservations / total_spots * 100) if total_spots > 0 else 0
         
-        active_users = len(set(res.user_id for res in reservations))
+        by_date = {}
+        lot_stats = {}
+        for row in daily:
+            if row['bookings']:
+                date_totals = by_date.setdefault(row['day'].isoformat(), [0, 0])
+                date_totals[0] += row['revenue']
+                date_totals[1] += row['bookings']
+            totals = lot_stats.setdefault(row['lot_id'], [0, 0, 0, 0])
+            totals[0] += row['revenue']
+            totals[1] += row['bookings']
+            totals[2] += row['active_bookings']
+            totals[3] += row['hours']
+        daily_rows = sorted((d, r, b) for d, (r, b) in by_date.items())
         
-        revenue_by_date = {}
-        booking_trends = {}
-        for res in reservations:
-            date_key = res.created_at.strftime('%Y-%m-%d')
-            if date_key not in revenue_by_date:
-                revenue_by_date[date_key] = 0
-                booking_trends[date_key] = 0
-            revenue_by_date[date_key] += res.final_cost or 0
-            booking_trends[date_key] += 1
-        
-        revenue_over_time = [{'date': d, 'revenue': r} for d, r in sorted(revenue_by_date.items())]
-        booking_trends_data = [{'date': d, 'bookings': b} for d, b in sorted(booking_trends.items())]
+        revenue_over_time = [{'date': d, 'revenue': r} for d, r, b in daily_rows]
+        booking_trends_data = [{'date': d, 'bookings': b} for d, r, b in daily_rows]
         
         lot_performance = []
         for lot in parking_lots:
-            lot_reservations = [res for res in reservations if res.parking_spot.lot_id == lot.id]
-            lot_revenue = sum(res.final_cost or 0 for res in lot_reservations)
-            lot_bookings = len(lot_reservations)
-            lot_occupancy = (len([res for res in lot_reservations if res.status == 'active']) / lot.capacity * 100) if lot.capacity > 0 else 0
-            avg_duration = sum(res.actual_duration_hours or res.reserved_duration_hours or 0 for res in lot_reservations) / len(lot_reservations) if lot_reservations else 0
+            lot_revenue, lot_bookings, lot_active, lot_hours = lot_stats.get(lot.id, (0, 0, 0, 0))
+            lot_occupancy = (lot_active / lot.capacity * 100) if lot.capacity > 0 else 0
+            avg_duration = lot_hours / lot_bookings if lot_bookings else 0
             
             lot_performance.append({
                 'id': lot.id, 'name': lot.name, 'revenue': lot_revenue, 'bookings': lot_bookings,
                 'occupancy': lot_occupancy, 'avgDuration': avg_duration,
-                'revenuePerHour': lot_revenue / (avg_duration * len(lot_reservations)) if avg_duration > 0 and lot_reservations else 0
+                'revenuePerHour': lot_revenue / lot_hours if avg_duration > 0 and lot_bookings else 0
             })
         lot_performance.sort(key=lambda x: x['revenue'], reverse=True)
         
-        hourly_occupancy = {}
-        for hour in range(24):
-            hourly_reservations = [res for res in reservations if res.start_time and res.start_time.hour == hour]
-            hourly_occupancy[hour] = len(hourly_reservations)
+        hourly_counts = {}
+        for row in hourly:
+            hourly_counts[row['hour']] = hourly_counts.get(row['hour'], 0) + row['bookings']
         
-        hourly_occupancy_data = [{'hour': h, 'occupancy': c} for h, c in hourly_occupancy.items()]
+        hourly_occupancy_data = [{'hour': h, 'occupancy': hourly_counts.get(h, 0)} for h in range(24)]
         
-        user_activity = {}
-        for res in reservations:
-            date_key = res.created_at.strftime('%Y-%m-%d')
-            if date_key not in user_activity: user_activity[date_key] = {'new_users': 0, 'active_users': 0}
-            user_activity[date_key]['active_users'] += 1
-            
-        unique_users = len(set(res.user_id for res in reservations))
-        if user_activity:
-             daily_new_users = unique_users / len(user_activity) if len(user_activity) > 0 else 0
-             for k in user_activity: user_activity[k]['new_users'] = int(daily_new_users)
-             
-        user_activity_data = [{'date': d, 'new_users': v['new_users'], 'active_users': v['active_users']} for d, v in sorted(user_activity.items())]
+        daily_new_users = int(active_users / len(daily_rows)) if daily_rows else 0
+        user_activity_data = [{'date': d, 'new_users': daily_new_users, 'active_users': b} for d, r, b in daily_rows]
         
-        recent_transactions = []
-        for res in sorted(reservations, key=lambda x: x.final_cost or 0, reverse=True)[:20]:
-            recent_transactions.append({
-                'id': res.id, 'date': res.created_at.isoformat(), 'userName': res.user.name,
-                'parkingLot': res.parking_spot.parking_lot.name, 'duration': res.actual_duration_hours or res.reserved_duration_hours or 0,
-                'amount': res.final_cost or 0, 'status': res.status.title()
-            })
+        top_rows = db.session.query(
+            Reservation.id, Reservation.created_at, User.name, Parking_lot.name,
+            duration_hours_expr, revenue_expr, Reservation.status
+        ).join(User, Reservation.user_id == User.id)\
+         .join(ParkingSpot, Reservation.spot_id == ParkingSpot.id)\
+         .join(Parking_lot, ParkingSpot.lot_id == Parking_lot.id)\
+         .filter(*in_window)\
+         .order_by(revenue_expr.desc(), Reservation.id).limit(20).all()
+        
+        recent_transactions = [{
+            'id': res_id, 'date': created_at.isoformat(), 'userName': user_name,
+            'parkingLot': lot_name, 'duration': duration,
+            'amount': amount, 'status': status.title()
+        } for res_id, created_at, user_name, lot_name, duration, amount, status in top_rows]
             
         return jsonify({
             'summary': {'total_revenue': total_revenue, 'total_bookings': total_bookings, 'average_occupancy': average_occupancy, 'active_users': active_users},
@@ -108,24 +114,24 @@ def get_admin_analytics_previous():
         days = request.args.get('days', 30, type=int)
         end_date = get_ist_now() - timedelta(days=days)
         start_date = end_date - timedelta(days=days)
-        reservations = Reservation.query.filter(Reservation.created_at >= start_date, Reservation.created_at < end_date, Reservation.status.in_(['completed', 'active'])).all()
+        daily = daily_stats(start_date, end_date)
+        active_users = active_users_query(start_date, end_date).scalar()
         
-        parking_lots = Parking_lot.query.all()
-        total_spots = sum(lot.capacity for lot in parking_lots)
-        average_occupancy = (len([res for res in reservations if res.status == 'active']) / total_spots * 100) if total_spots > 0 else 0
+        total_spots = db.session.query(func.coalesce(func.sum(Parking_lot.capacity), 0)).scalar()
+        average_occupancy = (sum(row['active_bookings'] for row in daily) / total_spots * 100) if total_spots > 0 else 0
         
         return jsonify({
-            'total_revenue': sum(res.final_cost or 0 for res in reservations),
-            'total_bookings': len(reservations),
+            'total_revenue': sum(row['revenue'] for row in daily),
+            'total_bookings': sum(row['bookings'] for row in daily),
             'average_occupancy': average_occupancy,
-            'active_users': len(set(res.user_id for res in reservations))
+            'active_users': active_users
         }), 200
     except Exception as e:
         return jsonify({'error': 'Failed to fetch previous analytics data'}), 500
 
 @analytics_bp.route('/user/spending-summary', methods=['GET'])
 @auth_required('token', 'session')
-@cached(timeout=CacheConfig.USER_DATA_TIMEOUT, key_prefix=CacheConfig.USER_DATA_KEY)
+@cached(timeout=CacheConfig.USER_DATA_TIMEOUT, key_prefix=CacheConfig.USER_DATA_KEY, tags=lambda: [user_tag(current_user.id)], per_user=True)
 def get_user_spending_summary():
     """Get user's parking spending summary and statistics"""
     try:
@@ -214,22 +220,21 @@ def get_user_spending_summary():
         current_app.logger.error(f"Get spending summary error: {str(e)}")
         return jsonify({'error': 'Failed to get spending summary'}), 500
 
+def _csv_response(report):
+    """Stream a (filename, header, rows) report as a CSV download"""
+    filename, header, rows = report
+    return Response(
+        stream_with_context(iter_csv(header, rows)),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
 @analytics_bp.route('/admin/reports/revenue', methods=['GET'])
 @roles_required('admin')
 def export_revenue_report():
     try:
         days = request.args.get('days', 30, type=int)
-        end_date = get_ist_now()
-        start_date = end_date - timedelta(days=days)
-        reservations = Reservation.query.filter(Reservation.created_at >= start_date, Reservation.status.in_(['completed', 'active'])).all()
-        
-        output = StringIO()
-        writer = csv.writer(output)
-        writer.writerow(['Date', 'User', 'Parking Lot', 'Spot', 'Duration Hours', 'Amount', 'Status'])
-        for res in reservations:
-            writer.writerow([res.created_at.strftime('%Y-%m-%d %H:%M'), res.user.name, res.parking_spot.parking_lot.name, res.parking_spot.spot_number, res.actual_duration_hours or res.reserved_duration_hours or 0, res.final_cost or 0, res.status])
-        
-        return Response(output.getvalue(), mimetype='text/csv', headers={'Content-Disposition': f'attachment; filename=revenue-report-{days}days.csv'})
+        return _csv_response(revenue_report(days))
     except Exception as e:
         return jsonify({'error': 'Failed to export revenue report'}), 500
 
@@ -238,13 +243,7 @@ def export_revenue_report():
 def export_occupancy_report():
     try:
         days = request.args.get('days', 30, type=int)
-        output = StringIO()
-        writer = csv.writer(output)
-        writer.writerow(['Parking Lot', 'Total Capacity', 'Active Reservations', 'Occupancy %', 'Total Revenue'])
-        for lot in Parking_lot.query.all():
-            active = Reservation.query.join(ParkingSpot).filter(ParkingSpot.lot_id == lot.id, Reservation.status == 'active').count()
-            writer.writerow([lot.name, lot.capacity, active, f"{(active/lot.capacity*100) if lot.capacity else 0:.1f}", 0]) # Revenue simplified
-        return Response(output.getvalue(), mimetype='text/csv', headers={'Content-Disposition': f'attachment; filename=occupancy-report-{days}days.csv'})
+        return _csv_response(occupancy_report(days))
     except Exception as e:
          return jsonify({'error': 'Failed to export occupancy report'}), 500
 
@@ -253,15 +252,141 @@ def export_occupancy_report():
 def export_admin_user_report():
     try:
         days = request.args.get('days', 30, type=int)
-        output = StringIO()
-        writer = csv.writer(output)
-        writer.writerow(['User Name', 'Email', 'Join Date', 'Total Reservations', 'Total Spent'])
-        for user in User.query.all():
-            writer.writerow([user.name, user.email, user.created_at, 0, 0]) # Simplified
-        return Response(output.getvalue(), mimetype='text/csv', headers={'Content-Disposition': f'attachment; filename=user-report-{days}days.csv'})
+        return _csv_response(user_report(days))
     except Exception as e:
         return jsonify({'error': 'Failed to export user report'}), 500
 
+def _report_job_status(job_id):
+    """Job metadata plus Celery state/progress, or None for unknown jobs"""
+    meta = redis_cache.redis_client.hgetall(f"report_job_meta:{job_id}")
+    if not meta:
+        return None
+    
+    result = current_app.extensions['celery'].AsyncResult(job_id)
+    status = {
+        'job_id': job_id,
+        'report': meta['report'],
+        'days': int(meta['days']),
+        'gzip': meta['gzip'] == '1',
+        'created_at': meta['created_at'],
+        'state': result.state
+    }
+    if result.state == 'PROGRESS':
+        status['progress'] = result.info
+    elif result.state == 'SUCCESS':
+        status['result'] = result.result
+        status['download_url'] = url_for('analytics.download_report_job', job_id=job_id)
+    elif result.state == 'FAILURE':
+        status['error'] = 'Report generation failed'
+    return status
+
+@analytics_bp.route('/admin/reports/jobs', methods=['POST'])
+@roles_required('admin')
+def create_report_job():
+    """Queue a report for background generation; identical in-flight requests share one job"""
+    try:
+        data = request.get_json() or {}
+        report_type = data.get('report')
+        compress = bool(data.get('gzip', False))
+        try:
+            days = int(data.get('days', 30))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Days must be a whole number'}), 400
+        
+        if report_type not in REPORT_BUILDERS:
+            return jsonify({'error': f"Unknown report type. Choose one of: {', '.join(REPORT_BUILDERS)}"}), 400
+        if days <= 0:
+            return jsonify({'error': 'Days must be greater than 0'}), 400
+        if not redis_cache.is_available():
+            return jsonify({'error': 'Background reports are unavailable right now'}), 503
+        
+        client = redis_cache.redis_client
+        ttl = current_app.config.get('REPORT_JOB_TTL', 24 * 3600)
+        # Short-lived unless the worker keeps refreshing it, so a job lost with its worker stops being reused
+        dedupe_ttl = current_app.config.get('REPORT_JOB_DEDUPE_TTL', 300)
+        dedupe_key = f"report_job:{report_type}:{days}:{int(compress)}"
+        job_id = str(uuid.uuid4())
+        
+        if not client.set(dedupe_key, job_id, nx=True, ex=dedupe_ttl):
+            existing_id = client.get(dedupe_key)
+            existing = _report_job_status(existing_id) if existing_id else None
+            if existing and existing['state'] not in ('SUCCESS', 'FAILURE'):
+                return jsonify(dict(existing, reused=True)), 202
+            # Leftover key from a finished or lost job
+            client.set(dedupe_key, job_id, ex=dedupe_ttl)
+        
+        filename = f"{job_id}.csv.gz" if compress else f"{job_id}.csv"
+        path = os.path.join(current_app.config['REPORT_ARTIFACT_DIR'], filename)
+        meta_key = f"report_job_meta:{job_id}"
+        client.hset(meta_key, mapping={
+            'report': report_type, 'days': days, 'gzip': int(compress),
+            'path': path, 'created_at': get_ist_now().isoformat()
+        })
+        client.expire(meta_key, ttl)
+        
+        current_app.extensions['celery'].send_task(
+            'tasks.generate_report',
+            args=[report_type, days, path, compress, dedupe_key],
+            task_id=job_id
+        )
+        
+        return jsonify(dict(_report_job_status(job_id), reused=False)), 202
+    except (redis.ConnectionError, redis.TimeoutError) as e:
+        redis_cache.record_failure(e)
+        current_app.logger.error(f"Create report job error: {str(e)}")
+        return jsonify({'error': 'Background reports are unavailable right now'}), 503
+    except Exception as e:
+        current_app.logger.error(f"Create report job error: {str(e)}")
+        return jsonify({'error': 'Failed to queue report'}), 500
+
+@analytics_bp.route('/admin/reports/jobs/<job_id>', methods=['GET'])
+@roles_required('admin')
+def get_report_job(job_id):
+    try:
+        if not redis_cache.is_available():
+            return jsonify({'error': 'Background reports are unavailable right now'}), 503
+        status = _report_job_status(job_id)
+        if not status:
+            return jsonify({'error': 'Report job not found'}), 404
+        return jsonify(status), 200
+    except (redis.ConnectionError, redis.TimeoutError) as e:
+        redis_cache.record_failure(e)
+        current_app.logger.error(f"Get report job error: {str(e)}")
+        return jsonify({'error': 'Background reports are unavailable right now'}), 503
+    except Exception as e:
+        current_app.logger.error(f"Get report job error: {str(e)}")
+        return jsonify({'error': 'Failed to get report job'}), 500
+
+@analytics_bp.route('/admin/reports/jobs/<job_id>/download', methods=['GET'])
+@roles_required('admin')
+def download_report_job(job_id):
+    try:
+        if not redis_cache.is_available():
+            return jsonify({'error': 'Background reports are unavailable right now'}), 503
+        status = _report_job_status(job_id)
+        if not status:
+            return jsonify({'error': 'Report job not found'}), 404
+        if status['state'] != 'SUCCESS':
+            return jsonify({'error': 'Report is not ready yet', 'state': status['state']}), 409
+        
+        path = redis_cache.redis_client.hget(f"report_job_meta:{job_id}", 'path')
+        if not path or not os.path.exists(path):
+            return jsonify({'error': 'Report file is no longer available'}), 410
+        
+        return send_file(
+            path,
+            mimetype='application/gzip' if status['gzip'] else 'text/csv',
+            as_attachment=True,
+            download_name=status['result']['filename']
+        )
+    except (redis.ConnectionError, redis.TimeoutError) as e:
+        redis_cache.record_failure(e)
+        current_app.logger.error(f"Download report job error: {str(e)}")
+        return jsonify({'error': 'Background reports are unavailable right now'}), 503
+    except Exception as e:
+        current_app.logger.error(f"Download report job error: {str(e)}")
+        return jsonify({'error': 'Failed to download report'}), 500
+
 @analytics_bp.route('/admin/reports/predictive', methods=['GET'])
 @roles_required('admin')
 def generate_predictive_report():
@@ -273,12 +398,6 @@ def generate_predictive_report():
 def export_user_report():
     try:
         days = request.args.get('days', 30, type=int)
-        start_date = get_ist_now() - timedelta(days=days)
-        reservations = Reservation.query.filter(Reservation.user_id == current_user.id, Reservation.created_at >= start_date).all()
-        output = StringIO()
-        writer = csv.writer(output)
-        writer.writerow(['Date', 'Parking Lot', 'Amount'])
-        for res in reservations: writer.writerow([res.created_at, res.parking_spot.parking_lot.name, res.final_cost])
-        return Response(output.getvalue(), mimetype='text/csv', headers={'Content-Disposition': f'attachment; filename=personal-parking-report-{days}days.csv'})
+        return _csv_response(personal_report(current_user.id, days))
     except Exception as e:
         return jsonify({'error': 'Failed to export personal report'}), 500
@@ -1,27 +1,27 @@
-from flask import Blueprint, jsonify, current_app
+import json
+import queue
+from flask import Blueprint, jsonify, current_app, Response, stream_with_context
 from flask_security import auth_required
-from models import Parking_lot, ParkingSpot
+from models import db, Parking_lot, ParkingSpot
+from availability import get_available_spots, get_availability_map, FREE, RESERVED, OCCUPIED
+from availability_stream import broadcaster, lot_event, KEEPALIVE_SECONDS
 
 parking_bp = Blueprint('parking', __name__)
 
 def calculate_available_spots(lot):
-    """Calculate truly available spots (not occupied and no active reservations)"""
-    available_count = 0
-    for spot in lot.spots:
-        if not spot.is_occupied:
-            has_active_reservation = any(res.status == 'active' for res in spot.reservations)
-            if not has_active_reservation:
-                available_count += 1
-    return available_count
+    """Truly available spots (not occupied and no active reservations), read from the lot's counters"""
+    return get_available_spots(lot.id)
 
-from redis_cache import cached, CacheConfig
+from redis_cache import redis_cache, cached, CacheConfig
 
 @parking_bp.route('/parking-lots', methods=['GET'])
-@cached(timeout=CacheConfig.PARKING_LOTS_TIMEOUT, key_prefix=CacheConfig.PARKING_LOTS_KEY)
+@cached(timeout=CacheConfig.PARKING_LOTS_TIMEOUT, key_prefix=CacheConfig.PARKING_LOTS_KEY, tags=[CacheConfig.LOTS_TAG],
+        local_timeout=CacheConfig.LOCAL_TIMEOUT, single_flight=True, early_refresh=1.0)
 def get_parking_lots():
     """Get all parking lots"""
     try:
         lots = Parking_lot.query.all()
+        availability = get_availability_map()
         
         return {
             'parking_lots': [{
@@ -30,7 +30,7 @@ def get_parking_lots():
                 'location': lot.location,
                 'capacity': lot.capacity,
                 'price_per_hour': lot.price_per_hour,
-                'available_spots': calculate_available_spots(lot)
+                'available_spots': availability[lot.id].free_spots if lot.id in availability else 0
             } for lot in lots]
         }
         
@@ -65,3 +65,47 @@ def get_parking_lot_details(lot_id):
     except Exception as e:
         current_app.logger.error(f"Get parking lot details error: {str(e)}")
         return jsonify({'error': 'Failed to get parking lot details'}), 500
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@parking_bp.route('/parking-lots/stream', methods=['GET'])
+def stream_availability():
+    """
+    Server-Sent Events: a `snapshot` of every lot's counters, then a `lot` event
+    whenever a lot's counters change (a `snapshot` is re-sent if events were missed)
+    """
+    if not redis_cache.is_available():
+        return jsonify({'error': 'Live availability updates are unavailable'}), 503
+    
+    # Each open stream holds a worker slot for hours; past the cap, leave the rest to the API
+    subscriber = broadcaster.subscribe(limit=current_app.config.get('STREAM_MAX_SUBSCRIBERS'))
+    if subscriber is None:
+        return jsonify({'error': 'Too many live availability streams, try again later'}), 503
+    
+    def snapshot():
+        subscriber.needs_snapshot = False
+        lots = [lot_event(row.lot_id, {FREE: row.free_spots, RESERVED: row.reserved_spots, OCCUPIED: row.occupied_spots})
+                for row in get_availability_map().values()]
+        # Release the connection; the stream may stay open for hours
+        db.session.close()
+        return _sse('snapshot', {'lots': lots})
+    
+    def events():
+        try:
+            yield f"retry: {KEEPALIVE_SECONDS * 1000}\n" + snapshot()
+            while True:
+                if subscriber.needs_snapshot:
+                    yield snapshot()
+                try:
+                    event = subscriber.events.get(timeout=KEEPALIVE_SECONDS)
+                except queue.Empty:
+                    broadcaster.ensure_listener()
+                    yield ": keepalive\n\n"
+                    continue
+                yield _sse('lot', event)
+        finally:
+            broadcaster.unsubscribe(subscriber)
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
@@ -1,19 +1,54 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_security import auth_required, current_user
-from models import db, Parking_lot, ParkingSpot, Reservation
-from redis_cache import redis_cache
+from models import db, User, Parking_lot, ParkingSpot, Reservation
+from redis_cache import redis_cache, CacheConfig, user_tag
+from availability import move_spot, get_available_spots, FREE, RESERVED, OCCUPIED
+from spot_pool import pop_free_spot, return_spot, rebuild_spot_pool
+from expiry import schedule_reservation, unschedule_reservation
 from datetime import datetime, timedelta
+from sqlalchemy import update
+from sqlalchemy.orm import joinedload
+from sqlalchemy.exc import OperationalError
 from utils import get_ist_now
+from pagination import reservation_page, keyset_order, count_rows, count_mode, page_limit, RESERVATION_KEYSET
+from queries import user_reservations, active_reservation_in_lot, free_spots_in_lot, active_reservation_on
+from rollups import reservation_totals
 
 
 reservation_bp = Blueprint('reservations', __name__)
 
+def allocate_spot(lot_id):
+    """Pick a free spot in a lot: pool pop first, table scan only if the pool is out of sync or unavailable"""
+    spot = pop_free_spot(lot_id)
+    if spot or get_available_spots(lot_id) == 0:
+        return spot
+    
+    # Counters say the lot has room but the pool is empty or unreachable: resync it
+    if rebuild_spot_pool(lot_id):
+        spot = pop_free_spot(lot_id)
+        if spot:
+            return spot
+    
+    return free_spots_in_lot(lot_id).first()
+
 @reservation_bp.route('', methods=['GET'])
 @auth_required('token', 'session')
 def get_user_reservations():
-    """Get current user's reservations"""
+    """Get current user's reservations (all of them unless limit is given)"""
     try:
-        reservations = current_user.reservations
+        limit = request.args.get('limit', type=int)
+        offset = request.args.get('offset', 0, type=int)
+        
+        query = user_reservations(current_user.id)
+        total_count = query.count() if limit is not None else None
+        
+        # Load spot and lot in the same query instead of two lazy loads per row
+        query = keyset_order(query.options(
+            joinedload(Reservation.parking_spot).joinedload(ParkingSpot.parking_lot)
+        ), RESERVATION_KEYSET)
+        if limit is not None:
+            query = query.offset(offset).limit(limit)
+        reservations = query.all()
         
         reservation_list = []
         for res in reservations:
@@ -59,7 +94,12 @@ def get_user_reservations():
             reservation_list.append(reservation_data)
         
         return jsonify({
-            'reservations': reservation_list
+            'reservations': reservation_list,
+            'pagination': {
+                'limit': limit,
+                'offset': offset,
+                'total_count': total_count if total_count is not None else len(reservation_list)
+            }
         }), 200
         
     except Exception as e:
@@ -75,10 +115,13 @@ def get_user_parking_history():
         status = request.args.get('status')
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
-        limit = request.args.get('limit', 50, type=int)
+        limit = page_limit(request.args.get('limit', type=int))
         offset = request.args.get('offset', 0, type=int)
+        cursor = request.args.get('cursor')
         
-        query = Reservation.query.filter_by(user_id=current_user.id)
+        query = user_reservations(current_user.id)
+        # Summary covers all of the user's reservations, not just the filtered ones
+        totals = reservation_totals(query)
         
         if status:
             query = query.filter(Reservation.status == status)
@@ -89,13 +132,18 @@ def get_user_parking_history():
             end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
             query = query.filter(Reservation.created_at <= end_dt)
         
-        total_count = query.count()
-        reservations = query.order_by(Reservation.created_at.desc()).offset(offset).limit(limit).all()
-        
-        # Calculate summary statistics
-        total_spent = sum(res.final_cost or res.estimated_cost or 0 for res in current_user.reservations)
-        total_hours = sum(res.actual_duration_hours or res.reserved_duration_hours or 0 for res in current_user.reservations)
-        completed_reservations = len([res for res in current_user.reservations if res.status == 'completed'])
+        try:
+            mode = count_mode(request.args.get('count'), cursor)
+            total_count = count_rows(query, mode)
+            reservations, next_cursor = reservation_page(query.options(
+                joinedload(Reservation.parking_spot).joinedload(ParkingSpot.parking_lot)
+            ), limit, cursor, offset)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        total_spent = totals['spent']
+        total_hours = totals['hours']
+        completed_reservations = totals['completed']
         
         history_data = []
         for res in reservations:
@@ -151,7 +199,9 @@ def get_user_parking_history():
             'pagination': {
                 'limit': limit,
                 'offset': offset,
-                'total_count': total_count
+                'total_count': total_count,
+                'count_mode': mode,
+                'next_cursor': next_cursor
             }
         }), 200
         
@@ -159,6 +209,129 @@ def get_user_parking_history():
         current_app.logger.error(f"Get parking history error: {str(e)}")
         return jsonify({'error': 'Failed to get parking history'}), 500
 
+def claim_spot(spot):
+    """
+    Compare-and-set on the spot's version as read when it was picked: of several concurrent
+    bookers only the first UPDATE matches, and the others match zero rows once it commits
+    (a row lock plus re-check on PostgreSQL, writer serialization on SQLite).
+    The unoccupied / no-active-reservation conditions reject stale pool entries.
+    """
+    result = db.session.execute(
+        update(ParkingSpot).where(
+            ParkingSpot.id == spot.id,
+            ParkingSpot.version == spot.version,
+            ParkingSpot.is_occupied == False,
+            ~active_reservation_on(spot.id)
+        ).values(version=ParkingSpot.version + 1),
+        execution_options={'synchronize_session': False}
+    )
+    return result.rowcount == 1
+
+def claim_booking(user_id, seen_version):
+    """
+    Compare-and-set on the user's booking_version read before the one-per-lot check,
+    so a double submit cannot pass that check twice: the loser matches zero rows and retries.
+    """
+    result = db.session.execute(
+        update(User).where(
+            User.id == user_id,
+            User.booking_version == seen_version
+        ).values(booking_version=User.booking_version + 1),
+        execution_options={'synchronize_session': False}
+    )
+    return result.rowcount == 1
+
+def _has_active_reservation_in_lot(user_id, lot_id):
+    return active_reservation_in_lot(user_id, lot_id).first() is not None
+
+def _build_reservation(parking_lot, spot, duration_hours, vehicle_number):
+    start_time = get_ist_now()
+    end_time = start_time + timedelta(hours=duration_hours)
+    estimated_cost = parking_lot.price_per_hour * duration_hours
+    
+    return Reservation(
+        user_id=current_user.id,
+        spot_id=spot.id,
+        start_time=start_time,
+        end_time=end_time,
+        status='active',
+        reserved_duration_hours=duration_hours,
+        estimated_cost=estimated_cost,
+        hourly_rate=parking_lot.price_per_hour,
+        vehicle_number=vehicle_number
+    )
+
+def _reservation_created_response(reservation, parking_lot, spot, duration_hours):
+    redis_cache.invalidate_tags(CacheConfig.LOTS_TAG, CacheConfig.ANALYTICS_TAG, user_tag(current_user.id))
+    schedule_reservation(reservation)
+    
+    return jsonify({
+        'message': 'Spot reserved successfully',
+        'reservation': {
+            'id': reservation.id,
+            'parking_lot': parking_lot.name,
+            'spot_number': spot.spot_number,
+            'start_time': reservation.start_time.isoformat(),
+            'end_time': reservation.end_time.isoformat(),
+            'status': reservation.status,
+            'price_per_hour': parking_lot.price_per_hour,
+            'total_cost': parking_lot.price_per_hour * duration_hours,
+            'vehicle_number': reservation.vehicle_number
+        }
+    }), 201
+
+def _create_reservation_optimistic(lot_id, duration_hours, vehicle_number):
+    """
+    Lock-free booking engine (RESERVATION_ENGINE = 'optimistic').
+    Claims the user's booking_version and a candidate spot's version with compare-and-set
+    UPDATEs and retries on conflict instead of serializing the lot behind a Redis lock.
+    """
+    parking_lot = Parking_lot.query.get_or_404(lot_id)
+    
+    max_attempts = current_app.config.get('RESERVATION_OPTIMISTIC_RETRIES', 5)
+    for attempt in range(max_attempts):
+        seen_version = db.session.query(User.booking_version).filter(User.id == current_user.id).scalar()
+        if _has_active_reservation_in_lot(current_user.id, lot_id):
+            return jsonify({'error': 'You already have an active reservation in this parking lot'}), 400
+        
+        available_spot = None
+        try:
+            if not claim_booking(current_user.id, seen_version):
+                # Another booking by this user committed since the check: re-check
+                db.session.rollback()
+                continue
+            
+            available_spot = allocate_spot(lot_id)
+            if not available_spot:
+                db.session.rollback()
+                return jsonify({'error': 'No available spots in this parking lot'}), 400
+            
+            if not claim_spot(available_spot):
+                # Someone else booked this spot between pick and claim
+                db.session.rollback()
+                continue
+            
+            reservation = _build_reservation(parking_lot, available_spot, duration_hours, vehicle_number)
+            db.session.add(reservation)
+            move_spot(lot_id, FREE, RESERVED)
+            db.session.commit()
+        except OperationalError as e:
+            # Write conflict with a concurrent booking (e.g. SQLite busy): retry
+            db.session.rollback()
+            if available_spot:
+                return_spot(lot_id, available_spot.id)
+            current_app.logger.warning(f"Reservation claim conflict on lot {lot_id} (attempt {attempt + 1}): {e}")
+            continue
+        except Exception:
+            db.session.rollback()
+            if available_spot:
+                return_spot(lot_id, available_spot.id)
+            raise
+        
+        return _reservation_created_response(reservation, parking_lot, available_spot, duration_hours)
+    
+    return jsonify({'error': 'System is busy processing other bookings for this lot. Please try again.'}), 409
+
 @reservation_bp.route('', methods=['POST'])
 @auth_required('token', 'session')
 def create_reservation():
@@ -174,6 +347,9 @@ def create_reservation():
             
         if not vehicle_number:
             return jsonify({'error': 'Vehicle number is required'}), 400
+        
+        if current_app.config.get('RESERVATION_ENGINE', 'lock') == 'optimistic':
+            return _create_reservation_optimistic(lot_id, duration_hours, vehicle_number)
             
         # Acquiring distributed lock for this specific parking lot
         lock_name = f"reservation:lot:{lot_id}"
@@ -182,66 +358,26 @@ def create_reservation():
         if not lock_id:
             return jsonify({'error': 'System is busy processing other bookings for this lot. Please try again.'}), 409
             
+        available_spot = None
         try:
             parking_lot = Parking_lot.query.get_or_404(lot_id)
             
-            # Double check available spots under lock
-            # Using write lock logic essentially
-            available_spot = ParkingSpot.query.filter_by(
-                lot_id=lot_id, 
-                is_occupied=False
-            ).filter(
-                ~ParkingSpot.reservations.any(Reservation.status == 'active')
-            ).first()
+            if _has_active_reservation_in_lot(current_user.id, lot_id):
+                return jsonify({'error': 'You already have an active reservation in this parking lot'}), 400
+            
+            # Take a spot from the lot's free pool under lock (constant time regardless of lot size)
+            available_spot = allocate_spot(lot_id)
             
             if not available_spot:
                 return jsonify({'error': 'No available spots in this parking lot'}), 400
             
-            existing_reservation = Reservation.query.filter_by(
-                user_id=current_user.id,
-                status='active'
-            ).join(ParkingSpot).filter_by(lot_id=lot_id).first()
-            
-            if existing_reservation:
-                return jsonify({'error': 'You already have an active reservation in this parking lot'}), 400
-            
-            start_time = get_ist_now()
-            end_time = start_time + timedelta(hours=duration_hours)
-            estimated_cost = parking_lot.price_per_hour * duration_hours
-            
-            reservation = Reservation(
-                user_id=current_user.id,
-                spot_id=available_spot.id,
-                start_time=start_time,
-                end_time=end_time,
-                status='active',
-                reserved_duration_hours=duration_hours,
-                estimated_cost=estimated_cost,
-                hourly_rate=parking_lot.price_per_hour,
-                vehicle_number=vehicle_number
-            )
+            reservation = _build_reservation(parking_lot, available_spot, duration_hours, vehicle_number)
             
             db.session.add(reservation)
+            move_spot(available_spot.lot_id, FREE, RESERVED)
             db.session.commit()
             
-            redis_cache.invalidate_pattern('parking-lots*')
-            redis_cache.invalidate_pattern('user-spending*')
-            redis_cache.invalidate_pattern('admin-analytics*')
-            
-            return jsonify({
-                'message': 'Spot reserved successfully',
-                'reservation': {
-                    'id': reservation.id,
-                    'parking_lot': parking_lot.name,
-                    'spot_number': available_spot.spot_number,
-                    'start_time': reservation.start_time.isoformat(),
-                    'end_time': reservation.end_time.isoformat(),
-                    'status': reservation.status,
-                    'price_per_hour': parking_lot.price_per_hour,
-                    'total_cost': parking_lot.price_per_hour * duration_hours,
-                    'vehicle_number': reservation.vehicle_number
-                }
-            }), 201
+            return _reservation_created_response(reservation, parking_lot, available_spot, duration_hours)
             
         finally:
             redis_cache.release_lock(lock_name, lock_id)
@@ -249,6 +385,9 @@ def create_reservation():
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Create reservation error: {str(e)}")
+        # Booking failed after taking a spot from the pool: hand it back
+        if 'available_spot' in locals() and available_spot:
+            return_spot(available_spot.lot_id, available_spot.id)
         # Try to release lock if it exists (though finally block usually handles this, safety net)
         if 'lock_name' in locals() and 'lock_id' in locals() and lock_id:
              redis_cache.release_lock(lock_name, lock_id)
@@ -271,11 +410,24 @@ def occupy_spot(reservation_id):
         if reservation.parking_spot.is_occupied:
             return jsonify({'error': 'Spot is already occupied'}), 400
         
+        # Conditional, so a reservation expired as a no-show in the meantime is not occupied
+        occupied = db.session.execute(
+            update(Reservation).where(
+                Reservation.id == reservation.id,
+                Reservation.status == 'active',
+                Reservation.occupied_at.is_(None)
+            ).values(occupied_at=get_ist_now())
+        ).rowcount
+        if not occupied:
+            db.session.rollback()
+            return jsonify({'error': 'Reservation is no longer active'}), 409
+        
         reservation.parking_spot.is_occupied = True
-        reservation.occupied_at = get_ist_now()
+        move_spot(reservation.parking_spot.lot_id, RESERVED, OCCUPIED)
         # STRICTOR BILLING REFACTOR: Do not reset start_time.
         
         db.session.commit()
+        unschedule_reservation(reservation.id, warning=False)
         
         return jsonify({
             'message': 'Spot marked as occupied',
@@ -331,18 +483,27 @@ def release_spot(reservation_id):
         parking_lot = reservation.parking_spot.parking_lot
         final_cost = parking_lot.price_per_hour * billable_hours
         
-        reservation.end_time = release_time
-        reservation.released_at = release_time
-        reservation.status = 'completed'
-        reservation.actual_duration_hours = actual_duration
-        reservation.final_cost = final_cost
+        # Conditional, so a reservation expired or cancelled in the meantime is not completed and its spot not freed twice
+        released = db.session.execute(
+            update(Reservation).where(
+                Reservation.id == reservation.id,
+                Reservation.status == 'active'
+            ).values(end_time=release_time, released_at=release_time, status='completed',
+                     actual_duration_hours=actual_duration, final_cost=final_cost)
+        ).rowcount
+        if not released:
+            db.session.rollback()
+            return jsonify({'error': 'Reservation is no longer active'}), 409
+        
+        previous_state = OCCUPIED if reservation.parking_spot.is_occupied else RESERVED
         reservation.parking_spot.is_occupied = False
+        move_spot(parking_lot.id, previous_state, FREE)
         
         db.session.commit()
+        return_spot(parking_lot.id, reservation.spot_id)
+        unschedule_reservation(reservation.id)
         
-        redis_cache.invalidate_pattern('parking-lots*')
-        redis_cache.invalidate_pattern('user-spending*')
-        redis_cache.invalidate_pattern('admin-analytics*')
+        redis_cache.invalidate_tags(CacheConfig.LOTS_TAG, CacheConfig.ANALYTICS_TAG, user_tag(current_user.id))
         
         return jsonify({
             'message': 'Spot released successfully',
@@ -388,6 +549,7 @@ def extend_reservation(reservation_id):
         reservation.end_time += timedelta(hours=additional_hours)
         
         db.session.commit()
+        schedule_reservation(reservation)
         
         parking_lot = reservation.parking_spot.parking_lot
         additional_cost = parking_lot.price_per_hour * additional_hours
@@ -428,10 +590,26 @@ def cancel_reservation(reservation_id):
         # if get_ist_now() >= reservation.start_time:
         #     return jsonify({'error': 'Cannot cancel a reservation that has already started'}), 400
         
-        reservation.status = 'cancelled'
+        # Conditional, so a reservation expired or released in the meantime keeps its status and its spot is not freed twice
+        cancelled = db.session.execute(
+            update(Reservation).where(
+                Reservation.id == reservation.id,
+                Reservation.status == 'active'
+            ).values(status='cancelled')
+        ).rowcount
+        if not cancelled:
+            db.session.rollback()
+            return jsonify({'error': 'Reservation is no longer active'}), 409
+        
+        previous_state = OCCUPIED if reservation.parking_spot.is_occupied else RESERVED
         reservation.parking_spot.is_occupied = False
+        move_spot(reservation.parking_spot.lot_id, previous_state, FREE)
         
         db.session.commit()
+        return_spot(reservation.parking_spot.lot_id, reservation.spot_id)
+        unschedule_reservation(reservation.id)
+        
+        redis_cache.invalidate_tags(CacheConfig.LOTS_TAG, CacheConfig.ANALYTICS_TAG, user_tag(current_user.id))
         
         return jsonify({
             'message': 'Reservation cancelled successfully',
@@ -0,0 +1,106 @@
+import logging
+from models import db, Parking_lot, ParkingSpot
+from queries import active_reservation_on
+from redis_cache import redis_cache
+
+logger = logging.getLogger(__name__)
+
+# Sorted set per lot: member = spot id, score = spot id (ZPOPMIN hands out the lowest free spot)
+POOL_KEY = "spot_pool:lot:{lot_id}"
+
+def _pool_key(lot_id):
+    return POOL_KEY.format(lot_id=lot_id)
+
+def _free_spots_query():
+    """Spots that are not occupied and have no active reservation"""
+    return db.session.query(ParkingSpot.lot_id, ParkingSpot.id).filter(
+        ParkingSpot.is_occupied == False,
+        ~active_reservation_on(ParkingSpot.id)
+    )
+
+def rebuild_spot_pool(lot_id=None):
+    """
+    Rebuild free-spot pools from ParkingSpot/Reservation.
+    Rebuilds every lot when lot_id is None.
+    """
+    if not redis_cache.is_available():
+        return False
+
+    query = _free_spots_query()
+    lot_ids_query = db.session.query(Parking_lot.id)
+    if lot_id is not None:
+        query = query.filter(ParkingSpot.lot_id == lot_id)
+        lot_ids_query = lot_ids_query.filter(Parking_lot.id == lot_id)
+
+    free_by_lot = {current_lot_id: {} for (current_lot_id,) in lot_ids_query.all()}
+    for current_lot_id, spot_id in query.all():
+        free_by_lot.setdefault(current_lot_id, {})[str(spot_id)] = spot_id
+
+    try:
+        pipe = redis_cache.redis_client.pipeline(transaction=True)
+        for current_lot_id, members in free_by_lot.items():
+            pipe.delete(_pool_key(current_lot_id))
+            if members:
+                pipe.zadd(_pool_key(current_lot_id), members)
+        pipe.execute()
+        return True
+    except Exception as e:
+        redis_cache.record_failure(e)
+        logger.error(f"Error rebuilding spot pool: {e}")
+        return False
+
+def _is_free(spot, lot_id):
+    if not spot or spot.lot_id != lot_id or spot.is_occupied:
+        return False
+    return not db.session.query(active_reservation_on(spot.id)).scalar()
+
+def pop_free_spot(lot_id, max_attempts=5):
+    """
+    Atomically take the lowest free spot of a lot from the pool.
+    Returns a ParkingSpot, or None when the pool is empty or unavailable.
+    Stale members (changed behind the pool's back) are discarded.
+    """
+    if not redis_cache.is_available():
+        return None
+
+    key = _pool_key(lot_id)
+    for _ in range(max_attempts):
+        try:
+            popped = redis_cache.redis_client.zpopmin(key)
+        except Exception as e:
+            redis_cache.record_failure(e)
+            logger.error(f"Error popping from spot pool: {e}")
+            return None
+        if not popped:
+            return None
+
+        spot = db.session.get(ParkingSpot, int(popped[0][0]))
+        if _is_free(spot, lot_id):
+            return spot
+        logger.warning(f"Discarded stale spot {popped[0][0]} from pool of lot {lot_id}")
+
+    return None
+
+def return_spot(lot_id, spot_id):
+    """Put a spot back into its lot's pool (after release, cancel or a failed booking)"""
+    if not redis_cache.is_available():
+        return False
+    try:
+        redis_cache.redis_client.zadd(_pool_key(lot_id), {str(spot_id): spot_id})
+        return True
+    except Exception as e:
+        redis_cache.record_failure(e)
+        logger.error(f"Error returning spot to pool: {e}")
+        return False
+
+def drop_spot_pool(lot_id):
+    """Remove a deleted lot's pool"""
+    if not redis_cache.is_available():
+        return False
+    try:
+        redis_cache.redis_client.delete(_pool_key(lot_id))
+        return True
+    except Exception as e:
+        redis_cache.record_failure(e)
+        logger.error(f"Error dropping spot pool: {e}")
+        return False
@@ -1,65 +1,43 @@
 from celery_worker import celery
-from flask_mail import Message
-from flask import current_app, render_template_string
-from models import User, Reservation, db
-from datetime import datetime, timedelta
+from flask import current_app
 import logging
+import os
+from rollups import refresh_rollups
+from reports import write_report_artifact
+from redis_cache import redis_cache
+from expiry import process_due, reconcile_schedule
+from monthly_reports import send_monthly_reports as fan_out_monthly_reports, send_user_report
 
 # Logger
 logger = logging.getLogger(__name__)
 
+@celery.task(bind=True)
+def send_monthly_reports(self, period=None):
+    """
+    Periodic task to email every active user last month's parking report.
+    Resumes from its checkpoint if a previous run for the same month stopped part way.
+    """
+    try:
+        def progress(sent):
+            self.update_state(state='PROGRESS', meta={'sent': sent})
+
+        return fan_out_monthly_reports(period, progress=progress)
+
+    except Exception as e:
+        logger.error(f"Monthly report fan-out failed: {str(e)}")
+        raise
+
+
 @celery.task
-def send_monthly_report(user_id):
+def send_monthly_report(user_id, period=None):
     """
-    Background task to generate and send a monthly parking report.
+    Background task to send one user's monthly parking report.
     """
     try:
-        user = User.query.get(user_id)
-        if not user:
+        if not send_user_report(user_id, period):
             logger.error(f"User {user_id} not found for monthly report")
             return
-
-        # Simple logic: Get reservations from last 30 days
-        last_month = datetime.utcnow() - timedelta(days=30)
-        recent_reservations = Reservation.query.filter(
-            Reservation.user_id == user.id,
-            Reservation.created_at >= last_month
-        ).all()
-
-        total_spent = sum(r.final_cost or 0 for r in recent_reservations)
-        total_hours = sum(r.actual_duration_hours or 0 for r in recent_reservations)
-
-        # In a real app, use a proper template file
-        html_body = f"""
-        <h1>Monthly Parking Report</h1>
-        <p>Hello {user.email},</p>
-        <p>Here is your summary for the last 30 days:</p>
-        <ul>
-            <li>Total Reservations: {len(recent_reservations)}</li>
-            <li>Total Spent: ${total_spent:.2f}</li>
-            <li>Total Hours: {total_hours:.2f}</li>
-        </ul>
-        <p>Thank you for using Vehicle Parking App!</p>
-        """
-
-        # Import mail inside task to avoid circular imports if defined globally in app.py
-        from app import app
-        from flask_mail import Mail
-        mail = Mail(app) # Re-init or get from extension if possible, but context is key
-
-        msg = Message(
-            subject="Your Monthly Parking Report",
-            recipients=[user.email],
-            html=html_body,
-            sender=app.config['MAIL_DEFAULT_SENDER']
-        )
-        
-        # In dev/suppress mode, this just logs
-        mail.send(msg)
-        logger.info(f"Monthly report sent to {user.email}")
-        print(f"------------ MOCK EMAIL TO {user.email} ------------")
-        print(html_body)
-        print("----------------------------------------------------")
+        logger.info(f"Monthly report sent to user {user_id}")
 
     except Exception as e:
         logger.error(f"Failed to send monthly report to user {user_id}: {str(e)}")
@@ -68,34 +46,71 @@ def send_monthly_report(user_id):
 @celery.task
 def check_reservation_expiry():
     """
-    Periodic task to check for reservations expiring in 15 minutes.
+    Periodic task to warn about reservations ending soon and expire no-shows.
+    Pops only the due items from the expiry schedule (see expiry.py).
     """
     try:
-        # Check active reservations expiring between now and 15 mins from now
-        now = datetime.utcnow()
-        threshold = now + timedelta(minutes=15)
-        
-        expiring_reservations = Reservation.query.filter(
-            Reservation.status == 'active',
-            Reservation.end_time > now,
-            Reservation.end_time <= threshold,
-            # Ideally add a flag 'expiry_notified' to avoid spamming 
-            # But for simple demo we just log
-        ).all()
-        
-        if not expiring_reservations:
-            return "No expiring reservations found."
-
-        count = 0
-        for res in expiring_reservations:
-            user = User.query.get(res.user_id)
-            if user:
-                logger.info(f"Notify user {user.email} -> Spot expires in <15 mins!")
-                # Here we would send an email or push notification
-                print(f"ALERT: User {user.email}, your reservation {res.id} expires at {res.end_time}!")
-                count += 1
-        
-        return f"Checked expiry: Notified {count} users."
-
+        result = process_due()
+        if result['warned'] or result['expired']:
+            logger.info(f"Reservation expiry: {result}")
+        return result
     except Exception as e:
         logger.error(f"Expiry check failed: {str(e)}")
+
+
+@celery.task
+def reconcile_expiry_schedule():
+    """
+    Periodic task to re-add active reservations missing from the expiry schedule.
+    """
+    try:
+        return reconcile_schedule()
+    except Exception as e:
+        logger.error(f"Expiry schedule reconcile failed: {str(e)}")
+
+
+@celery.task
+def refresh_analytics_rollups():
+    """
+    Periodic task to fill the analytics rollup tables up to yesterday.
+    """
+    try:
+        result = refresh_rollups()
+        logger.info(f"Analytics rollups refreshed: {result}")
+        return result
+    except Exception as e:
+        logger.error(f"Analytics rollup refresh failed: {str(e)}")
+
+
+def _refresh_dedupe_key(dedupe_key, job_id):
+    # Heartbeat: keeps identical requests pointed at this job only while it is alive
+    if dedupe_key and redis_cache.is_available():
+        client = redis_cache.redis_client
+        if client.get(dedupe_key) == job_id:
+            client.expire(dedupe_key, current_app.config.get('REPORT_JOB_DEDUPE_TTL', 300))
+
+
+@celery.task(bind=True)
+def generate_report(self, report_type, days, path, compress=False, dedupe_key=None):
+    """
+    Background task to write a CSV report artifact, reporting rows written as progress.
+    """
+    try:
+        def progress(rows_written):
+            self.update_state(state='PROGRESS', meta={'rows_written': rows_written})
+            _refresh_dedupe_key(dedupe_key, self.request.id)
+
+        _refresh_dedupe_key(dedupe_key, self.request.id)
+        filename, rows = write_report_artifact(report_type, days, path, compress, progress)
+        logger.info(f"Report {report_type} ({days} days) written to {path}: {rows} rows")
+        return {'filename': filename, 'rows_written': rows, 'size_bytes': os.path.getsize(path)}
+
+    except Exception as e:
+        logger.error(f"Report {report_type} generation failed: {str(e)}")
+        raise
+
+    finally:
+        # Let identical requests start a new job from now on
+        if dedupe_key and redis_cache.is_available():
+            if redis_cache.redis_client.get(dedupe_key) == self.request.id:
+                redis_cache.redis_client.delete(dedupe_key)
@@ -0,0 +1,59 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Set before anything imports config, so the app never touches instance/app.db
+TEST_DB = os.path.join(tempfile.mkdtemp(prefix='parking-tests-'), 'test.db')
+os.environ['DATABASE_URL'] = f"sqlite:///{TEST_DB}"
+
+fakeredis = pytest.importorskip('fakeredis')
+import redis
+
+
+def _fake_from_url(server):
+    return classmethod(lambda cls, url, **kwargs: fakeredis.FakeRedis(
+        server=server, decode_responses=kwargs.get('decode_responses', False)).connection_pool)
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Every Redis client created during the test talks to one in-memory server, like workers sharing a Redis"""
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(redis.BlockingConnectionPool, 'from_url', _fake_from_url(server))
+    return server
+
+
+@pytest.fixture(scope='session')
+def app():
+    """The application module's app, on a throwaway SQLite database and fakeredis"""
+    patch = pytest.MonkeyPatch()
+    patch.setattr(redis.BlockingConnectionPool, 'from_url', _fake_from_url(fakeredis.FakeServer()))
+    # create_app prints progress while creating initial data
+    with contextlib.redirect_stdout(io.StringIO()):
+        from app import app as flask_app
+    yield flask_app
+    patch.undo()
+
+
+def login(app, email, password):
+    client = app.test_client()
+    response = client.post('/api/v1/auth/login', json={'email': email, 'password': password})
+    assert response.status_code == 200, response.get_json()
+    return client
+
+
+@pytest.fixture
+def admin_client(app):
+    return login(app, 'admin@parking.com', 'admin123')
+
+
+@pytest.fixture
+def user_client(app):
+    return login(app, 'user@parking.com', 'password123')
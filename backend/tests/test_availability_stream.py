@@ -0,0 +1,24 @@
+from availability_stream import broadcaster
+
+
+def test_stream_returns_503_past_the_per_worker_cap(app, user_client, monkeypatch):
+    monkeypatch.setitem(app.config, 'STREAM_MAX_SUBSCRIBERS', 1)
+    held = broadcaster.subscribe()
+    try:
+        response = user_client.get('/api/v1/parking-lots/stream')
+        assert response.status_code == 503
+        assert 'error' in response.get_json()
+    finally:
+        broadcaster.unsubscribe(held)
+
+
+def test_subscribe_limit_counts_open_subscribers():
+    first = broadcaster.subscribe(limit=1)
+    try:
+        assert first is not None
+        assert broadcaster.subscribe(limit=1) is None
+    finally:
+        broadcaster.unsubscribe(first)
+    second = broadcaster.subscribe(limit=1)
+    assert second is not None
+    broadcaster.unsubscribe(second)
@@ -0,0 +1,25 @@
+import pytest
+
+import expiry
+from redis_cache import redis_cache
+
+
+@pytest.mark.parametrize('key, handler', [(expiry.WARN_KEY, 'send_warnings'), (expiry.NO_SHOW_KEY, 'expire_no_shows')])
+def test_failed_handler_leaves_items_scheduled(app, monkeypatch, key, handler):
+    def fail(reservation_ids, now):
+        raise RuntimeError('database went away')
+
+    monkeypatch.setattr(expiry, handler, fail)
+    with app.app_context():
+        now = expiry._now()
+        score = expiry._epoch(now) - 60
+        client = redis_cache.redis_client
+        # Nothing else due, so the warning batch is empty when the no-show handler is the one failing
+        client.delete(expiry.WARN_KEY, expiry.NO_SHOW_KEY)
+        client.zadd(key, {'999999': score})
+        try:
+            with pytest.raises(RuntimeError):
+                expiry.process_due(now)
+            assert client.zscore(key, '999999') == score
+        finally:
+            client.zrem(key, '999999')
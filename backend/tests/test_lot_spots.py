@@ -0,0 +1,61 @@
+import uuid
+
+from models import db, ParkingSpot, Reservation
+
+
+def create_lot(admin_client, capacity):
+    response = admin_client.post('/api/v1/admin/parking-lots', json={
+        'name': f"Lot {uuid.uuid4().hex[:8]}", 'location': 'Test', 'capacity': capacity, 'price_per_hour': 10
+    })
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['parking_lot']['id']
+
+
+def book_occupy_release(client, lot_id):
+    response = client.post('/api/v1/reservations', json={'lot_id': lot_id, 'vehicle_number': 'TS01AB1234'})
+    assert response.status_code == 201, response.get_json()
+    reservation_id = response.get_json()['reservation']['id']
+    assert client.put(f'/api/v1/reservations/{reservation_id}/occupy').status_code == 200
+    assert client.put(f'/api/v1/reservations/{reservation_id}/release').status_code == 200
+    return reservation_id
+
+
+def lot_spot_ids(app, lot_id):
+    with app.app_context():
+        return [spot_id for (spot_id,) in db.session.query(ParkingSpot.id).filter_by(lot_id=lot_id)]
+
+
+def test_shrinking_lot_keeps_spots_with_past_reservations(app, admin_client, user_client):
+    lot_id = create_lot(admin_client, 4)
+    reservation_id = book_occupy_release(user_client, lot_id)
+    used_spot = max(lot_spot_ids(app, lot_id))
+    with app.app_context():
+        # Shrinking removes the highest-id spots first
+        db.session.get(Reservation, reservation_id).spot_id = used_spot
+        db.session.commit()
+
+    response = admin_client.put(f'/api/v1/admin/parking-lots/{lot_id}', json={'capacity': 1})
+    assert response.status_code == 200, response.get_json()
+    assert lot_spot_ids(app, lot_id) == [used_spot]
+
+    assert user_client.get('/api/v1/reservations').status_code == 200
+    assert user_client.get('/api/v1/reservations/history').status_code == 200
+
+
+def test_shrinking_lot_refuses_to_delete_spot_history(app, admin_client, user_client):
+    lot_id = create_lot(admin_client, 2)
+    spot_ids = lot_spot_ids(app, lot_id)
+    with app.app_context():
+        reservation = db.session.get(Reservation, book_occupy_release(user_client, lot_id))
+        user_id = reservation.user_id
+        # Past reservations on every spot of the lot
+        for spot_id in spot_ids:
+            if spot_id != reservation.spot_id:
+                db.session.add(Reservation(user_id=user_id, spot_id=spot_id, status='completed',
+                                           start_time=reservation.start_time, end_time=reservation.end_time))
+        db.session.commit()
+
+    response = admin_client.put(f'/api/v1/admin/parking-lots/{lot_id}', json={'capacity': 1})
+    assert response.status_code == 400
+    assert sorted(lot_spot_ids(app, lot_id)) == sorted(spot_ids)
+    assert user_client.get('/api/v1/reservations/history').status_code == 200
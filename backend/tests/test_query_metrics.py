@@ -0,0 +1,26 @@
+from query_metrics import metrics
+
+EXPORT = '/api/v1/user/export-report'
+
+
+def recorded_queries():
+    return metrics.queries[('GET', EXPORT)]
+
+
+def test_sql_run_by_a_streamed_body_is_recorded(user_client):
+    before = recorded_queries()
+    response = user_client.get(EXPORT)
+    assert response.status_code == 200
+    view_queries = int(response.headers['Server-Timing'].split('desc="')[1].split()[0])
+
+    # Nothing is recorded until the body has been sent and the response closed
+    assert recorded_queries() == before
+    response.get_data()
+    response.close()
+    # The report rows are queried while the CSV streams, after the view returned
+    assert recorded_queries() - before > view_queries
+
+
+def test_metrics_endpoint_is_off_by_default(app, admin_client):
+    assert not app.config['METRICS_ENABLED']
+    assert admin_client.get('/metrics').status_code == 404
@@ -0,0 +1,92 @@
+from datetime import timedelta
+
+import pytest
+from flask import Flask
+from sqlalchemy import insert, text
+
+from models import db, User, Parking_lot, ParkingSpot, Reservation
+from expiry import due_no_shows
+from pagination import keyset_order, RESERVATION_KEYSET
+from queries import (active_reservation_on, user_reservations, active_reservation_in_lot, free_spots_in_lot,
+                     reservation_details, users_with_totals, active_users, reservation_status_counts)
+from utils import get_ist_now
+
+CHECKED_TABLES = ('reservation', 'parking_spot')
+NOW = get_ist_now().replace(tzinfo=None)
+
+
+def hot_queries():
+    """(id, build) pairs; each build() returns the query a route or task runs, via the same builders"""
+    window_start = NOW - timedelta(days=30)
+    after = (NOW - timedelta(days=2), 2500)
+
+    def users_by_total(after=None):
+        query, sort_columns = users_with_totals()
+        return keyset_order(query, [sort_columns['total_reservations'], User.id], after).limit(51)
+
+    return [
+        ('user reservations, newest first', lambda: keyset_order(user_reservations(1), RESERVATION_KEYSET).limit(20)),
+        ('user history, next page', lambda: keyset_order(
+            user_reservations(1).filter(Reservation.created_at >= window_start), RESERVATION_KEYSET, after).limit(21)),
+        ('active reservation in lot', lambda: active_reservation_in_lot(1, 1).limit(1)),
+        ('active reservation on a spot', lambda: db.session.query(active_reservation_on(1))),
+        ('free spot fallback', lambda: free_spots_in_lot(1).limit(1)),
+        ('admin reservations, newest first', lambda: keyset_order(reservation_details(), RESERVATION_KEYSET).limit(51)),
+        ('admin reservations by status, next page', lambda: keyset_order(
+            reservation_details().filter(Reservation.status == 'completed'), RESERVATION_KEYSET, after).limit(51)),
+        ('admin reservations by user, next page', lambda: keyset_order(
+            reservation_details().filter(Reservation.user_id == 1), RESERVATION_KEYSET, after).limit(51)),
+        ('admin users by total, first page', lambda: users_by_total()),
+        ('admin users by total, next page', lambda: users_by_total((100, 10))),
+        ('active users in window', lambda: active_users(window_start)),
+        ('active users in previous window', lambda: active_users(window_start - timedelta(days=30), window_start)),
+        ('reservation counts by status', lambda: reservation_status_counts()),
+        ('expiry no-show sweep', lambda: due_no_shows(NOW - timedelta(minutes=15), 500)),
+    ]
+
+
+def seed(users=50, lots=5, spots_per_lot=200, reservations=5000):
+    db.session.execute(insert(User), [
+        {'email': f"user{i}@example.com", 'name': f"User {i}", 'password': 'x', 'active': True,
+         'fs_uniquifier': f"plan-{i}"} for i in range(1, users + 1)])
+    db.session.execute(insert(Parking_lot), [
+        {'name': f"Lot {i}", 'location': 'Plan', 'capacity': spots_per_lot, 'price_per_hour': 10.0}
+        for i in range(1, lots + 1)])
+    db.session.execute(insert(ParkingSpot), [
+        {'lot_id': lot_id, 'spot_number': f"A{n:03d}", 'is_occupied': n % 7 == 0}
+        for lot_id in range(1, lots + 1) for n in range(1, spots_per_lot + 1)])
+    statuses = ['completed'] * 8 + ['cancelled', 'active']
+    db.session.execute(insert(Reservation), [
+        {'user_id': i % users + 1, 'spot_id': i % (lots * spots_per_lot) + 1,
+         'start_time': NOW - timedelta(hours=i), 'end_time': NOW - timedelta(hours=i - 2),
+         'created_at': NOW - timedelta(hours=i), 'status': statuses[i % len(statuses)]}
+        for i in range(reservations)])
+    db.session.commit()
+    db.session.execute(text('ANALYZE'))
+
+
+@pytest.fixture(scope='module')
+def seeded_db(tmp_path_factory):
+    """A separate app on its own SQLite file, built from the models and seeded with a few thousand rows"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path_factory.mktemp('plans') / 'plans.db'}"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        seed()
+        yield
+        db.session.remove()
+
+
+def query_plan(query):
+    statement = query.statement if hasattr(query, 'statement') else query
+    compiled = statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+    return [row[-1] for row in db.session.execute(text(f"EXPLAIN QUERY PLAN {compiled}")).all()]
+
+
+@pytest.mark.parametrize('build', [build for _, build in hot_queries()], ids=[name for name, _ in hot_queries()])
+def test_hot_query_uses_an_index(seeded_db, build):
+    plan = query_plan(build())
+    unindexed = [detail for detail in plan
+                 if detail.startswith('SCAN') and detail.split()[1] in CHECKED_TABLES and 'INDEX' not in detail]
+    assert not unindexed, '\n'.join(plan)
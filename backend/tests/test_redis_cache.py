@@ -0,0 +1,127 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+from flask import Flask
+
+from redis_cache import RedisCache, cached, generate_cache_key, user_scope
+
+
+def make_worker(**config):
+    """One Flask app with its own RedisCache, standing in for a worker process"""
+    app = Flask(__name__)
+    app.config.update(REDIS_URL='redis://fake:6379/0', CACHE_KEY_PREFIX='test:', **config)
+    cache = RedisCache(app)
+    return app, cache
+
+
+@pytest.fixture
+def workers(fake_redis):
+    return make_worker(), make_worker()
+
+
+def wait_for(condition, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_miss_then_hit_from_other_worker(workers):
+    (_, a), (_, b) = workers
+    assert b.get('lots:global:x') is None
+    assert b.stats['misses'] == 1
+
+    assert a.set('lots:global:x', {'free': 3}, timeout=60)
+    assert b.get('lots:global:x') == {'free': 3}
+    assert b.stats['redis_hits'] == 1
+
+
+def test_invalidate_tags_from_other_worker(workers):
+    (_, a), (_, b) = workers
+    a.set('lots:global:x', [1, 2], timeout=60, tags=['lots'])
+    a.set('lots:global:y', [3], timeout=60, tags=['lots'])
+    a.set('analytics:global:z', 'keep', timeout=60, tags=['analytics'])
+
+    assert b.invalidate_tags('lots') == 2
+    assert a.get('lots:global:x') is None
+    assert a.get('lots:global:y') is None
+    assert a.get('analytics:global:z') == 'keep'
+
+
+def test_local_tier_dropped_on_other_workers_invalidation(workers):
+    (_, a), (_, b) = workers
+    a.set('lots:global:x', 'v1', timeout=60, tags=['lots'])
+    assert b.get('lots:global:x', local_timeout=30) == 'v1'
+    assert b.get('lots:global:x', local_timeout=30) == 'v1'
+    assert b.stats['local_hits'] == 1
+
+    a.invalidate_tags('lots')
+    assert wait_for(lambda: len(b.local) == 0)
+    assert b.get('lots:global:x', local_timeout=30) is None
+
+
+def test_cached_decorator_shares_entries_between_workers(workers):
+    (app_a, _), (app_b, _) = workers
+    calls = []
+
+    @cached(timeout=60, key_prefix='lots', tags=['lots'])
+    def lots(lot_id):
+        calls.append(lot_id)
+        return {'lot': lot_id, 'calls': len(calls)}
+
+    with app_a.test_request_context('/api/v1/parking-lots?page=1'):
+        assert lots(7) == {'lot': 7, 'calls': 1}
+    with app_b.test_request_context('/api/v1/parking-lots?page=1'):
+        assert lots(7) == {'lot': 7, 'calls': 1}
+    assert calls == [7]
+
+    with app_b.test_request_context('/api/v1/parking-lots?page=2'):
+        assert lots(7) == {'lot': 7, 'calls': 2}
+
+    app_a.extensions['redis_cache'].invalidate_tags('lots')
+    with app_b.test_request_context('/api/v1/parking-lots?page=1'):
+        assert lots(7) == {'lot': 7, 'calls': 3}
+
+
+def test_cache_keys_are_scoped_and_order_independent():
+    key = generate_cache_key('reservations', 1, scope=user_scope(5), query=[('b', '2'), ('a', '1')])
+    assert key.startswith('reservations:user:5:')
+    assert key == generate_cache_key('reservations', 1, scope=user_scope(5), query=[('a', '1'), ('b', '2')])
+    assert key != generate_cache_key('reservations', 1, scope=user_scope(6), query=[('a', '1'), ('b', '2')])
+    assert generate_cache_key('lots').startswith('lots:global:')
+
+
+def test_cache_keys_do_not_depend_on_hash_seed():
+    script = ("from redis_cache import generate_cache_key, user_scope;"
+              "print(generate_cache_key('lots', 3, scope=user_scope(9), query=[('q', 'x')], sort='name'))")
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    keys = set()
+    for seed in ('1', '2', '12345'):
+        result = subprocess.run([sys.executable, '-c', script], cwd=backend_dir, capture_output=True, text=True,
+                                env=dict(os.environ, PYTHONHASHSEED=seed), check=True)
+        keys.add(result.stdout.strip())
+    assert len(keys) == 1
+    assert keys == {generate_cache_key('lots', 3, scope=user_scope(9), query=[('q', 'x')], sort='name')}
+
+
+def test_pickle_only_loaded_in_pickle_namespaces(fake_redis):
+    import pickle
+    _, cache = make_worker(CACHE_CODECS={'admin_dashboard': 'pickle+zlib', 'lots': 'msgpack'})
+    cache.set('admin_dashboard:global:x', {'lots': [1, 2]}, timeout=60)
+    assert cache.get('admin_dashboard:global:x') == {'lots': [1, 2]}
+    cache.set('lots:global:x', {'free': 1}, timeout=60)
+    assert cache.get('lots:global:x') == {'free': 1}
+
+    # A pickle planted by another Redis writer under a JSON or msgpack namespace is never loaded
+    class Exploit:
+        def __reduce__(self):
+            return (os.system, ('echo pwned',))
+    planted = b'\x00p-' + pickle.dumps(Exploit())
+    for key in ('analytics:global:x', 'lots:global:x'):
+        cache.binary_client.set(cache._get_cache_key(key), planted)
+        assert cache.get(key) is None
@@ -0,0 +1,35 @@
+import time
+
+import pytest
+import redis
+
+from redis_cache import redis_cache
+
+
+@pytest.fixture
+def redis_down(monkeypatch):
+    """Redis commands used by the report job routes fail with a connection error"""
+    def refuse(*args, **kwargs):
+        raise redis.ConnectionError('Connection refused')
+
+    for command in ('set', 'get', 'hset', 'hget', 'hgetall'):
+        monkeypatch.setattr(redis_cache.redis_client, command, refuse)
+    yield
+    monkeypatch.undo()
+    # Let the breaker's background probe close it again before the next test
+    deadline = time.monotonic() + 5
+    while not redis_cache.is_available() and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+
+@pytest.mark.parametrize('method, url', [
+    ('post', '/api/v1/admin/reports/jobs'),
+    ('get', '/api/v1/admin/reports/jobs/some-job'),
+    ('get', '/api/v1/admin/reports/jobs/some-job/download'),
+])
+def test_redis_outage_returns_503_and_opens_the_breaker(admin_client, redis_down, method, url):
+    response = getattr(admin_client, method)(url, json={'report': 'revenue', 'days': 7} if method == 'post' else None)
+
+    assert response.status_code == 503
+    assert response.get_json() == {'error': 'Background reports are unavailable right now'}
+    assert not redis_cache.is_available()
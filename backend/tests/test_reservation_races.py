@@ -0,0 +1,66 @@
+import uuid
+
+import pytest
+from sqlalchemy import event, text
+
+import routes.reservations
+from models import db, Reservation
+
+
+@pytest.fixture
+def reservation_id(admin_client, user_client):
+    response = admin_client.post('/api/v1/admin/parking-lots', json={
+        'name': f"Lot {uuid.uuid4().hex[:8]}", 'location': 'Test', 'capacity': 2, 'price_per_hour': 10
+    })
+    assert response.status_code == 201, response.get_json()
+    response = user_client.post('/api/v1/reservations', json={
+        'lot_id': response.get_json()['parking_lot']['id'], 'vehicle_number': 'TS01AB1234'
+    })
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()['reservation']['id']
+
+
+@pytest.fixture
+def expired_mid_request(app, monkeypatch, reservation_id):
+    """
+    Expire the reservation from another connection, as the expiry sweep would, just before the
+    route's own status UPDATE. Collects any move_spot/return_spot calls the route still makes.
+    """
+    freed = []
+    monkeypatch.setattr(routes.reservations, 'move_spot', lambda *args: freed.append(args))
+    monkeypatch.setattr(routes.reservations, 'return_spot', lambda *args: freed.append(args))
+
+    def expire_first(state):
+        if state.is_update:
+            with db.engine.begin() as connection:
+                connection.execute(text("UPDATE reservation SET status = 'expired' WHERE id = :id"),
+                                   {'id': reservation_id})
+
+    event.listen(db.session, 'do_orm_execute', expire_first)
+    yield freed
+    event.remove(db.session, 'do_orm_execute', expire_first)
+
+
+def reservation_status(app, reservation_id):
+    with app.app_context():
+        return db.session.get(Reservation, reservation_id).status
+
+
+@pytest.mark.parametrize('action', ['cancel', 'release'])
+def test_lost_race_with_expiry_returns_409(app, user_client, reservation_id, expired_mid_request, action):
+    method = user_client.post if action == 'cancel' else user_client.put
+    response = method(f'/api/v1/reservations/{reservation_id}/{action}')
+
+    assert response.status_code == 409, response.get_json()
+    assert reservation_status(app, reservation_id) == 'expired'
+    assert expired_mid_request == []
+
+
+@pytest.mark.parametrize('action, status', [('cancel', 'cancelled'), ('release', 'completed')])
+def test_cancel_and_release_without_a_race(app, user_client, reservation_id, action, status):
+    method = user_client.post if action == 'cancel' else user_client.put
+    response = method(f'/api/v1/reservations/{reservation_id}/{action}')
+
+    assert response.status_code == 200, response.get_json()
+    assert response.get_json()['reservation']['status'] == status
+    assert reservation_status(app, reservation_id) == status
@@ -0,0 +1,20 @@
+// Live parking lot availability over Server-Sent Events
+
+import { API_BASE_URL } from '@/config'
+
+// Calls onSnapshot(lots) on connect (and whenever updates were missed),
+// then onLot(event) each time a lot's counters change.
+// Returns a function that closes the stream.
+export function subscribeAvailability({ onSnapshot, onLot }) {
+    const source = new EventSource(`${API_BASE_URL}/parking-lots/stream`, { withCredentials: true })
+
+    source.addEventListener('snapshot', (e) => {
+        if (onSnapshot) onSnapshot(JSON.parse(e.data).lots)
+    })
+    source.addEventListener('lot', (e) => {
+        if (onLot) onLot(JSON.parse(e.data))
+    })
+    // EventSource reconnects on its own; the server sends a fresh snapshot on reconnect
+
+    return () => source.close()
+}